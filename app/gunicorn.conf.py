@@ -0,0 +1,28 @@
+"""
+    gunicorn settings of the service. The app is imported once in the master process
+    (preload_app), so the workers share the memory of the loaded model pipelines until
+    a worker hot-reloads a new model
+"""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+bind = "0.0.0.0:8000"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 60
+
+# The workers write their metrics in PROMETHEUS_MULTIPROC_DIR, the files of a previous run
+# would be added to the new ones
+multiproc_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if multiproc_dir:
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+
+
+def child_exit(server, worker):
+    # The live gauges, like the requests in progress, stop counting the dead worker
+    if multiproc_dir:
+        multiprocess.mark_process_dead(worker.pid)
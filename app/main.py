@@ -1,9 +1,19 @@
-import pandas as pd
-import joblib
+import os
 import logging
+from contextlib import asynccontextmanager
 from typing import Dict
 
-from fastapi import FastAPI, status
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+from model.serving.cache import PredictionCache, window_key
+from model.serving.executor import Overloaded, ScoringExecutor
+from model.serving.metrics import count_errors, export_stage_timings, observe_batch
+from model.serving.metrics import observe_model, render_metrics, track_requests
+from model.serving.microbatch import MicroBatcher
+from model.serving.registry import ModelBundle, ModelRegistry
+from model.serving.schema import PayloadError, decode_payload
+from model.serving.scoring import score_windows
 
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(funcName)s - %(message)s",
@@ -12,12 +22,72 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Only load the artifacts the first time
+ARTIFACTS_PATH = os.getenv("ARTIFACTS_PATH", "/opt/artifacts")
+# "pipeline" runs the sklearn pipelines, "compiled" uses the NumPy only scorer
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "pipeline")
+# Seconds between checks of the artifacts, 0 disables the hot-reload
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+# "inline" scores in the event loop, "thread" and "process" in a pool of SCORING_WORKERS.
+# When SCORING_WORKERS + SCORING_QUEUE_SIZE requests are pending the next ones get a 503,
+# the requests waiting in a micro-batch included
+SCORING_MODE = os.getenv("SCORING_MODE", "inline")
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "1"))
+SCORING_QUEUE_SIZE = int(os.getenv("SCORING_QUEUE_SIZE", "16"))
+# Concurrent /get_prediction requests are scored together, up to PREDICTION_BATCH_SIZE
+# windows or after waiting PREDICTION_BATCH_WAIT_MS for more. It raises the throughput under
+# load, but a lone request waits PREDICTION_BATCH_WAIT_MS. A size of 1, the default, disables it
+PREDICTION_BATCH_SIZE = int(os.getenv("PREDICTION_BATCH_SIZE", "1"))
+PREDICTION_BATCH_WAIT_MS = float(os.getenv("PREDICTION_BATCH_WAIT_MS", "2"))
+# Predictions of repeated windows, kept PREDICTION_CACHE_TTL seconds. A size of 0 disables it
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "60"))
+
+# The time of each step of the pipelines is exported in /metrics
+export_stage_timings()
+
+# Load the artifacts the first time, then the registry swaps in the new ones
 logger.info("Loading artifacts")
-model_pipe = joblib.load("/opt/artifacts/model/trained_model.pkl")
-data_pipe = joblib.load("/opt/artifacts/data_pipeline.pkl")
+registry = ModelRegistry(ARTIFACTS_PATH, INFERENCE_ENGINE, MODEL_RELOAD_INTERVAL)
+registry.load()
+registry.add_listener(observe_model)
+logger.info(f"Using the {INFERENCE_ENGINE} inference engine")
+
+executor = ScoringExecutor(registry, SCORING_MODE, SCORING_WORKERS, SCORING_QUEUE_SIZE)
+logger.info(f"Scoring in {SCORING_MODE} mode")
+batcher = MicroBatcher(executor, PREDICTION_BATCH_SIZE, PREDICTION_BATCH_WAIT_MS)
+cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Started in each worker, after gunicorn forks them from the preloaded app
+    observe_model(registry.current)
+    registry.start()
+    yield
+    registry.stop()
+    executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.middleware("http")(track_requests)
 
-app = FastAPI()
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded) -> JSONResponse:
+    count_errors("overloaded")
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": f"The service is overloaded: {exc}"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(PayloadError)
+async def payload_error_handler(request: Request, exc: PayloadError) -> JSONResponse:
+    count_errors("invalid_payload")
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content={"detail": str(exc)}
+    )
 
 
 @app.get("/check_service", status_code=status.HTTP_201_CREATED)
@@ -25,20 +95,93 @@ def root() -> Dict:
     return {"Message": "Hello world from service"}
 
 
+@app.get("/model_status")
+def model_status() -> Dict:
+    """
+    Version of the active model, a hash of the data pipeline and model artifacts, and the
+    counters of the prediction cache
+    """
+    return {**registry.status(), "cache": cache.stats()}
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """
+    Metrics in the Prometheus format, e.g. the time of each stage of the pipelines
+    """
+    content, content_type = render_metrics()
+    return Response(content, media_type=content_type)
+
+
+async def predict(bundle: ModelBundle, data: Dict) -> float:
+    try:
+        return await batcher.predict(data, bundle)
+    except (Overloaded, PayloadError):
+        raise
+    except Exception:
+        count_errors("scoring_failed")
+        raise
+
+
 @app.post("/get_prediction", status_code=status.HTTP_201_CREATED)
-async def get_prediction(payload: Dict) -> Dict:
+async def get_prediction(request: Request) -> Dict:
     """
     Get the prediction for the requested data
     Input:
-        data: The data from three periods before the period you want to predict
+        data: The data from three periods before the period you want to predict. Only the
+            columns used by the model are read, a payload without them gets a 422. The window
+            needs at least the periods of the largest rolling window of the model, the same
+            minimum as the windows of /get_batch_prediction
+    """
+    # The model is read once, a swap during the request doesn't mix two models
+    bundle = registry.current
+    data = bundle.schema.parse(decode_payload(await request.body(), "data"))
+    if not cache.enabled:
+        return {"prediction": await predict(bundle, data)}
+
+    # The cached predictions are dropped when a new model is swapped in
+    key = window_key(data)
+    prediction = cache.get(key, bundle.version)
+    if prediction is None:
+        prediction = await predict(bundle, data)
+        cache.put(key, bundle.version, prediction)
+    return {"prediction": prediction}
+
+
+@app.post("/get_batch_prediction", status_code=status.HTTP_201_CREATED)
+async def get_batch_prediction(request: Request) -> Dict:
+    """
+    Get the predictions for many independent windows with a single transform and predict
+    Input:
+        windows: List of windows, each one with the same format as the data of /get_prediction
+            and the same minimum number of periods, the largest rolling window of the model
+    Output:
+        predictions: One item per window, in the same order, with its prediction or the error
+            that prevented scoring it
     """
-    data = payload["data"]
-    data = pd.DataFrame(data)
+    windows = decode_payload(await request.body(), "windows")
+    if not isinstance(windows, list):
+        raise PayloadError("windows must be a list of windows")
+
+    # The windows that don't match the schema get their error without being scored
+    bundle = registry.current
+    results, parsed = [], {}
+    for i, window in enumerate(windows):
+        try:
+            parsed[i] = bundle.schema.parse(window)
+            results.append(None)
+        except PayloadError as e:
+            results.append((None, str(e)))
+
+    logger.debug(f"Scoring {len(parsed)} windows")
+    observe_batch("batch_endpoint", len(parsed))
+    scored = (
+        await executor.run(score_windows, list(parsed.values()), bundle=bundle) if parsed else []
+    )
+    for i, result in zip(parsed, scored):
+        results[i] = result
 
-    logger.debug("Applying tranform")
-    data_prec = data_pipe.transform(data)
-    data_prec = data_prec.dropna()
-    logger.debug("Making predictions")
-    preds = model_pipe.predict(data_prec)
+    count_errors("invalid_payload", len(windows) - len(parsed))
+    count_errors("scoring_failed", sum(error is not None for _, error in scored))
 
-    return {"prediction": preds[-1]}
+    return {"predictions": [{"prediction": pred, "error": error} for pred, error in results]}
@@ -0,0 +1,62 @@
+"""
+    Compare two reports of the same benchmark and fail when a timing got worse by more than
+    max_regression, e.g. before rolling out a new image
+
+    python -m benchmarks.compare baseline.json current.json --max_regression 0.2
+"""
+import json
+from typing import Dict, Iterator, List, Tuple
+
+import fire
+
+# Metrics compared, by their name, and whether a lower or a higher value is better
+METRICS = {
+    "seconds": "lower",
+    "p50_ms": "lower",
+    "p95_ms": "lower",
+    "p99_ms": "lower",
+    "throughput_per_s": "higher",
+}
+
+
+def flatten(results: Dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif key in METRICS:
+            yield name, value
+
+
+def regressions(baseline: Dict, current: Dict, max_regression: float = 0.2) -> List[str]:
+    """
+    Metrics of both reports whose relative change is worse than max_regression
+    """
+    if baseline["benchmark"] != current["benchmark"]:
+        raise ValueError(f"Can't compare {baseline['benchmark']} with {current['benchmark']}")
+
+    before = dict(flatten(baseline["results"]))
+    found = []
+    for name, value in flatten(current["results"]):
+        if name not in before or not before[name]:
+            continue
+        change = (value - before[name]) / before[name]
+        if METRICS[name.rsplit(".", 1)[-1]] == "higher":
+            change = -change
+        if change > max_regression:
+            found.append(f"{name}: {before[name]:.6g} -> {value:.6g} ({change:+.0%} worse)")
+    return found
+
+
+def run(baseline: str, current: str, max_regression: float = 0.2) -> None:
+    with open(baseline) as f_baseline, open(current) as f_current:
+        found = regressions(json.load(f_baseline), json.load(f_current), max_regression)
+    for regression in found:
+        print(regression)
+    if found:
+        exit(f"{len(found)} metrics regressed more than {max_regression:.0%}")
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,75 @@
+"""
+    Benchmark of the period decomposition on a synthetic daily dataset, comparing the
+    row-wise apply used before with model.utils.periods
+
+    python -m benchmarks.periods --n_years 10
+"""
+import timeit
+from typing import Callable, Dict
+
+import fire
+import numpy as np
+import pandas as pd
+
+from model.utils.periods import period_index, split_dates
+
+
+def synthetic_daily_data(n_years: int, seed: int = 42) -> pd.DataFrame:
+    dates = pd.date_range("2000-01-01", periods=int(n_years * 365.25), freq="D")
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"date": dates, "value": rng.random(len(dates))})
+
+
+def _apply_split(df: pd.DataFrame) -> pd.DataFrame:
+    return df["date"].apply(lambda x: pd.Series([x.year, x.month]))
+
+
+def _vectorized_split(df: pd.DataFrame) -> pd.DataFrame:
+    return split_dates(df["date"])
+
+
+def _apply_index(df: pd.DataFrame) -> pd.Series:
+    return df.apply(lambda x: str(int(x.anio)) + "-" + str(int(x.mes)), axis=1)
+
+
+def _vectorized_index(df: pd.DataFrame) -> pd.PeriodIndex:
+    return period_index(df["anio"], df["mes"])
+
+
+def _best_time(func: Callable, df: pd.DataFrame, repeat: int) -> float:
+    return min(timeit.repeat(lambda: func(df), number=1, repeat=repeat))
+
+
+def benchmark(n_years: int = 10, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Time the date split of preprocessing and the period index of feature engineering
+    """
+    df = synthetic_daily_data(n_years)
+    df_periods = pd.concat((df, split_dates(df["date"])), axis=1)
+
+    results = {}
+    for name, before, after, data in [
+        ("split_dates", _apply_split, _vectorized_split, df),
+        ("period_index", _apply_index, _vectorized_index, df_periods),
+    ]:
+        apply_time = _best_time(before, data, repeat)
+        vectorized_time = _best_time(after, data, repeat)
+        results[name] = {
+            "rows": len(data),
+            "apply_s": apply_time,
+            "vectorized_s": vectorized_time,
+            "speedup": apply_time / vectorized_time,
+        }
+    return results
+
+
+def run(n_years: int = 10, repeat: int = 5) -> None:
+    for name, result in benchmark(n_years, repeat).items():
+        print(
+            f"{name:<14} rows={result['rows']:<7} apply={result['apply_s'] * 1e3:9.2f}ms "
+            f"vectorized={result['vectorized_s'] * 1e3:7.2f}ms speedup={result['speedup']:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,130 @@
+"""
+    Benchmark of the api, replaying a file of requests against the app in-process. Each line
+    of the file is a JSON object with the endpoint and the payload of a request:
+
+    {"endpoint": "/get_prediction", "payload": {"data": {...}}}
+
+    python -m benchmarks.service make_requests service_requests.jsonl --n_requests 1000
+    python -m benchmarks.service run service_requests.jsonl --concurrency 1,16 --output service.json
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import fire
+import httpx
+import numpy as np
+
+from benchmarks.utils import BASE_PATH, summarize, write_results
+from model.utils.config import INTERM_DIR, MERGED_FILE_NAME
+from model.utils.constants import TARGET_COL
+from model.utils.storage import load_table
+
+WINDOW_SIZE = 3
+
+
+def make_requests(
+    path: str, n_requests: int = 1000, batch_share: float = 0.0, batch_size: int = 16, seed=42
+) -> None:
+    """
+    Write n_requests random windows of the merged table as /get_prediction requests. A
+    batch_share of them are /get_batch_prediction requests of batch_size windows
+    """
+    df = load_table(BASE_PATH, INTERM_DIR, MERGED_FILE_NAME, "csv").drop(TARGET_COL, axis=1)
+    windows = [
+        df.iloc[start : start + WINDOW_SIZE].to_dict(orient="list")
+        for start in range(len(df) - WINDOW_SIZE + 1)
+    ]
+
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        for _ in range(n_requests):
+            if rng.random() < batch_share:
+                picks = rng.integers(len(windows), size=batch_size)
+                request = {
+                    "endpoint": "/get_batch_prediction",
+                    "payload": {"windows": [windows[i] for i in picks]},
+                }
+            else:
+                request = {
+                    "endpoint": "/get_prediction",
+                    "payload": {"data": windows[rng.integers(len(windows))]},
+                }
+            f.write(json.dumps(request) + "\n")
+
+
+def read_requests(path: str) -> List[Tuple[str, bytes]]:
+    with open(path) as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    return [(r["endpoint"], json.dumps(r["payload"]).encode()) for r in requests]
+
+
+def load_app():
+    """
+    Import the app with the artifacts of the repo and without the hot-reload. The rest of
+    the settings come from the environment, like in the service
+    """
+    os.environ.setdefault("ARTIFACTS_PATH", os.path.join(BASE_PATH, "artifacts"))
+    os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
+    from app.main import app
+
+    # The app logs every request at the DEBUG level
+    logging.getLogger().setLevel(logging.WARNING)
+    return app
+
+
+async def replay(app, requests: List[Tuple[str, bytes]], concurrency: int) -> Dict:
+    """
+    Send the requests with at most concurrency requests in flight
+    """
+    latencies = []
+    status_codes: Dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"content-type": "application/json"}
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://benchmark"
+    ) as client:
+
+        async def send(endpoint: str, body: bytes) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(endpoint, content=body, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                code = str(response.status_code)
+                status_codes[code] = status_codes.get(code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(endpoint, body) for endpoint, body in requests))
+        seconds = time.perf_counter() - start
+
+    return {"concurrency": concurrency, **summarize(latencies, seconds), "status": status_codes}
+
+
+def benchmark(path: str, concurrency: Tuple[int, ...] = (1, 16), warmup: int = 20) -> Dict:
+    """
+    Replay the requests once per concurrency level, after warmup requests
+    """
+    app = load_app()
+    requests = read_requests(path)
+
+    async def run_all() -> Dict:
+        async with app.router.lifespan_context(app):
+            await replay(app, requests[:warmup], 1)
+            return {
+                f"concurrency_{level}": await replay(app, requests, level) for level in concurrency
+            }
+
+    return asyncio.run(run_all())
+
+
+def run(path: str, concurrency=(1, 16), warmup: int = 20, output: Optional[str] = None) -> None:
+    concurrency = (concurrency,) if isinstance(concurrency, int) else tuple(concurrency)
+    write_results("service", benchmark(path, concurrency, warmup), output)
+
+
+if __name__ == "__main__":
+    fire.Fire({"make_requests": make_requests, "run": run})
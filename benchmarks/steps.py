@@ -0,0 +1,92 @@
+"""
+    Benchmark of the steps of `python -m model` on synthetic datasets, made by stacking
+    the raw files of the repo 1x to 100x in a temporary base path
+
+    python -m benchmarks.steps --scales 1,10,100 --output steps.json
+"""
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+import fire
+
+from benchmarks.utils import BASE_PATH, scaled_table, write_results
+from model.__main__ import tasks
+from model.steps.preprocessing import read_raw_data
+from model.utils.config import ARTIFACT_DIR, FEATURE_DIR, INTERM_DIR, RAW_DIR
+from model.utils.config import BANK_FILE_NAME, MILK_FILE_NAME, PREP_FILE_NAME
+from model.utils.constants import CITY_COLS
+
+# Folders of a base path read or written by the steps
+FOLDERS = [
+    RAW_DIR,
+    INTERM_DIR,
+    FEATURE_DIR,
+    "model",
+    f"{ARTIFACT_DIR}/model",
+    f"{ARTIFACT_DIR}/params",
+]
+# Noise columns of the sources stacked scale times, the milk price keeps one row per period
+SCALED_SOURCES = {PREP_FILE_NAME: CITY_COLS, BANK_FILE_NAME: []}
+# Extra arguments of the steps, the search runs in a single process to get stable timings
+STEP_KWARGS = {"hypertune_model": {"n_jobs": 1}}
+
+
+def make_base_path(base_path: str, scale: int) -> None:
+    """
+    Write the raw files stacked scale times, with the schema and params of the repo.
+    The precipitations and the bank data get a row per period and copy, so the merged table
+    grows with scale too
+    """
+    for folder in FOLDERS:
+        os.makedirs(os.path.join(base_path, folder), exist_ok=True)
+    shutil.copy(
+        os.path.join(BASE_PATH, "model/schema.yaml"), os.path.join(base_path, "model/schema.yaml")
+    )
+    shutil.copy(
+        os.path.join(BASE_PATH, ARTIFACT_DIR, "params/best_params.json"),
+        os.path.join(base_path, ARTIFACT_DIR, "params/best_params.json"),
+    )
+
+    for name in [MILK_FILE_NAME, PREP_FILE_NAME, BANK_FILE_NAME]:
+        raw = read_raw_data(BASE_PATH, name)
+        if name in SCALED_SOURCES:
+            raw = scaled_table(raw, scale, SCALED_SOURCES[name])
+        raw.to_csv(os.path.join(base_path, RAW_DIR, f"{name}.csv"), index=False)
+
+
+def benchmark(
+    scales: Tuple[int, ...] = (1, 10, 100), steps: Optional[Tuple[str, ...]] = None
+) -> Dict[str, Dict]:
+    """
+    Run the steps in order at each scale and time them. The steps of a scale share a
+    temporary base path, each one reads the outputs of the previous ones
+    """
+    steps = steps or tuple(tasks)
+    results = {}
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as base_path:
+            make_base_path(base_path, scale)
+            rows = {
+                name: len(read_raw_data(base_path, name))
+                for name in [MILK_FILE_NAME, PREP_FILE_NAME, BANK_FILE_NAME]
+            }
+            scale_results = {"raw_rows": rows}
+            for step in steps:
+                start = time.perf_counter()
+                tasks[step](base_path, **STEP_KWARGS.get(step, {}))
+                scale_results[step] = {"seconds": time.perf_counter() - start}
+        results[f"{scale}x"] = scale_results
+    return results
+
+
+def run(scales=(1, 10, 100), steps=None, output: Optional[str] = None) -> None:
+    scales = (scales,) if isinstance(scales, int) else tuple(scales)
+    steps = (steps,) if isinstance(steps, str) else steps
+    write_results("steps", benchmark(scales, steps), output)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,69 @@
+"""
+    Benchmark of each transformer of model.utils.data_munging, with the configuration of the
+    feature engineering pipeline, on the merged table stacked 1x to 100x
+
+    python -m benchmarks.transformers --scales 1,10,100 --output transformers.json
+"""
+import timeit
+from typing import Dict, List, Optional, Tuple
+
+import fire
+
+from benchmarks.utils import BASE_PATH, scaled_table, write_results
+from model.utils.config import INTERM_DIR, MERGED_FILE_NAME
+from model.utils.constants import CITY_COLS, IMACEC_INDICE_COLS, PIB_COLS, TAKE_VARS, TARGET_COL
+from model.utils.data_munging import (
+    DropNaTransformer,
+    FillVariables,
+    FixingFormattedString,
+    RollingTransformer,
+    TakeVariables,
+)
+from model.utils.storage import load_table
+
+ROLLING_COLS = ["Precio_leche"] + CITY_COLS + PIB_COLS + IMACEC_INDICE_COLS
+
+
+def transformers() -> List[Tuple[str, object]]:
+    """
+    Transformers in the order of the feature engineering, each one receives the output of
+    the previous one
+    """
+    return [
+        ("fixing_pib_vars", FixingFormattedString(PIB_COLS, "PIB")),
+        ("fixing_imacec_indice_vars", FixingFormattedString(IMACEC_INDICE_COLS, "IMACEC_INDICE")),
+        ("rolling_with_mean_std", RollingTransformer(ROLLING_COLS, ["mean", "std"])),
+        ("drop_na", DropNaTransformer()),
+        ("take_vars_before_scaler", TakeVariables(TAKE_VARS)),
+        ("fill_vars", FillVariables(TAKE_VARS + ["missing_var"])),
+    ]
+
+
+def benchmark(scales: Tuple[int, ...] = (1, 10, 100), repeat: int = 5) -> Dict[str, Dict]:
+    """
+    Best time of repeat transforms of each transformer at each scale
+    """
+    df_merge = load_table(BASE_PATH, INTERM_DIR, MERGED_FILE_NAME, "csv").drop(TARGET_COL, axis=1)
+
+    results = {}
+    for scale in scales:
+        X = scaled_table(df_merge, scale, noise_cols=CITY_COLS)
+        scale_results = {}
+        for name, transformer in transformers():
+            X_in = X
+            seconds = min(
+                timeit.repeat(lambda: transformer.fit_transform(X_in), number=1, repeat=repeat)
+            )
+            X = transformer.transform(X_in)
+            scale_results[name] = {"rows": len(X_in), "seconds": seconds}
+        results[f"{scale}x"] = scale_results
+    return results
+
+
+def run(scales=(1, 10, 100), repeat: int = 5, output: Optional[str] = None) -> None:
+    scales = (scales,) if isinstance(scales, int) else tuple(scales)
+    write_results("transformers", benchmark(scales, repeat), output)
+
+
+if __name__ == "__main__":
+    fire.Fire(run)
@@ -0,0 +1,75 @@
+"""
+    Helpers shared by the benchmarks: summaries of the timings, synthetic datasets and the
+    JSON reports that can be compared between two images
+"""
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "..")
+
+
+def summarize(latencies: List[float], seconds: float) -> Dict[str, float]:
+    """
+    Percentiles in milliseconds of the latencies and throughput per second
+    """
+    latencies_ms = np.asarray(latencies) * 1e3
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "n": len(latencies),
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(latencies_ms.max()),
+        "throughput_per_s": len(latencies) / seconds,
+    }
+
+
+def scaled_table(df: pd.DataFrame, scale: int, noise_cols: List[str] = [], seed: int = 42):
+    """
+    Stack scale copies of a table. The noise_cols of every copy but the first one are
+    multiplied by a random factor around 1, so the copies aren't identical
+    """
+    copies = [df]
+    rng = np.random.default_rng(seed)
+    for _ in range(scale - 1):
+        copy = df.copy()
+        for col in noise_cols:
+            copy[col] = copy[col] * rng.normal(1, 0.05, len(copy))
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def environment() -> Dict[str, str]:
+    import sklearn
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": str(os.cpu_count()),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def write_results(name: str, results: Dict, output: Optional[str] = None) -> Dict:
+    """
+    Print the results as JSON, or save them in output
+    """
+    report = {"benchmark": name, "environment": environment(), "results": results}
+    content = json.dumps(report, indent=4)
+    if output is None:
+        print(content)
+    else:
+        with open(output, "w") as f:
+            f.write(content + "\n")
+    return report
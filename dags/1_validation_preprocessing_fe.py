@@ -16,12 +16,15 @@ with DAG(
 
     validate_assets_task = BashOperator(
         task_id="validate_assets",
-        bash_command=f"python -m model validate_assets --base_path {AIRFLOW_HOME}",
+        bash_command=f"python -m model validate_assets --base_path {AIRFLOW_HOME} --n_workers 3",
     )
 
     preprocessing_task = BashOperator(
         task_id="preprocessing",
-        bash_command=f"python -m model preprocess_assets --base_path {AIRFLOW_HOME}",
+        bash_command=(
+            f"python -m model preprocess_assets --base_path {AIRFLOW_HOME} "
+            "--incremental --n_workers 3"
+        ),
     )
 
     feature_engineering_task = BashOperator(
@@ -16,7 +16,7 @@ with DAG(
 
     hypertune_model = BashOperator(
         task_id="hypertune_model",
-        bash_command=f"python -m model hypertune_model --base_path {AIRFLOW_HOME}",
+        bash_command=f"python -m model hypertune_model --base_path {AIRFLOW_HOME} --search alpha_path",
     )
 
     training_model = BashOperator(
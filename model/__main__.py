@@ -1,13 +1,19 @@
-from typing import Callable, Dict
+from typing import Callable, Dict, List
 
 import fire
 import logging
 import logging.config
 
 from model.steps.feature_engineering import feature_engineering
-from model.steps.training import hypertune_model, training_model
+from model.steps.training import archive_model, hypertune_model, training_model
 from model.steps.validation import validate_assets
 from model.steps.preprocessing import preprocess_assets
+from model.steps.run_all import run_all
+from model.utils.config import ARTIFACT_DIR, FEATURE_DIR, INTERM_DIR, RAW_DIR
+from model.utils.config import MILK_FILE_NAME, PREP_FILE_NAME, BANK_FILE_NAME
+from model.utils.config import MERGED_FILE_NAME, PREPROCESSING_STATE_FILE_NAME
+from model.utils.instrumentation import timed_task
+from model.utils.step_cache import StepSpec, cached_task
 
 tasks: Dict[str, Callable] = {
     "validate_assets": validate_assets,  # (1)
@@ -17,6 +23,58 @@ tasks: Dict[str, Callable] = {
     "training_model": training_model,
 }
 
+RAW_FILES = [f"{RAW_DIR}/{name}.csv" for name in [MILK_FILE_NAME, PREP_FILE_NAME, BANK_FILE_NAME]]
+
+
+def tables(folder: str, names: List[str], params: Dict, read: bool = False) -> List[str]:
+    """
+    Paths of the tables saved in the storage format of the step. The steps read the csv
+    when the table doesn't exist in that format and can export a csv copy
+    """
+    storage_format = params["storage_format"]
+    formats = [storage_format]
+    if storage_format != "csv" and (read or params.get("export_csv")):
+        formats.append("csv")
+    return [f"{folder}/{name}.{extension}" for name in names for extension in formats]
+
+
+# Files read and written by each task, to skip the tasks whose inputs didn't change
+task_specs: Dict[str, StepSpec] = {
+    "validate_assets": StepSpec(
+        inputs=lambda params: ["model/schema.yaml"] + RAW_FILES,
+        outputs=lambda params: [],
+    ),
+    "preprocess_assets": StepSpec(
+        inputs=lambda params: RAW_FILES,
+        outputs=lambda params: tables(
+            INTERM_DIR,
+            [f"prepare_{name}" for name in [MILK_FILE_NAME, PREP_FILE_NAME, BANK_FILE_NAME]]
+            + [MERGED_FILE_NAME],
+            params,
+        )
+        + [f"{INTERM_DIR}/{PREPROCESSING_STATE_FILE_NAME}.json"],
+    ),
+    "feature_engineering": StepSpec(
+        inputs=lambda params: tables(INTERM_DIR, [MERGED_FILE_NAME], params, read=True),
+        outputs=lambda params: tables(FEATURE_DIR, ["train", "test"], params)
+        + [f"{ARTIFACT_DIR}/data_pipeline.pkl"],
+    ),
+    "hypertune_model": StepSpec(
+        inputs=lambda params: tables(FEATURE_DIR, ["train"], params, read=True),
+        outputs=lambda params: [f"{ARTIFACT_DIR}/params/best_params.json"],
+    ),
+    "training_model": StepSpec(
+        inputs=lambda params: tables(FEATURE_DIR, ["train", "test"], params, read=True)
+        + [f"{ARTIFACT_DIR}/params/best_params.json"],
+        outputs=lambda params: [
+            f"{ARTIFACT_DIR}/model/model_metrics.json",
+            f"{ARTIFACT_DIR}/model/trained_model.pkl",
+        ],
+        # A restored model also moves the previous one to the history, like save_model
+        before_restore=lambda params: archive_model(params["base_path"]),
+    ),
+}
+
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -24,4 +82,13 @@ if __name__ == "__main__":
         level=logging.DEBUG,
     )
 
-    fire.Fire(tasks)
+    fire.Fire(
+        {
+            **{
+                name: timed_task(name, cached_task(name, task, task_specs[name]))
+                for name, task in tasks.items()
+            },
+            # Every task in this process, passing the tables in memory
+            "run_all": timed_task("run_all", run_all),
+        }
+    )
@@ -0,0 +1,124 @@
+"""
+    This file contains helpers to score many independent windows with a single
+    transform and a single predict call
+"""
+import logging
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+from model.utils.data_munging import RollingTransformer
+
+logger = logging.getLogger(__name__)
+
+# (prediction, error) for each window, only one of them is set
+WindowResult = Tuple[Optional[float], Optional[str]]
+# Error of the windows whose last period has missing features, with every engine
+MISSING_FEATURES = "The last period has missing features"
+
+
+def min_window_size(data_pipe: Pipeline) -> int:
+    """
+    Minimum number of periods a window needs so that its rolling features don't
+    depend on the rows of the previous window once the windows are stacked. Both prediction
+    endpoints reject the windows shorter than it
+    """
+    sizes = [
+        step.window_size for _, step in data_pipe.steps if isinstance(step, RollingTransformer)
+    ]
+    return max(sizes, default=1)
+
+
+def validate_window(window: Dict, min_rows: int) -> int:
+    """
+    Check the format of a window and return its number of periods
+    """
+    if not isinstance(window, dict) or not window:
+        raise ValueError("The window must be a non empty mapping of column -> values")
+
+    lengths = {
+        len(values) if isinstance(values, (list, np.ndarray)) else -1 for values in window.values()
+    }
+    if -1 in lengths:
+        raise ValueError("Every column of the window must be a list of values")
+    if len(lengths) > 1:
+        raise ValueError("Every column of the window must have the same number of periods")
+
+    n_rows = lengths.pop()
+    if n_rows < min_rows:
+        raise ValueError(f"The window needs at least {min_rows} periods, got {n_rows}")
+    return n_rows
+
+
+def _predict_stacked(
+    data_pipe: Pipeline, model_pipe: Pipeline, windows: List[Dict], sizes: List[int]
+) -> List[WindowResult]:
+    """
+    Stack windows with the same columns, transform them at once and score the last
+    period of each one
+    """
+    cols = list(windows[0].keys())
+    data = pd.DataFrame({col: list(chain.from_iterable(w[col] for w in windows)) for col in cols})
+
+    data_prec = data_pipe.transform(data)
+
+    last_rows = np.cumsum(sizes) - 1
+    data_last = data_prec.iloc[last_rows]
+    complete = ~data_last.isna().any(axis=1).to_numpy()
+
+    preds = np.full(len(windows), np.nan)
+    if complete.any():
+        preds[complete] = model_pipe.predict(data_last[complete])
+
+    return [
+        (float(pred), None) if ok else (None, MISSING_FEATURES) for pred, ok in zip(preds, complete)
+    ]
+
+
+def predict_windows(
+    data_pipe: Pipeline, model_pipe: Pipeline, windows: List[Dict]
+) -> List[WindowResult]:
+    """
+    Score N independent windows, each one with the format of /get_prediction's data.
+    The prediction of a window is the one of its last period. The results keep the
+    input order, a window that can't be scored gets an error instead of a prediction
+    """
+    results: List[WindowResult] = [(None, None)] * len(windows)
+    min_rows = min_window_size(data_pipe)
+
+    # Windows are stacked by their set of columns, usually there's a single group
+    groups = defaultdict(list)
+    for i, window in enumerate(windows):
+        try:
+            n_rows = validate_window(window, min_rows)
+        except ValueError as e:
+            results[i] = (None, str(e))
+            continue
+        groups[tuple(sorted(window.keys()))].append((i, n_rows))
+
+    for members in groups.values():
+        idx = [i for i, _ in members]
+        sizes = [n_rows for _, n_rows in members]
+        logger.debug(f"Scoring {len(idx)} stacked windows")
+        try:
+            group_results = _predict_stacked(
+                data_pipe, model_pipe, [windows[i] for i in idx], sizes
+            )
+        except Exception as e:
+            # Isolate the windows that break the pipeline by scoring them one by one
+            logger.debug(f"Stacked scoring failed ({e}), scoring windows one by one")
+            group_results = []
+            for i, n_rows in members:
+                try:
+                    group_results += _predict_stacked(data_pipe, model_pipe, [windows[i]], [n_rows])
+                except Exception as e:
+                    group_results.append((None, f"The window could not be scored: {e}"))
+
+        for i, result in zip(idx, group_results):
+            results[i] = result
+
+    return results
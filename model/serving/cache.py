@@ -0,0 +1,87 @@
+"""
+    This file contains the cache of the predictions of /get_prediction, so the windows that
+    the clients request again and again are only scored once per model version
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def window_key(window: Dict) -> str:
+    """
+    Hash of the values of a parsed window that doesn't depend on the order of its columns
+    """
+    digest = hashlib.sha256()
+    for col in sorted(window):
+        digest.update(col.encode() + b"\0")
+        digest.update(np.ascontiguousarray(window[col], dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU cache of the predictions of the windows, with at most max_size entries that
+    expire ttl seconds after they are stored. The entries belong to a model version: the
+    first access with another version drops all of them. max_size=0 disables the cache
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _use_version(self, version: str) -> None:
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get(self, key: str, version: str) -> Optional[float]:
+        with self._lock:
+            self._use_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, version: str, prediction: float) -> None:
+        with self._lock:
+            # The model changed while the window was scored
+            if version != self.version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, prediction)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        requests = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else None,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,229 @@
+"""
+    This file contains a NumPy only scorer compiled from the fitted data and model pipelines.
+    It computes only the features kept by the selector, for the last period of each window,
+    and matches Pipeline.predict within a relative tolerance of COMPILED_RTOL
+"""
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_selection import SelectKBest
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+from model.serving.batch import MISSING_FEATURES, WindowResult, validate_window
+from model.serving.schema import PayloadError
+from model.utils.data_munging import FixingFormattedString, RollingTransformer, TakeVariables
+from model.utils.kernel_ridge import (
+    PolynomialKernelRidge,
+    center_test_kernel,
+    polynomial_features_kernel,
+)
+
+logger = logging.getLogger(__name__)
+
+# Maximum relative difference between the compiled scorer and Pipeline.predict
+COMPILED_RTOL = 1e-6
+
+
+# The windows are a few periods long, plain Python is faster than NumPy for them
+def _last_value(values: List[float]) -> float:
+    return values[-1]
+
+
+def _rolling_mean(values: List[float]) -> float:
+    values = [x for x in values if x == x]
+    return sum(values) / len(values) if values else np.nan
+
+
+def _rolling_std(values: List[float]) -> float:
+    values = [x for x in values if x == x]
+    if len(values) < 2:
+        return np.nan
+    mean = sum(values) / len(values)
+    return math.sqrt(sum((x - mean) ** 2 for x in values) / (len(values) - 1))
+
+
+def _rolling_min(values: List[float]) -> float:
+    values = [x for x in values if x == x]
+    return min(values) if values else np.nan
+
+
+def _rolling_max(values: List[float]) -> float:
+    values = [x for x in values if x == x]
+    return max(values) if values else np.nan
+
+
+def _rolling_last(values: List[float]) -> float:
+    values = [x for x in values if x == x]
+    return values[-1] if values else np.nan
+
+
+STATS = {
+    "value": _last_value,
+    "mean": _rolling_mean,
+    "std": _rolling_std,
+    "min": _rolling_min,
+    "max": _rolling_max,
+    "last": _rolling_last,
+}
+
+
+class CompiledScorer:
+    """
+    Score windows with plain NumPy operations, skipping pandas and the sklearn pipelines.
+    Only FixingFormattedString, RollingTransformer and TakeVariables data pipelines followed
+    by StandardScaler -> SelectKBest -> PolynomialFeatures -> Ridge or StandardScaler ->
+    SelectKBest -> PolynomialKernelRidge model pipelines are supported
+    """
+
+    def __init__(self, data_pipe: Pipeline, model_pipe: Pipeline):
+        feature_names, self.formatters, rolling = self._compile_data_pipe(data_pipe)
+        support = self._compile_model_pipe(model_pipe, len(feature_names))
+
+        # (input column, statistic, number of periods) of each selected feature
+        self.features: List[Tuple[str, str, int]] = [
+            rolling.get(name, (name, "value", 1))
+            for name, keep in zip(feature_names, support)
+            if keep
+        ]
+        self.input_cols = list(dict.fromkeys(col for col, _, _ in self.features))
+        # Same minimum as min_window_size of the data pipeline pruned for the model
+        self.min_rows = max((n_periods for _, _, n_periods in self.features), default=1)
+        logger.debug(f"Compiled scorer using the features {self.features}")
+
+    @staticmethod
+    def _compile_data_pipe(data_pipe: Pipeline):
+        formatters: Dict[str, FixingFormattedString] = {}
+        rolling: Dict[str, Tuple[str, str, int]] = {}
+        feature_names = None
+
+        for name, step in data_pipe.steps:
+            if isinstance(step, FixingFormattedString):
+                formatters.update({col: step for col in step.cols})
+            elif isinstance(step, RollingTransformer):
+                for method in step.methods:
+                    if method not in STATS:
+                        raise ValueError(f"Can't compile the rolling method {method}")
+                    for col in step.cols:
+                        feat_name = f"{col}_rolling{step.window_size}_{method}"
+                        rolling[feat_name] = (col, method, step.window_size)
+            elif isinstance(step, TakeVariables):
+                feature_names = list(step.cols)
+            else:
+                raise ValueError(f"Can't compile the data pipeline step {name}")
+
+        if feature_names is None:
+            raise ValueError("The data pipeline must end with a TakeVariables step")
+        return feature_names, formatters, rolling
+
+    def _compile_model_pipe(self, model_pipe: Pipeline, n_features: int) -> np.ndarray:
+        steps = [step for _, step in model_pipe.steps]
+        supported = [
+            (StandardScaler, SelectKBest, PolynomialFeatures, Ridge),
+            (StandardScaler, SelectKBest, PolynomialKernelRidge),
+        ]
+        if not any(
+            len(steps) == len(expected) and all(map(isinstance, steps, expected))
+            for expected in supported
+        ):
+            raise ValueError(f"Can't compile the model pipeline {model_pipe}")
+        scaler, selector, *model = steps
+
+        if scaler.n_features_in_ != n_features:
+            raise ValueError(
+                f"The model expects {scaler.n_features_in_} features, "
+                f"the data pipeline produces {n_features}"
+            )
+
+        support = selector.get_support()
+        self.mean = scaler.mean_[support] if scaler.with_mean else 0.0
+        self.scale = scaler.scale_[support] if scaler.with_std else 1.0
+        if len(model) == 2:
+            poly, ridge = model
+            self.powers = poly.powers_
+            self.coef = ridge.coef_
+            self.intercept = ridge.intercept_
+            self.kernel: Optional[Dict] = None
+        else:
+            # The dual form: the training rows and the centering terms of their kernel
+            (kernel_ridge,) = model
+            self.kernel = {
+                "X_fit": kernel_ridge.X_fit_,
+                "degree": kernel_ridge.degree,
+                "means": kernel_ridge.kernel_means_,
+                "mean": kernel_ridge.kernel_mean_,
+            }
+            self.coef = kernel_ridge.dual_coef_
+            self.intercept = kernel_ridge.y_mean_
+        return support
+
+    def _parse(self, col: str, values: list) -> List[float]:
+        formatter = self.formatters.get(col)
+        if formatter is not None:
+            return [
+                float(formatter.casting_finance(x) if isinstance(x, str) else x) for x in values
+            ]
+        return [float(x) for x in values]
+
+    def features_of(self, window: Dict) -> np.ndarray:
+        """
+        Compute the selected features of the last period of the window
+        """
+        validate_window(window, self.min_rows)
+        missing = [col for col in self.input_cols if col not in window]
+        if missing:
+            raise ValueError(f"The window is missing the columns {missing}")
+
+        parsed: Dict[str, List[float]] = {}
+        feats = np.empty(len(self.features))
+        for j, (col, stat, n_periods) in enumerate(self.features):
+            if col not in parsed:
+                parsed[col] = self._parse(col, window[col])
+            feats[j] = STATS[stat](parsed[col][-n_periods:])
+        return feats
+
+    def predict_features(self, feats: np.ndarray) -> np.ndarray:
+        """
+        Apply the scaler, polynomial expansion and ridge model to a (n_windows, n_selected) array
+        """
+        scaled = (feats - self.mean) / self.scale
+        if self.kernel is not None:
+            kernel = polynomial_features_kernel(scaled, self.kernel["X_fit"], self.kernel["degree"])
+            expanded = center_test_kernel(kernel, self.kernel["means"], self.kernel["mean"])
+        else:
+            expanded = np.prod(scaled[:, None, :] ** self.powers[None, :, :], axis=2)
+        return expanded @ self.coef + self.intercept
+
+    def predict_window(self, window: Dict) -> float:
+        """
+        Get the prediction of the last period of a window
+        """
+        feats = self.features_of(window)
+        if np.isnan(feats).any():
+            raise PayloadError(MISSING_FEATURES)
+        return float(self.predict_features(feats[None, :])[0])
+
+    def predict_windows(self, windows: List[Dict]) -> List[WindowResult]:
+        """
+        Score N independent windows, with the same output as model.serving.batch.predict_windows
+        """
+        results: List[WindowResult] = [(None, None)] * len(windows)
+        feats = np.full((len(windows), len(self.features)), np.nan)
+        for i, window in enumerate(windows):
+            try:
+                feats[i] = self.features_of(window)
+            except Exception as e:
+                results[i] = (None, f"The window could not be scored: {e}")
+
+        complete = ~np.isnan(feats).any(axis=1)
+        preds = self.predict_features(feats[complete]) if complete.any() else []
+        for i, pred in zip(np.flatnonzero(complete), preds):
+            results[i] = (float(pred), None)
+        for i in np.flatnonzero(~complete):
+            if results[i][1] is None:
+                results[i] = (None, MISSING_FEATURES)
+
+        return results
@@ -0,0 +1,133 @@
+"""
+    This file contains the executor that runs the scoring of the api off the event loop,
+    with a bounded number of waiting requests
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from model.serving.registry import ModelBundle, ModelRegistry
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = ["inline", "thread", "process"]
+
+# Model of the worker processes, set when the process starts
+_worker_bundle: Optional[ModelBundle] = None
+
+
+def _set_worker_bundle(bundle: ModelBundle) -> None:
+    global _worker_bundle
+    _worker_bundle = bundle
+
+
+def _call_in_worker(func: Callable, *args) -> Any:
+    return func(_worker_bundle, *args)
+
+
+class Overloaded(Exception):
+    """
+    Raised when every worker is busy and the queue is full
+    """
+
+
+class ScoringExecutor:
+    """
+    Run func(bundle, *args) for the requests
+        inline: In the event loop, like a plain async handler
+        thread: In a pool of max_workers threads with the active model of the registry
+        process: In a pool of max_workers processes. Each process gets the active model
+            when it starts, and the pool is replaced when the registry swaps the model
+    At most max_workers + max_queue requests are scored or waiting, the next ones raise
+    Overloaded right away instead of queueing. A request waiting in a micro-batch holds its
+    slot, see acquire
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        mode: str = "inline",
+        max_workers: int = 1,
+        max_queue: int = 0,
+    ):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode {mode}, use one of {EXECUTION_MODES}")
+        self.registry = registry
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+        self._pool_version: Optional[str] = None
+
+    def _get_pool(self) -> Executor:
+        if self.mode == "thread":
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="scoring")
+            return self._pool
+
+        bundle = self.registry.current
+        if self._pool is None or self._pool_version != bundle.version:
+            # The requests sent to the old pool finish with the old model
+            old_pool = self._pool
+            logger.info(f"Starting {self.max_workers} scoring processes for {bundle.version}")
+            self._pool = ProcessPoolExecutor(
+                self.max_workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_set_worker_bundle,
+                initargs=(bundle,),
+            )
+            self._pool_version = bundle.version
+            if old_pool is not None:
+                old_pool.shutdown(wait=False)
+        return self._pool
+
+    def acquire(self, n_requests: int = 1) -> None:
+        """
+        Reserve the slots of n_requests requests, or raise Overloaded if there aren't enough
+        """
+        with self._lock:
+            if self.pending + n_requests > self.max_pending:
+                raise Overloaded(f"{self.pending} requests are already being scored")
+            self.pending += n_requests
+
+    def release(self, n_requests: int = 1) -> None:
+        with self._lock:
+            self.pending -= n_requests
+
+    async def run(
+        self, func: Callable, *args, bundle: Optional[ModelBundle] = None, acquired: bool = False
+    ) -> Any:
+        """
+        Run func(bundle, *args), by default with the active model of the registry. The call
+        takes the slot of one request, unless the caller already acquired the slots of its
+        requests, e.g. the micro-batches
+        """
+        if not acquired:
+            self.acquire()
+
+        # The bundle is read now, the request keeps it if the model is swapped
+        bundle = self.registry.current if bundle is None else bundle
+        try:
+            if self.mode == "inline":
+                return func(bundle, *args)
+            loop = asyncio.get_running_loop()
+            if self.mode == "thread":
+                return await loop.run_in_executor(self._get_pool(), func, bundle, *args)
+            pool = self._get_pool()
+            if self._pool_version != bundle.version:
+                # The model was swapped after the request read it, the workers have the new one
+                return func(bundle, *args)
+            return await loop.run_in_executor(pool, _call_in_worker, func, *args)
+        finally:
+            if not acquired:
+                self.release()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,162 @@
+"""
+    This file contains the Prometheus metrics of the api. When PROMETHEUS_MULTIPROC_DIR is
+    set every process writes its metrics there, and /metrics aggregates the metrics of all
+    the gunicorn workers and scoring processes
+"""
+import os
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import Request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from model.serving.registry import ModelBundle
+from model.utils.instrumentation import STAGE_TIMINGS, Shape
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# From 10us for the compiled scorer to seconds for large batches
+STAGE_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds",
+    "Wall time of each stage of the data and model pipelines",
+    ["pipeline", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+STAGE_ROWS = Counter(
+    "pipeline_stage_rows", "Rows received by each stage of the pipelines", ["pipeline", "stage"]
+)
+STAGE_COLUMNS = Gauge(
+    "pipeline_stage_output_columns",
+    "Columns of the last output of each stage of the pipelines",
+    ["pipeline", "stage"],
+    multiprocess_mode="livemax",
+)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the requests, by endpoint and status code",
+    ["method", "endpoint", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being processed", multiprocess_mode="livesum"
+)
+BATCH_SIZE = Histogram(
+    "prediction_batch_size",
+    "Windows scored together, by micro-batches of /get_prediction or /get_batch_prediction",
+    ["source"],
+    buckets=BATCH_BUCKETS,
+)
+PREDICTION_ERRORS = Counter(
+    "prediction_errors",
+    "Windows or requests that couldn't be scored, by reason",
+    ["reason"],
+)
+
+MODEL_INFO = Gauge(
+    "model_info",
+    "1 for the model version served by a process",
+    ["version", "engine"],
+    multiprocess_mode="livemax",
+)
+MODEL_METRIC = Gauge(
+    "model_metric",
+    "Test metrics saved by the training of the served model",
+    ["metric"],
+    multiprocess_mode="livemostrecent",
+)
+MODEL_LOADED = Gauge(
+    "model_loaded_timestamp_seconds",
+    "Unix time when the served artifacts were loaded",
+    multiprocess_mode="livemax",
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "model_load_seconds",
+    "Time it took to load and warm up the served artifacts",
+    multiprocess_mode="livemostrecent",
+)
+
+_served = {}  # Labels of MODEL_INFO of the model served by this process
+
+
+def observe_stage(
+    pipeline: str,
+    stage: str,
+    seconds: float,
+    shape_in: Optional[Shape],
+    shape_out: Optional[Shape],
+) -> None:
+    STAGE_SECONDS.labels(pipeline, stage).observe(seconds)
+    if shape_in:
+        STAGE_ROWS.labels(pipeline, stage).inc(shape_in[0])
+    if shape_out and len(shape_out) > 1:
+        STAGE_COLUMNS.labels(pipeline, stage).set(shape_out[1])
+
+
+def export_stage_timings() -> None:
+    """
+    Export the timings of the pipeline stages recorded from now on
+    """
+    STAGE_TIMINGS.add_observer(observe_stage)
+
+
+def observe_model(bundle: ModelBundle) -> None:
+    """
+    Export the version, metrics and load time of the model that this process serves
+    """
+    if _served:
+        MODEL_INFO.labels(**_served).set(0)
+    _served.update(version=bundle.version, engine="compiled" if bundle.scorer else "pipeline")
+    MODEL_INFO.labels(**_served).set(1)
+
+    for metric, value in bundle.metrics.items():
+        MODEL_METRIC.labels(metric).set(value)
+    MODEL_LOADED.set(datetime.fromisoformat(bundle.loaded_at).timestamp())
+    MODEL_LOAD_SECONDS.set(bundle.load_seconds)
+
+
+def observe_batch(source: str, size: int) -> None:
+    BATCH_SIZE.labels(source).observe(size)
+
+
+def count_errors(reason: str, count: int = 1) -> None:
+    if count:
+        PREDICTION_ERRORS.labels(reason).inc(count)
+
+
+async def track_requests(request: Request, call_next):
+    """
+    Http middleware with the latency and the number of requests in progress. The endpoint
+    is the path of the matched route, so the path parameters don't create new series
+    """
+    start = time.perf_counter()
+    status = 500
+    REQUESTS_IN_PROGRESS.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_PROGRESS.dec()
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.labels(request.method, endpoint, str(status)).observe(
+            time.perf_counter() - start
+        )
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Metrics in the Prometheus text format, and their content type
+    """
+    if os.getenv(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,95 @@
+"""
+    This file contains the micro-batching of /get_prediction. The windows of the requests
+    that arrive close together are scored with a single transform and predict call
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from model.serving.executor import ScoringExecutor
+from model.serving.metrics import observe_batch
+from model.serving.registry import ModelBundle
+from model.serving.scoring import score_window, score_window_batch
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collect the windows of concurrent requests until max_batch_size windows are waiting or
+    max_wait_ms milliseconds passed since the first one, then score them as one batch in the
+    executor and send each prediction back to its request. With max_batch_size <= 1 every
+    window is scored on its own. Each window is scored with the model its request read, a
+    batch is split when the model is swapped while its windows wait. Every waiting request
+    holds a slot of the executor, so a batch of n windows counts as n requests
+    """
+
+    def __init__(self, executor: ScoringExecutor, max_batch_size: int = 16, max_wait_ms: float = 2):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._waiting: List[Tuple[Optional[ModelBundle], Dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    async def predict(self, window: Dict, bundle: Optional[ModelBundle] = None) -> float:
+        """
+        Prediction of the window with bundle, by default with the active model of the registry
+        """
+        if not self.enabled:
+            return await self.executor.run(score_window, window, bundle=bundle)
+
+        self.executor.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiting.append((bundle, window, future))
+            if len(self._waiting) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+            return await future
+        finally:
+            self.executor.release()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._waiting = self._waiting, []
+        # Usually every window of the batch read the same model
+        groups = defaultdict(list)
+        for bundle, window, future in batch:
+            groups[None if bundle is None else bundle.version].append((bundle, window, future))
+        for group in groups.values():
+            # Keep a reference, the loop only holds weak references to its tasks
+            task = asyncio.get_running_loop().create_task(self._score(group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, batch: List[Tuple[Optional[ModelBundle], Dict, asyncio.Future]]) -> None:
+        bundle = batch[0][0]
+        windows = [window for _, window, _ in batch]
+        logger.debug(f"Scoring a micro-batch of {len(windows)} windows")
+        observe_batch("micro_batch", len(windows))
+        try:
+            results = await self.executor.run(
+                score_window_batch, windows, bundle=bundle, acquired=True
+            )
+        except Exception as e:
+            # e.g. Overloaded, every request of the batch gets the error
+            results = [(None, e)] * len(batch)
+
+        for (_, _, future), (pred, error) in zip(batch, results):
+            # The future is cancelled when its client goes away
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(pred)
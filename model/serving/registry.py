@@ -0,0 +1,209 @@
+"""
+    This file contains the registry of the model served by the api. It watches the
+    artifacts and swaps in a new data and model pipeline pair without restarting the service
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import joblib
+from sklearn.pipeline import Pipeline
+
+from model.serving.batch import min_window_size, predict_windows
+from model.serving.compiled import CompiledScorer
+from model.serving.schema import WindowSchema
+from model.utils.data_munging import prune_for_model
+from model.utils.instrumentation import timed_pipeline
+
+logger = logging.getLogger(__name__)
+
+DATA_PIPELINE_PATH = "data_pipeline.pkl"
+MODEL_PATH = "model/trained_model.pkl"
+MODEL_METRICS_PATH = "model/model_metrics.json"
+
+# (modification time, size) of each artifact, a change means there's a new pair to load
+Signature = Tuple[Tuple[int, int], ...]
+
+
+class ModelBundle(NamedTuple):
+    version: str
+    data_pipe: Pipeline  # Pruned to the features used by the model
+    model_pipe: Pipeline
+    scorer: Optional[CompiledScorer]
+    schema: WindowSchema  # Columns of the windows that data_pipe uses
+    metrics: Dict[str, float]  # Test metrics saved by the training, if any
+    loaded_at: str
+    load_seconds: float
+
+
+class ModelRegistry:
+    """
+    Hold the active ModelBundle. A background thread polls the artifacts every
+    reload_interval seconds, loads and warms a new pair off the request path and swaps it
+    in with a single assignment. Requests read current once, so in-flight requests keep
+    the pair they started with. A pair that fails to load or warm up is skipped and the
+    active one is kept until the artifacts change again
+    """
+
+    def __init__(self, artifact_dir: str, engine: str = "pipeline", reload_interval: float = 30):
+        self.artifact_dir = artifact_dir
+        self.engine = engine
+        self.reload_interval = reload_interval
+        self.current: Optional[ModelBundle] = None
+        self.last_error: Optional[str] = None
+        self._signature: Optional[Signature] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[ModelBundle], None]] = []
+
+    @property
+    def paths(self) -> Tuple[str, str]:
+        return (
+            os.path.join(self.artifact_dir, DATA_PIPELINE_PATH),
+            os.path.join(self.artifact_dir, MODEL_PATH),
+        )
+
+    def _signature_of_artifacts(self) -> Signature:
+        stats = [os.stat(path) for path in self.paths]
+        return tuple((stat.st_mtime_ns, stat.st_size) for stat in stats)
+
+    def add_listener(self, listener: Callable[[ModelBundle], None]) -> None:
+        """
+        Call listener with every pair that becomes the active one
+        """
+        self._listeners.append(listener)
+
+    def _activate(self, bundle: ModelBundle) -> None:
+        self.current, self.last_error = bundle, None
+        for listener in self._listeners:
+            listener(bundle)
+
+    def _read_metrics(self) -> Dict[str, float]:
+        # The training writes the metrics before the model, they belong to the new model
+        try:
+            with open(os.path.join(self.artifact_dir, MODEL_METRICS_PATH)) as f:
+                return {name: float(value) for name, value in json.load(f).items()}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Can't read the model metrics: {e}")
+            return {}
+
+    def _load_bundle(self) -> ModelBundle:
+        start = time.perf_counter()
+        digest = hashlib.sha256()
+        pipes = []
+        for path in self.paths:
+            with open(path, "rb") as f:
+                content = f.read()
+            digest.update(content)
+            pipes.append(joblib.load(io.BytesIO(content)))
+        data_pipe, model_pipe = pipes
+
+        scorer = None
+        if self.engine == "compiled":
+            try:
+                scorer = CompiledScorer(data_pipe, model_pipe)
+            except ValueError as e:
+                logger.warning(f"Can't compile the model, using the pipeline engine: {e}")
+        # The served pipelines record the time of each step
+        data_pipe = timed_pipeline(prune_for_model(data_pipe, model_pipe), "data_pipeline")
+        model_pipe = timed_pipeline(model_pipe, "model_pipeline")
+        self._warm_up(data_pipe, model_pipe, scorer)
+
+        return ModelBundle(
+            version=digest.hexdigest()[:12],
+            data_pipe=data_pipe,
+            model_pipe=model_pipe,
+            scorer=scorer,
+            schema=WindowSchema(data_pipe, min_rows=min_window_size(data_pipe)),
+            metrics=self._read_metrics(),
+            loaded_at=datetime.now(timezone.utc).isoformat(),
+            load_seconds=time.perf_counter() - start,
+        )
+
+    @staticmethod
+    def _warm_up(data_pipe: Pipeline, model_pipe: Pipeline, scorer: Optional[CompiledScorer]):
+        """
+        Score a window of zeros, it fails if the data and model pipelines don't match
+        """
+        input_cols = data_pipe.steps[0][1].cols
+        window = {col: [0.0] * min_window_size(data_pipe) for col in input_cols}
+        if scorer is not None:
+            scorer.predict_window(window)
+        else:
+            ((_, error),) = predict_windows(data_pipe, model_pipe, [window])
+            if error is not None:
+                raise ValueError(error)
+
+    def load(self) -> ModelBundle:
+        """
+        Load the artifacts and make them the active pair
+        """
+        signature = self._signature_of_artifacts()
+        bundle = self._load_bundle()
+        self._signature = signature
+        self._activate(bundle)
+        logger.info(f"Serving the model version {bundle.version}")
+        return bundle
+
+    def reload_if_changed(self) -> bool:
+        """
+        Load the artifacts if they changed since the last attempt, True if a new pair
+        was swapped in
+        """
+        try:
+            signature = self._signature_of_artifacts()
+        except OSError as e:
+            logger.warning(f"Can't read the artifacts: {e}")
+            return False
+        if signature == self._signature:
+            return False
+
+        self._signature = signature
+        logger.info("The artifacts changed, loading the new model")
+        try:
+            bundle = self._load_bundle()
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.exception(f"Keeping the model version {self.current.version}")
+            return False
+
+        old_version = self.current.version if self.current else None
+        self._activate(bundle)
+        logger.info(f"Swapped the model version {old_version} for {bundle.version}")
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            self.reload_if_changed()
+
+    def start(self) -> None:
+        if self.reload_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="model-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def status(self) -> Dict:
+        bundle = self.current
+        return {
+            "version": bundle.version if bundle else None,
+            # The compiled engine falls back to the pipelines for the models it can't compile
+            "engine": ("compiled" if bundle.scorer else "pipeline") if bundle else self.engine,
+            "loaded_at": bundle.loaded_at if bundle else None,
+            "load_seconds": bundle.load_seconds if bundle else None,
+            "metrics": bundle.metrics if bundle else None,
+            "reload_interval": self.reload_interval,
+            "last_error": self.last_error,
+        }
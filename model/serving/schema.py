@@ -0,0 +1,99 @@
+"""
+    This file contains the schema of the windows of the api, compiled from the columns that
+    the fitted data pipeline uses. The payloads are checked and parsed into NumPy arrays
+    before they reach the scoring
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+import orjson
+from sklearn.pipeline import Pipeline
+
+from model.utils.data_munging import FixingFormattedString, TakeVariables
+
+
+class PayloadError(ValueError):
+    """
+    Raised when a payload doesn't match the schema of the active model
+    """
+
+
+def decode_payload(body: bytes, field: str) -> Any:
+    """
+    Decode a JSON body and return its field
+    """
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise PayloadError(f"The body is not valid JSON: {e}")
+    if not isinstance(payload, dict) or field not in payload:
+        raise PayloadError(f"The body must be an object with the field {field}")
+    return payload[field]
+
+
+class WindowSchema:
+    """
+    Input columns of a data pipeline, in the order of its first TakeVariables step, and the
+    FixingFormattedString steps that read their formatted strings. parse only reads these
+    columns, the rest of the columns of the payload are ignored
+    """
+
+    def __init__(self, data_pipe: Pipeline, min_rows: int = 1):
+        first_step = data_pipe.steps[0][1]
+        if not isinstance(first_step, TakeVariables):
+            raise ValueError("The data pipeline must start with a TakeVariables step")
+        self.columns: List[str] = list(first_step.cols)
+        self.formatters: Dict[str, FixingFormattedString] = {
+            col: step
+            for _, step in data_pipe.steps
+            if isinstance(step, FixingFormattedString)
+            for col in step.cols
+        }
+        self.min_rows = min_rows
+
+    def _parse_column(self, col: str, values: list) -> np.ndarray:
+        formatter = self.formatters.get(col)
+        if formatter is not None and any(isinstance(x, str) for x in values):
+            if not all(x is None or isinstance(x, str) for x in values):
+                raise PayloadError(f"The column {col} mixes formatted strings and numbers")
+            # The windows are a few periods long, parsing value by value is faster
+            try:
+                return np.array(
+                    [np.nan if x is None else formatter.casting_finance(x) for x in values],
+                    dtype=float,
+                )
+            except (ValueError, IndexError) as e:
+                raise PayloadError(
+                    f"The column {col} has invalid {formatter.cols_type} values: {e}"
+                )
+        try:
+            return np.array(values, dtype=float)
+        except (TypeError, ValueError):
+            raise PayloadError(f"The column {col} must only hold numbers or nulls")
+
+    def parse(self, window: Any) -> Dict[str, np.ndarray]:
+        """
+        Check a window and parse its columns into the rows of a single (columns, periods)
+        array. Returns the columns of the schema, each one a view of its row
+        """
+        if not isinstance(window, dict):
+            raise PayloadError("The window must be a mapping of column -> values")
+        missing = [col for col in self.columns if col not in window]
+        if missing:
+            raise PayloadError(f"The window is missing the columns {missing}")
+
+        first = window[self.columns[0]]
+        n_rows = len(first) if isinstance(first, list) else 0
+        if n_rows < self.min_rows:
+            raise PayloadError(f"The window needs at least {self.min_rows} periods")
+
+        values = np.empty((len(self.columns), n_rows))
+        for row, col in zip(values, self.columns):
+            col_values = window[col]
+            if not isinstance(col_values, list) or len(col_values) != n_rows:
+                raise PayloadError(f"The column {col} must be a list of {n_rows} values")
+            parsed = self._parse_column(col, col_values)
+            if parsed.shape != row.shape:
+                raise PayloadError(f"The column {col} must be a list of {n_rows} numbers")
+            row[:] = parsed
+        return dict(zip(self.columns, values))
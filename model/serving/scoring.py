@@ -0,0 +1,65 @@
+"""
+    This file contains the scoring functions of the api endpoints. They receive the model
+    bundle to use, so they can run in the event loop, a thread or a worker process
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from model.serving.batch import MISSING_FEATURES, WindowResult, predict_windows
+from model.serving.registry import ModelBundle
+from model.serving.schema import PayloadError
+from model.utils.instrumentation import STAGE_TIMINGS
+
+logger = logging.getLogger(__name__)
+
+
+def score_window(bundle: ModelBundle, data: Dict) -> float:
+    """
+    Prediction of the last period of the data of /get_prediction. Raises a PayloadError if
+    the last period has missing features, like the compiled scorer
+    """
+    if bundle.scorer is not None:
+        with STAGE_TIMINGS.time("compiled_scorer", "predict_window"):
+            return bundle.scorer.predict_window(data)
+
+    data = pd.DataFrame(data)
+
+    logger.debug("Applying tranform")
+    data_prec = bundle.data_pipe.transform(data).tail(1)
+    if data_prec.isna().to_numpy().any():
+        raise PayloadError(MISSING_FEATURES)
+    logger.debug("Making predictions")
+    preds = bundle.model_pipe.predict(data_prec)
+    return float(preds[0])
+
+
+def score_windows(bundle: ModelBundle, windows: List[Dict]) -> List[WindowResult]:
+    """
+    Predictions of the windows of /get_batch_prediction
+    """
+    if bundle.scorer is not None:
+        with STAGE_TIMINGS.time("compiled_scorer", "predict_windows"):
+            return bundle.scorer.predict_windows(windows)
+    return predict_windows(bundle.data_pipe, bundle.model_pipe, windows)
+
+
+def score_window_batch(
+    bundle: ModelBundle, windows: List[Dict]
+) -> List[Tuple[Optional[float], Optional[Exception]]]:
+    """
+    Predictions of the windows of many /get_prediction requests with a single transform and
+    predict. The windows that the batch can't score are scored alone with score_window, so
+    every request gets the same prediction or error it would get on its own
+    """
+    results = []
+    for window, (pred, error) in zip(windows, score_windows(bundle, windows)):
+        if error is None:
+            results.append((pred, None))
+            continue
+        try:
+            results.append((score_window(bundle, window), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
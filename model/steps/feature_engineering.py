@@ -1,8 +1,8 @@
 import os
-import joblib
 import pandas as pd
 import logging
 import fire
+from typing import List, Tuple
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 
@@ -10,28 +10,25 @@ from model.utils.constants import CITY_COLS, PIB_COLS, IMACEC_INDICE_COLS, TAKE_
 from model.utils.constants import TARGET_COL
 
 from model.utils.config import ARTIFACT_DIR, INTERM_DIR, FEATURE_DIR, MERGED_FILE_NAME
+from model.utils.config import STORAGE_FORMAT
+from model.utils.instrumentation import timed_pipeline
+from model.utils.periods import period_index
+from model.utils.storage import dump_artifact, load_table, save_table
 
 from model.utils.data_munging import (
     FixingFormattedString,
     TakeVariables,
     RollingTransformer,
+    prune_pipeline,
 )
 
 logger = logging.getLogger(__name__)
 
 
-def feature_engineering(base_path: str, dry_run: bool = False) -> None:
+def make_data_pipeline() -> Pipeline:
     """
-    This function will execute the data preprocessing and serialize the data pipeline
+    Data pipeline pruned to compute only the columns used by its last step
     """
-
-    logger.info("=======================================================")
-    if dry_run:
-        logger.info("Dry run activated - Running feature engineering")
-    else:
-        logger.info("Dry run is not activated - Running feature engineering")
-    logger.info("=======================================================")
-
     # The pipeline is divided in two parts due to the presence of null values
     pipe = Pipeline(
         [
@@ -41,30 +38,36 @@ def feature_engineering(base_path: str, dry_run: bool = False) -> None:
                 FixingFormattedString(IMACEC_INDICE_COLS, "IMACEC_INDICE"),
             ),
             (
-                "rolling_with_mean",
+                "rolling_with_mean_std",
                 RollingTransformer(
-                    ["Precio_leche"] + CITY_COLS + PIB_COLS + IMACEC_INDICE_COLS, "mean"
-                ),
-            ),
-            (
-                "rolling_with_std",
-                RollingTransformer(
-                    ["Precio_leche"] + CITY_COLS + PIB_COLS + IMACEC_INDICE_COLS, "std"
+                    ["Precio_leche"] + CITY_COLS + PIB_COLS + IMACEC_INDICE_COLS, ["mean", "std"]
                 ),
             ),
             ("take_vars_before_scaler", TakeVariables(TAKE_VARS)),
         ]
     )
-    logger.info(f"The current pipeline is:\n {pipe}")
+    return prune_pipeline(pipe)
+
+
+def merged_columns(pipe: Pipeline) -> List[str]:
+    """
+    Columns of the merged table used by the data pipeline, the period and the target
+    """
+    return list(dict.fromkeys(["anio", "mes"] + pipe.steps[0][1].cols + [TARGET_COL]))
+
 
-    # Read the data and set the period as index
-    df_merge = pd.read_csv(os.path.join(base_path, INTERM_DIR, f"{MERGED_FILE_NAME}.csv"))
-    df_merge["Periodo"] = df_merge.apply(lambda x: str(int(x.anio)) + "-" + str(int(x.mes)), axis=1)
-    df_merge.set_index("Periodo", inplace=True)
+def build_features(pipe: Pipeline, df_merge: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Fit the data pipeline on the merged table and split its output in the train and test sets
+    """
+    df_merge = df_merge[merged_columns(pipe)]
+    df_merge.index = period_index(df_merge["anio"], df_merge["mes"])
 
     # Apply the first step of the preprocessing and remove nan
     logger.debug("Applying fit_transform to features")
-    df_prec = pipe.fit_transform(df_merge.drop(TARGET_COL, axis=1), df_merge[TARGET_COL])
+    df_prec = timed_pipeline(pipe, "data_pipeline").fit_transform(
+        df_merge.drop(TARGET_COL, axis=1), df_merge[TARGET_COL]
+    )
     df_interm = pd.concat((df_merge[TARGET_COL], df_prec), axis=1)
     df_interm = df_interm.dropna()
 
@@ -77,14 +80,43 @@ def feature_engineering(base_path: str, dry_run: bool = False) -> None:
     )
     df_prec_train = pd.concat((df_interm_y_train, pd.DataFrame(df_interm_X_train)), axis=1)
     df_prec_test = pd.concat((df_interm_y_test, pd.DataFrame(df_interm_X_test)), axis=1)
+    return df_prec_train, df_prec_test
+
+
+def feature_engineering(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+) -> None:
+    """
+    This function will execute the data preprocessing and serialize the data pipeline
+    The train and test sets are saved with storage_format, export_csv also saves a csv copy
+    """
+
+    logger.info("=======================================================")
+    if dry_run:
+        logger.info("Dry run activated - Running feature engineering")
+    else:
+        logger.info("Dry run is not activated - Running feature engineering")
+    logger.info("=======================================================")
+
+    pipe = make_data_pipeline()
+    logger.info(f"The current pipeline is:\n {pipe}")
+
+    # Read only the columns used by the pipeline
+    df_merge = load_table(
+        base_path, INTERM_DIR, MERGED_FILE_NAME, storage_format, columns=merged_columns(pipe)
+    )
+    df_prec_train, df_prec_test = build_features(pipe, df_merge)
 
     if not dry_run:
         logger.info("Saving features")
-        df_prec_train.to_csv(os.path.join(base_path, FEATURE_DIR, "train.csv"), index=False)
-        df_prec_test.to_csv(os.path.join(base_path, FEATURE_DIR, "test.csv"), index=False)
+        save_table(df_prec_train, base_path, FEATURE_DIR, "train", storage_format, export_csv)
+        save_table(df_prec_test, base_path, FEATURE_DIR, "test", storage_format, export_csv)
 
         logger.info("Saving data pipeline")
-        joblib.dump(pipe, os.path.join(base_path, ARTIFACT_DIR, "data_pipeline.pkl"))
+        dump_artifact(pipe, os.path.join(base_path, ARTIFACT_DIR, "data_pipeline.pkl"))
 
 
 if __name__ == "__main__":
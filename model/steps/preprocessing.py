@@ -1,5 +1,9 @@
 import os
 import logging
+from functools import partial
+from typing import Dict, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
 import pandas as pd
 import fire
 
@@ -7,120 +11,390 @@ from model.utils.constants import MERGE_COLS, MILK_COLS, BANK_COLS, PREP_COLS
 from model.utils.constants import TARGET_COL
 
 from model.utils.config import MILK_FILE_NAME, PREP_FILE_NAME, BANK_FILE_NAME
-from model.utils.config import MERGED_FILE_NAME
-from model.utils.config import RAW_DIR, INTERM_DIR
+from model.utils.config import MERGED_FILE_NAME, PREPROCESSING_STATE_FILE_NAME
+from model.utils.config import RAW_DIR, INTERM_DIR, STORAGE_FORMAT
+from model.utils.incremental import (
+    changed_periods,
+    load_state,
+    period_hashes,
+    save_state,
+    update_table,
+)
+from model.utils.parallel import run_per_source
+from model.utils.periods import period_keys, split_dates, to_period
+from model.utils.storage import load_table, save_table, table_path
 
 logger = logging.getLogger(__name__)
 
+MONTHS = {
+    "Ene": 1,
+    "Feb": 2,
+    "Mar": 3,
+    "Abr": 4,
+    "May": 5,
+    "Jun": 6,
+    "Jul": 7,
+    "Ago": 8,
+    "Sep": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Dic": 12,
+}
+
+
+def read_raw_data(base_path: str, name: str) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(base_path, RAW_DIR, f"{name}.csv"))
+
+
+def clean_milk_data(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.rename(columns={"Anio": "anio", "Mes": "mes"})
+    df["mes"] = df["mes"].replace(MONTHS)
+    return df[MILK_COLS]
+
+
+def clean_prep_data(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
+    df[["anio", "mes"]] = split_dates(df["date"])
+    return df[PREP_COLS]
+
+
+def clean_bank_data(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["Periodo"] = pd.to_datetime(df["Periodo"], infer_datetime_format=True, errors="coerce")
 
-def prepare_milk_data(base_path: str, dry_run: bool = False) -> None:
+    original_size = len(df)
+    df = df.drop_duplicates(subset="Periodo")
+    logger.debug(f"Dropping duplicated {original_size - df.shape[0]} records")
+    df[["anio", "mes"]] = split_dates(df["Periodo"])
+
+    original_shape = df.shape
+    df = df[BANK_COLS].dropna()
+    logger.debug(f"The df was reduced from {original_shape} to {df.shape} after dropna operation")
+    return df
+
+
+def merge_tables(
+    df_milk: pd.DataFrame, df_prep: pd.DataFrame, df_bank: pd.DataFrame
+) -> pd.DataFrame:
     """
-    This function will prepare the data and create columns for the merge step
+    Merge the prepared tables and shift the variables one period
     """
-    df = pd.read_csv(os.path.join(base_path, RAW_DIR, f"{MILK_FILE_NAME}.csv"))
+    df_merge = pd.merge(df_prep, df_bank, on=["mes", "anio"], how="inner")
+    df_merge = pd.merge(df_merge, df_milk, on=["mes", "anio"], how="inner")
+    df_merge = df_merge.sort_values(by=["anio", "mes"], ascending=True).reset_index(drop=True)
 
-    df.rename(columns={"Anio": "anio", "Mes": "mes"}, inplace=True)
-    df["mes"] = df["mes"].replace(
-        {
-            "Ene": 1,
-            "Feb": 2,
-            "Mar": 3,
-            "Abr": 4,
-            "May": 5,
-            "Jun": 6,
-            "Jul": 7,
-            "Ago": 8,
-            "Sep": 9,
-            "Oct": 10,
-            "Nov": 11,
-            "Dic": 12,
-        }
+    # Shift variables
+    # Shift operations won"t be part of the production pipeline
+    df_merge[TARGET_COL] = df_merge["Precio_leche"]
+    df_merge[MERGE_COLS] = df_merge[MERGE_COLS].shift(1)
+    return df_merge[MERGE_COLS + [TARGET_COL]].dropna()
+
+
+def preprocess_tables(
+    raws: Dict[str, pd.DataFrame]
+) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+    """
+    Prepared table of each raw source and their merge, without reading or writing files
+    """
+    prepared = {name: SOURCES[name][0](raw) for name, raw in raws.items()}
+    df_merge = merge_tables(
+        prepared[MILK_FILE_NAME], prepared[PREP_FILE_NAME], prepared[BANK_FILE_NAME]
     )
+    return prepared, df_merge
+
+
+def raw_milk_periods(df: pd.DataFrame) -> np.ndarray:
+    return period_keys(df["Anio"], df["Mes"].map(MONTHS))
+
+
+def raw_prep_periods(df: pd.DataFrame) -> np.ndarray:
+    periods = split_dates(pd.to_datetime(df["date"], format="%Y-%m-%d"))
+    return period_keys(periods["anio"], periods["mes"])
+
+
+def raw_bank_periods(df: pd.DataFrame) -> np.ndarray:
+    dates = pd.to_datetime(df["Periodo"], infer_datetime_format=True, errors="coerce")
+    periods = split_dates(dates)
+    return period_keys(periods["anio"], periods["mes"])
+
+
+# Cleaning function, period of each raw row and name of the log messages of every source
+SOURCES = {
+    MILK_FILE_NAME: (clean_milk_data, raw_milk_periods, "milk"),
+    PREP_FILE_NAME: (clean_prep_data, raw_prep_periods, "prep"),
+    BANK_FILE_NAME: (clean_bank_data, raw_bank_periods, "bank"),
+}
+
+
+class SourceUpdate(NamedTuple):
+    table: pd.DataFrame
+    hashes: Dict[str, str]  # Hash of each period of the raw source
+    old_periods: Set[float]  # Periods of the previous prepared table
+    changed: Set[float]
+
+
+def prepare_milk_data(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+) -> None:
+    """
+    This function will prepare the data and create columns for the merge step
+    """
+    df = clean_milk_data(read_raw_data(base_path, MILK_FILE_NAME))
 
     if dry_run:
         logger.info("Skipping saving")
     else:
         logger.info("Saving milk data")
-        df[MILK_COLS].to_csv(
-            os.path.join(base_path, INTERM_DIR, f"prepare_{MILK_FILE_NAME}.csv"), index=False
+        save_table(
+            df, base_path, INTERM_DIR, f"prepare_{MILK_FILE_NAME}", storage_format, export_csv
         )
 
 
-def prepare_prep_data(base_path: str, dry_run: bool = False) -> None:
+def prepare_prep_data(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+) -> None:
     """
     This function will prepare the data and create columns for the merge step
     """
-    df = pd.read_csv(os.path.join(base_path, RAW_DIR, f"{PREP_FILE_NAME}.csv"))
-
-    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
-    df[["mes", "anio"]] = df["date"].apply(lambda x: pd.Series([x.month, x.year]))
+    df = clean_prep_data(read_raw_data(base_path, PREP_FILE_NAME))
 
     if dry_run:
         logger.info("Skipping saving")
     else:
         logger.info("Saving prep data")
-        df[PREP_COLS].to_csv(
-            os.path.join(base_path, INTERM_DIR, f"prepare_{PREP_FILE_NAME}.csv"), index=False
+        save_table(
+            df, base_path, INTERM_DIR, f"prepare_{PREP_FILE_NAME}", storage_format, export_csv
         )
 
 
-def prepare_bank_data(base_path: str, dry_run: bool = False) -> None:
+def prepare_bank_data(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+) -> None:
     """
     This function will prepare the data and create columns for the merge step
     """
-    df = pd.read_csv(os.path.join(base_path, RAW_DIR, f"{BANK_FILE_NAME}.csv"))
-
-    df["Periodo"] = pd.to_datetime(df["Periodo"], infer_datetime_format=True, errors="coerce")
-
-    original_size = len(df)
-    df = df.drop_duplicates(subset="Periodo")
-    logger.debug(f"Dropping duplicated {original_size - df.shape[0]} records")
-    df[["anio", "mes"]] = df["Periodo"].apply(lambda x: pd.Series([x.year, x.month]))
-
-    original_shape = df.shape
-    df = df[BANK_COLS].dropna()
-    logger.debug(f"The df was reduced from {original_shape} to {df.shape} after dropna operation")
+    df = clean_bank_data(read_raw_data(base_path, BANK_FILE_NAME))
 
     if dry_run:
         logger.info("Skipping saving")
     else:
         logger.info("Saving bank data")
-        df[BANK_COLS].to_csv(
-            os.path.join(base_path, INTERM_DIR, f"prepare_{BANK_FILE_NAME}.csv"), index=False
+        save_table(
+            df, base_path, INTERM_DIR, f"prepare_{BANK_FILE_NAME}", storage_format, export_csv
         )
 
 
-def merge_data(base_path: str, dry_run: bool = False) -> None:
+def merge_data(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+) -> None:
     """
     This function will merge the data from 3 sources. Using the path, the function
     will read the data sources from the previous step
     """
-    df_bank = pd.read_csv(os.path.join(base_path, INTERM_DIR, f"prepare_{MILK_FILE_NAME}.csv"))
-    df_milk = pd.read_csv(os.path.join(base_path, INTERM_DIR, f"prepare_{PREP_FILE_NAME}.csv"))
-    df_prec = pd.read_csv(os.path.join(base_path, INTERM_DIR, f"prepare_{BANK_FILE_NAME}.csv"))
+    df_milk = load_table(base_path, INTERM_DIR, f"prepare_{MILK_FILE_NAME}", storage_format)
+    df_prep = load_table(base_path, INTERM_DIR, f"prepare_{PREP_FILE_NAME}", storage_format)
+    df_bank = load_table(base_path, INTERM_DIR, f"prepare_{BANK_FILE_NAME}", storage_format)
 
-    df_merge = pd.merge(df_milk, df_prec, on=["mes", "anio"], how="inner")
-    df_merge = pd.merge(df_merge, df_bank, on=["mes", "anio"], how="inner")
-    df_merge = df_merge.sort_values(by=["anio", "mes"], ascending=True).reset_index(drop=True)
-
-    # Shift variables
-    # Shift operations won"t be part of the production pipeline
-    df_merge[TARGET_COL] = df_merge["Precio_leche"]
-    df_merge[MERGE_COLS] = df_merge[MERGE_COLS].shift(1)
+    df_merge = merge_tables(df_milk, df_prep, df_bank)
 
     if dry_run:
         logger.info("Skipping saving")
     else:
         logger.info("Saving merging data")
-        df_merge[MERGE_COLS + [TARGET_COL]].dropna().to_csv(
-            os.path.join(base_path, INTERM_DIR, f"{MERGED_FILE_NAME}.csv"), index=False
+        save_table(df_merge, base_path, INTERM_DIR, MERGED_FILE_NAME, storage_format, export_csv)
+
+
+def _load_previous_state(base_path: str, storage_format: str) -> Optional[Dict]:
+    """
+    State of the last incremental run, None when the tables have to be built from scratch
+    """
+    state = load_state(os.path.join(base_path, INTERM_DIR, f"{PREPROCESSING_STATE_FILE_NAME}.json"))
+    names = [f"prepare_{name}" for name in SOURCES] + [MERGED_FILE_NAME]
+    if (
+        state is None
+        or state["storage_format"] != storage_format
+        or not all(
+            os.path.exists(table_path(base_path, INTERM_DIR, name, storage_format))
+            for name in names
+        )
+    ):
+        return None
+    return state
+
+
+def _has_single_row_per_period(name: str, raw: pd.DataFrame, raw_keys: np.ndarray) -> bool:
+    """
+    Rows without period or repeated periods can't be replaced period by period
+    """
+    if name == BANK_FILE_NAME:
+        # The repeated dates are dropped by the cleaning, but not other dates of a period
+        dates = pd.to_datetime(raw["Periodo"], infer_datetime_format=True, errors="coerce")
+        return dates.nunique() == pd.Series(raw_keys).nunique()
+    return not (np.isnan(raw_keys).any() or pd.Series(raw_keys).duplicated().any())
+
+
+def update_source(
+    base_path: str,
+    name: str,
+    state: Optional[Dict],
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+) -> Optional[SourceUpdate]:
+    """
+    Clean the periods of a source that changed since the state and save its prepared
+    table. None when the source can't be updated period by period
+    """
+    clean, raw_periods, log_name = SOURCES[name]
+    raw = read_raw_data(base_path, name)
+    raw_keys = raw_periods(raw)
+    if not _has_single_row_per_period(name, raw, raw_keys):
+        logger.warning(f"{name} doesn't have a single row per period")
+        return None
+    hashes = period_hashes(raw, raw_keys)
+
+    if state is None:
+        logger.debug(f"Starting preprocessing with {log_name} data")
+        table = clean(raw)
+        changed, old_periods = {float(key) for key in hashes}, set()
+    else:
+        old = load_table(base_path, INTERM_DIR, f"prepare_{name}", storage_format)
+        old_periods = set(period_keys(old["anio"], old["mes"]))
+        changed = changed_periods(state["periods"][name], hashes)
+        logger.debug(f"{len(changed)} periods changed in {log_name} data")
+        if not changed:
+            return SourceUpdate(old, hashes, old_periods, changed)
+
+        # The rows without period are dropped by the cleaning, but they still set the
+        # dtypes of the cleaned table like in a full rebuild
+        mask = np.isin(raw_keys, list(changed)) | np.isnan(raw_keys)
+        new_rows = clean(raw[mask]) if mask.any() else old.iloc[:0]
+        order = pd.Series(np.arange(len(raw_keys)), index=raw_keys)
+        order = order[~order.index.duplicated()]
+        table = update_table(old, new_rows, changed, order)
+
+    if dry_run:
+        logger.info("Skipping saving")
+    else:
+        logger.info(f"Saving {log_name} data")
+        save_table(table, base_path, INTERM_DIR, f"prepare_{name}", storage_format, export_csv)
+    return SourceUpdate(table, hashes, old_periods, changed)
+
+
+def update_assets(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+    n_workers: int = 1,
+) -> None:
+    """
+    Incremental version of the preprocessing. Only the periods that are new, changed or
+    were removed since the last run are cleaned and replaced in the prepared tables, and
+    merge_data is recomputed from the last merged period before the first changed one,
+    so the shift(1) at the boundary uses the right previous period. The tables are the
+    same as the ones of a full rebuild
+    """
+    state = _load_previous_state(base_path, storage_format)
+    if state is None:
+        logger.info("There's no previous incremental state, processing every period")
+    else:
+        logger.info(f"Processing the periods changed since the watermark {state['watermark']}")
+
+    updates = run_per_source(
+        {
+            name: partial(
+                update_source, base_path, name, state, dry_run, storage_format, export_csv
+            )
+            for name in SOURCES
+        },
+        n_workers,
+    )
+    if any(update is None for update in updates.values()):
+        logger.warning("Running a full rebuild")
+        return preprocess_assets(
+            base_path, dry_run, storage_format, export_csv, n_workers=n_workers
         )
 
+    tables = {name: update.table for name, update in updates.items()}
+    hashes = {name: update.hashes for name, update in updates.items()}
+    old_periods = {name: update.old_periods for name, update in updates.items()}
+    changed = set().union(*(update.changed for update in updates.values()))
 
-def preprocess_assets(base_path: str, dry_run: bool = False) -> None:
+    df_milk, df_prep, df_bank = (tables[name] for name in SOURCES)
+    df_merge = None
+    if state is None:
+        df_merge = merge_tables(df_milk, df_prep, df_bank)
+    else:
+        # Only the changed periods that are or were part of the merge move its rows
+        merged_periods = set.intersection(
+            *(set(period_keys(df["anio"], df["mes"])) for df in tables.values())
+        )
+        affected = changed & (merged_periods | set.intersection(*old_periods.values()))
+        if not affected:
+            logger.info("The merged data doesn't change")
+        else:
+            # The row of the last merged period before the changes takes the values of
+            # the next period, it's recomputed with the rest of the changed rows
+            previous = [key for key in merged_periods if key < min(affected)]
+            if not previous:
+                df_merge = merge_tables(df_milk, df_prep, df_bank)
+            else:
+                anchor = max(previous)
+                logger.debug(f"Merging the periods since {to_period(anchor)}")
+                df_new = merge_tables(
+                    *(
+                        df[period_keys(df["anio"], df["mes"]) >= anchor]
+                        for df in (df_milk, df_prep, df_bank)
+                    )
+                )
+                df_old = load_table(base_path, INTERM_DIR, MERGED_FILE_NAME, storage_format)
+                kept = df_old[period_keys(df_old["anio"], df_old["mes"]) < anchor]
+                df_merge = pd.concat((kept, df_new)).astype(df_new.dtypes.to_dict())
+
+    watermark = to_period(max(float(key) for source in hashes.values() for key in source))
+    if dry_run:
+        logger.info("Skipping saving")
+    else:
+        if df_merge is not None:
+            logger.info("Saving merging data")
+            save_table(
+                df_merge, base_path, INTERM_DIR, MERGED_FILE_NAME, storage_format, export_csv
+            )
+        logger.info(f"Saving the watermark {watermark}")
+        save_state(
+            os.path.join(base_path, INTERM_DIR, f"{PREPROCESSING_STATE_FILE_NAME}.json"),
+            {"storage_format": storage_format, "watermark": watermark, "periods": hashes},
+        )
+
+
+def preprocess_assets(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+    incremental: bool = False,
+    n_workers: int = 1,
+) -> None:
     """
     Preprocess the data and create an intermidiate table which will be used in
-    feature engineering
+    feature engineering. The tables are saved with storage_format, export_csv also
+    saves a csv copy of them. incremental only processes the periods that changed since
+    the last incremental run, see update_assets. The sources are prepared in n_workers
+    processes before they are merged
     """
 
     if dry_run:
@@ -128,17 +402,32 @@ def preprocess_assets(base_path: str, dry_run: bool = False) -> None:
     else:
         logger.info("Dry run is not activated - Running preprocessing")
 
-    logger.debug("Starting preprocessing with milk data")
-    prepare_milk_data(base_path, dry_run)
-
-    logger.debug("Starting preprocessing with prep data")
-    prepare_prep_data(base_path, dry_run)
+    if incremental:
+        return update_assets(base_path, dry_run, storage_format, export_csv, n_workers)
 
-    logger.debug("Starting preprocessing with bank data")
-    prepare_bank_data(base_path, dry_run)
+    # The sources are independent until the merge
+    run_per_source(
+        {
+            MILK_FILE_NAME: partial(
+                prepare_milk_data, base_path, dry_run, storage_format, export_csv
+            ),
+            PREP_FILE_NAME: partial(
+                prepare_prep_data, base_path, dry_run, storage_format, export_csv
+            ),
+            BANK_FILE_NAME: partial(
+                prepare_bank_data, base_path, dry_run, storage_format, export_csv
+            ),
+        },
+        n_workers,
+    )
 
     logger.debug("Creating intermediate data")
-    merge_data(base_path, dry_run)
+    merge_data(base_path, dry_run, storage_format, export_csv)
+
+    # The tables no longer match the state of the last incremental run
+    state_path = os.path.join(base_path, INTERM_DIR, f"{PREPROCESSING_STATE_FILE_NAME}.json")
+    if not dry_run and os.path.exists(state_path):
+        os.remove(state_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+"""
+    This file contains the in-process runner of the steps. It runs the validation,
+    preprocessing, feature engineering, tuning and training in a single process, passing
+    the tables between the steps in memory: the raw files are read once and the
+    intermediate tables are only written if requested
+"""
+import os
+import logging
+
+import fire
+
+from model.steps.feature_engineering import build_features, make_data_pipeline
+from model.steps.preprocessing import preprocess_tables, read_raw_data
+from model.steps.training import fit_model, save_best_params, save_model, search_best_params
+from model.steps.validation import check_violations, load_schemas, validate_table
+from model.utils.config import ARTIFACT_DIR, FEATURE_DIR, INTERM_DIR, STORAGE_FORMAT
+from model.utils.config import MERGED_FILE_NAME, PREPROCESSING_STATE_FILE_NAME
+from model.utils.constants import SEARCH_HALVING_FACTOR, SEARCH_N_ITER, TUNING_CACHE_BYTES_LIMIT
+from model.utils.instrumentation import STAGE_TIMINGS
+from model.utils.storage import dump_artifact, save_table
+from model.utils.tuning import score_cache
+
+logger = logging.getLogger(__name__)
+
+
+def run_all(
+    base_path: str,
+    dry_run: bool = False,
+    save_intermediate: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+    search: str = "grid",
+    n_iter: int = SEARCH_N_ITER,
+    factor: int = SEARCH_HALVING_FACTOR,
+    n_jobs: int = -1,
+    cache_limit: str = TUNING_CACHE_BYTES_LIMIT,
+    poly_solver: str = "features",
+) -> None:
+    """
+    Run every step of the model on the raw files of base_path and save the data pipeline,
+    the best params, the trained model and its metrics, like the steps run one by one.
+    save_intermediate also saves the prepared, merged, train and test tables with
+    storage_format, for the steps run on their own. Each step is timed under ("run_all", step)
+    """
+    logger.info("=======================================================")
+    if dry_run:
+        logger.info("Dry run activated - Running all the steps")
+    else:
+        logger.info("Dry run is not activated - Running all the steps")
+    logger.info("=======================================================")
+    save_tables = save_intermediate and not dry_run
+
+    with STAGE_TIMINGS.time("run_all", "validate_assets"):
+        schemas = load_schemas(base_path)
+        raws = {name: read_raw_data(base_path, name) for name in schemas}
+        check_violations(
+            [
+                violation
+                for name in schemas
+                for violation in validate_table(name, raws[name], schemas[name])
+            ]
+        )
+
+    with STAGE_TIMINGS.time("run_all", "preprocess_assets"):
+        prepared, df_merge = preprocess_tables(raws)
+        if save_tables:
+            logger.info("Saving intermediate data")
+            for name, df in prepared.items():
+                save_table(df, base_path, INTERM_DIR, f"prepare_{name}", storage_format, export_csv)
+            save_table(
+                df_merge, base_path, INTERM_DIR, MERGED_FILE_NAME, storage_format, export_csv
+            )
+            # The tables no longer match the state of the last incremental run
+            state_path = os.path.join(
+                base_path, INTERM_DIR, f"{PREPROCESSING_STATE_FILE_NAME}.json"
+            )
+            if os.path.exists(state_path):
+                os.remove(state_path)
+
+    with STAGE_TIMINGS.time("run_all", "feature_engineering"):
+        pipe = make_data_pipeline()
+        logger.info(f"The current pipeline is:\n {pipe}")
+        train, test = build_features(pipe, df_merge)
+        if save_tables:
+            logger.info("Saving features")
+            save_table(train, base_path, FEATURE_DIR, "train", storage_format, export_csv)
+            save_table(test, base_path, FEATURE_DIR, "test", storage_format, export_csv)
+        if not dry_run:
+            logger.info("Saving data pipeline")
+            dump_artifact(pipe, os.path.join(base_path, ARTIFACT_DIR, "data_pipeline.pkl"))
+
+    with STAGE_TIMINGS.time("run_all", "hypertune_model"):
+        best_params = search_best_params(
+            train, search, n_iter, factor, n_jobs, cache_limit, poly_solver, score_cache(base_path)
+        )
+        if not dry_run:
+            logger.info("Saving best parameters")
+            save_best_params(base_path, best_params)
+
+    with STAGE_TIMINGS.time("run_all", "training_model"):
+        model_pipe, metrics = fit_model(
+            train, test, best_params, poly_solver, score_cache(base_path)
+        )
+        if not dry_run:
+            logger.info("Saving the model")
+            save_model(base_path, model_pipe, metrics)
+
+
+if __name__ == "__main__":
+    fire.Fire(run_all)
@@ -2,96 +2,196 @@
     This file contains functions for model training and validation
 """
 import os
-import joblib
 from datetime import datetime
 import json
 import fire
 import shutil
-import pandas as pd
 import logging
-from sklearn.model_selection import GridSearchCV
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (
+    GridSearchCV,
+    HalvingGridSearchCV,
+    HalvingRandomSearchCV,
+    RandomizedSearchCV,
+)
+from sklearn.base import BaseEstimator
 from sklearn.linear_model import Ridge
 from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.pipeline import Pipeline
 
 from sklearn.preprocessing import PolynomialFeatures, StandardScaler
-from sklearn.feature_selection import SelectKBest, mutual_info_regression
+from joblib import Memory
+from sklearn.feature_selection import SelectKBest
 
-from model.utils.constants import TARGET_COL, PARAM_GRID
-from model.utils.config import ARTIFACT_DIR, FEATURE_DIR
+from model.utils.constants import TARGET_COL, PARAM_GRID, SEARCH_STRATEGIES, SEARCH_CV
+from model.utils.constants import SEARCH_N_ITER, SEARCH_HALVING_FACTOR, SEARCH_RANDOM_STATE
+from model.utils.constants import SEARCH_HALVING_MIN_RESOURCES
+from model.utils.constants import POLY_SOLVERS, TUNING_CACHE_BYTES_LIMIT
+from model.utils.config import ARTIFACT_DIR, FEATURE_DIR, STORAGE_FORMAT
+from model.utils.instrumentation import timed_pipeline
+from model.utils.kernel_ridge import PolynomialKernelRidge
+from model.utils.storage import dump_artifact, load_table
+from model.utils.tuning import AlphaPathSearch, TrimmedMemory, score_cache, selector_score_func
+from model.utils.tuning import tuning_cache
 
 logger = logging.getLogger(__name__)
 
+# Names of the params of the kernel solver, which has a single step for the expansion and
+# the model
+KERNEL_PARAM_NAMES = {"poly__degree": "model__degree"}
 
-def hypertune_model(base_path: str, dry_run: bool = False) -> None:
+
+def model_steps(
+    poly_solver: str = "features", params: Dict = {}
+) -> List[Tuple[str, BaseEstimator]]:
     """
-    This function will train the model using the preprocessed data (train and test sets)
-    Once the model is trained, the metrics and the serialized model is stored in the artifact_path
+    Polynomial expansion and ridge steps of the model pipeline, with the params of PARAM_GRID
+        features: PolynomialFeatures followed by Ridge
+        kernel: PolynomialKernelRidge, same predictions without building the expansion
     """
-    logger.info("=======================================================")
-    if dry_run:
-        logger.info("Dry run activated - Running hypertune")
+    degree, alpha = params.get("poly__degree", 2), params.get("model__alpha", 1.0)
+    if poly_solver == "features":
+        return [("poly", PolynomialFeatures(degree=degree)), ("model", Ridge(alpha=alpha))]
+    elif poly_solver == "kernel":
+        return [("model", PolynomialKernelRidge(degree=degree, alpha=alpha))]
     else:
-        logger.info("Dry run is not activated - Running hypertune")
-    logger.info("=======================================================")
+        raise ValueError(f"Unknown poly solver {poly_solver}, use one of {POLY_SOLVERS}")
 
-    train = pd.read_csv(os.path.join(base_path, FEATURE_DIR, "train.csv"))
 
-    pipe = Pipeline(
-        [
-            # Moving the standardScaler to the data processing pipeline causes problems of reproducibility
-            ("scale", StandardScaler()),
-            ("selector", SelectKBest(mutual_info_regression)),
-            ("poly", PolynomialFeatures()),
-            ("model", Ridge()),
-        ]
-    )
-    logger.info(f"The current pipeline is:\n {pipe}")
-
-    X_train, y_train = train.drop(TARGET_COL, axis=1), train[TARGET_COL]
-
-    grid = GridSearchCV(estimator=pipe, param_grid=PARAM_GRID, cv=3, scoring="r2")
+def solver_params(params: Dict, poly_solver: str, reverse: bool = False) -> Dict:
+    """
+    Params of PARAM_GRID named after the steps of poly_solver, or back with reverse
+    """
+    if poly_solver != "kernel":
+        return params
+    names = {v: k for k, v in KERNEL_PARAM_NAMES.items()} if reverse else KERNEL_PARAM_NAMES
+    return {names.get(name, name): value for name, value in params.items()}
 
-    logger.info("Fitting the model")
-    grid.fit(X_train, y_train)
-    best_params = grid.best_params_
-    logger.info(f"Best params: {best_params}")
 
-    if dry_run:
-        logger.info("Skipping saving")
+def build_search(
+    pipe: Pipeline,
+    search: str = "grid",
+    n_iter: int = SEARCH_N_ITER,
+    factor: int = SEARCH_HALVING_FACTOR,
+    n_jobs: int = -1,
+    param_grid: Dict = PARAM_GRID,
+) -> BaseEstimator:
+    """
+    Create the hyperparameter search over param_grid
+        grid: Exhaustive search
+        random: Random search over n_iter candidates
+        halving: Successive halving over every candidate, keeping 1/factor of them per iteration
+        halving_random: Successive halving over n_iter random candidates
+    The halving strategies start with SEARCH_HALVING_MIN_RESOURCES samples
+        alpha_path: Exhaustive search that scores every model__alpha of a candidate at once
+    """
+    common = dict(estimator=pipe, cv=SEARCH_CV, scoring="r2", n_jobs=n_jobs)
+    if search == "grid":
+        return GridSearchCV(param_grid=param_grid, **common)
+    elif search == "random":
+        return RandomizedSearchCV(
+            param_distributions=param_grid,
+            n_iter=n_iter,
+            random_state=SEARCH_RANDOM_STATE,
+            **common,
+        )
+    elif search == "halving":
+        return HalvingGridSearchCV(
+            param_grid=param_grid,
+            factor=factor,
+            min_resources=SEARCH_HALVING_MIN_RESOURCES,
+            random_state=SEARCH_RANDOM_STATE,
+            **common,
+        )
+    elif search == "halving_random":
+        return HalvingRandomSearchCV(
+            param_distributions=param_grid,
+            n_candidates=n_iter,
+            factor=factor,
+            min_resources=SEARCH_HALVING_MIN_RESOURCES,
+            random_state=SEARCH_RANDOM_STATE,
+            **common,
+        )
+    elif search == "alpha_path":
+        return AlphaPathSearch(param_grid=param_grid, **common)
     else:
-        logger.info("Saving best parameters")
-        with open(os.path.join(base_path, ARTIFACT_DIR, "params/best_params.json"), "w") as f:
-            json.dump(best_params, f, indent=4)
+        raise ValueError(f"Unknown search {search}, use one of {SEARCH_STRATEGIES}")
 
 
-def training_model(base_path: str, dry_run: bool = False) -> None:
+def search_best_params(
+    train: pd.DataFrame,
+    search: str = "grid",
+    n_iter: int = SEARCH_N_ITER,
+    factor: int = SEARCH_HALVING_FACTOR,
+    n_jobs: int = -1,
+    cache_limit: str = TUNING_CACHE_BYTES_LIMIT,
+    poly_solver: str = "features",
+    score_memory: Optional[Memory] = None,
+) -> Dict:
     """
-    This function will train the model using the preprocessed data (train and test sets)
-    Once the model is trained, the metrics and the serialized model is stored in the artifact_path
+    Best params of the model pipeline on the train set, see hypertune_model. The selector
+    scores are cached in score_memory, or only during the search without it
     """
-    logger.info("=======================================================")
-    if dry_run:
-        logger.info("Dry run activated - Running training")
-    else:
-        logger.info("Dry run is not activated - Running training")
-    logger.info("=======================================================")
+    X_train, y_train = train.drop(TARGET_COL, axis=1), train[TARGET_COL]
 
-    train = pd.read_csv(os.path.join(base_path, FEATURE_DIR, "train.csv"))
-    test = pd.read_csv(os.path.join(base_path, FEATURE_DIR, "test.csv"))
+    with tuning_cache(cache_limit) as memory:
+        pipe = Pipeline(
+            [
+                # Moving the standardScaler to the data processing pipeline causes problems of reproducibility
+                ("scale", StandardScaler()),
+                (
+                    "selector",
+                    SelectKBest(selector_score_func(score_memory or memory)),
+                ),
+                *model_steps(poly_solver),
+            ],
+            memory=TrimmedMemory(memory),
+        )
+        logger.info(f"The current pipeline is:\n {pipe}")
 
-    with open(os.path.join(base_path, ARTIFACT_DIR, "params/best_params.json")) as f:
-        params = json.load(f)
+        param_grid = solver_params(PARAM_GRID, poly_solver)
+        grid = build_search(pipe, search, n_iter, factor, n_jobs, param_grid)
+
+        logger.info(f"Fitting the model with {search} search")
+        grid.fit(X_train, y_train)
+    logger.info(
+        f"Best params: {grid.best_params_} after {len(grid.cv_results_['params'])} candidates"
+    )
+    return solver_params(grid.best_params_, poly_solver, reverse=True)
 
+
+def save_best_params(base_path: str, best_params: Dict) -> None:
+    with open(os.path.join(base_path, ARTIFACT_DIR, "params/best_params.json"), "w") as f:
+        json.dump(best_params, f, indent=4)
+
+
+def fit_model(
+    train: pd.DataFrame,
+    test: pd.DataFrame,
+    params: Dict,
+    poly_solver: str = "features",
+    score_memory: Optional[Memory] = None,
+) -> Tuple[Pipeline, Dict]:
+    """
+    Fit the model pipeline with params on the train set, and its metrics on the test set.
+    The selector scores are read from and saved in score_memory
+    """
     # Prediction pipeline
     pipe = Pipeline(
         [
             # Moving the standardScaler to the data processing pipeline causes problems
             # of reproducibility
             ("scale", StandardScaler()),
-            ("selector", SelectKBest(mutual_info_regression, k=params["selector__k"])),
-            ("poly", PolynomialFeatures(degree=params["poly__degree"])),
-            ("model", Ridge(alpha=params["model__alpha"])),
+            (
+                "selector",
+                SelectKBest(
+                    selector_score_func(score_memory or score_cache(None)), k=params["selector__k"]
+                ),
+            ),
+            *model_steps(poly_solver, params),
         ]
     )
     logger.info(f"The current pipeline is:\n {pipe}")
@@ -99,10 +199,12 @@ def training_model(base_path: str, dry_run: bool = False) -> None:
     X_train, y_train = train.drop(TARGET_COL, axis=1), train[TARGET_COL]
     X_test, y_test = test.drop(TARGET_COL, axis=1), test[TARGET_COL]
 
+    # The steps of pipe are fitted and timed through timed_pipe
+    timed_pipe = timed_pipeline(pipe, "model_pipeline")
     logger.info("Fitting the model")
-    pipe.fit(X_train, y_train)
+    timed_pipe.fit(X_train, y_train)
 
-    y_pred = pipe.predict(X_test)
+    y_pred = timed_pipe.predict(X_test)
 
     rmse = mean_squared_error(y_test, y_pred)
     r2 = r2_score(y_test, y_pred)
@@ -113,32 +215,114 @@ def training_model(base_path: str, dry_run: bool = False) -> None:
     }
 
     logger.info(f"metrics: {metrics}")
+    return pipe, metrics
+
+
+def archive_model(base_path: str) -> None:
+    """
+    Copy the current trained model and its metrics to the history, if there's one
+    """
+    if os.path.exists(os.path.join(base_path, ARTIFACT_DIR, "model/model_metrics.json")):
+        now = datetime.now()
+        history_artifacts_dir = os.path.join(
+            base_path, ARTIFACT_DIR, "model/history", now.strftime("%m-%d-%Y_%H:%M:%S")
+        )
+        os.makedirs(history_artifacts_dir)
+        shutil.copyfile(
+            os.path.join(base_path, ARTIFACT_DIR, "model/model_metrics.json"),
+            os.path.join(history_artifacts_dir, "model_metrics.json"),
+        )
+        shutil.copyfile(
+            os.path.join(base_path, ARTIFACT_DIR, "model/trained_model.pkl"),
+            os.path.join(history_artifacts_dir, "trained_model.json"),
+        )
+
+
+def save_model(base_path: str, pipe: Pipeline, metrics: Dict) -> None:
+    """
+    Save the trained model and its metrics, moving the previous ones to the history
+    """
+    # If there's a previous trained model, first save the previous version
+    archive_model(base_path)
+
+    with open(os.path.join(base_path, ARTIFACT_DIR, "model/model_metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=4)
+
+    # The service reloads the model when it changes, it must never see a partial file
+    dump_artifact(pipe, os.path.join(base_path, ARTIFACT_DIR, "model/trained_model.pkl"))
+
+
+def hypertune_model(
+    base_path: str,
+    dry_run: bool = False,
+    search: str = "grid",
+    n_iter: int = SEARCH_N_ITER,
+    factor: int = SEARCH_HALVING_FACTOR,
+    n_jobs: int = -1,
+    cache_limit: str = TUNING_CACHE_BYTES_LIMIT,
+    storage_format: str = STORAGE_FORMAT,
+    poly_solver: str = "features",
+) -> None:
+    """
+    This function will train the model using the preprocessed data (train and test sets)
+    Once the model is trained, the metrics and the serialized model is stored in the artifact_path
+    The search strategy and its budget are described in build_search, n_jobs=-1 uses every core
+    The fitted scaler, selector scores and polynomial expansion are cached during the search,
+    keyed by fold and upstream params, up to cache_limit. The selector scores are also kept
+    in the score cache of base_path, which training_model reads
+    poly_solver selects the polynomial expansion and ridge steps, see model_steps
+    """
+    logger.info("=======================================================")
+    if dry_run:
+        logger.info("Dry run activated - Running hypertune")
+    else:
+        logger.info("Dry run is not activated - Running hypertune")
+    logger.info("=======================================================")
+
+    train = load_table(base_path, FEATURE_DIR, "train", storage_format, memory_map=True)
+
+    best_params = search_best_params(
+        train, search, n_iter, factor, n_jobs, cache_limit, poly_solver, score_cache(base_path)
+    )
 
     if dry_run:
         logger.info("Skipping saving")
     else:
         logger.info("Saving best parameters")
+        save_best_params(base_path, best_params)
+
 
-        # If there's a previous trained model, first save the previous version
-        if os.path.exists(os.path.join(base_path, ARTIFACT_DIR, "model/model_metrics.json")):
-            now = datetime.now()
-            history_artifacts_dir = os.path.join(
-                base_path, ARTIFACT_DIR, "model/history", now.strftime("%m-%d-%Y_%H:%M:%S")
-            )
-            os.makedirs(history_artifacts_dir)
-            shutil.copyfile(
-                os.path.join(base_path, ARTIFACT_DIR, "model/model_metrics.json"),
-                os.path.join(history_artifacts_dir, "model_metrics.json"),
-            )
-            shutil.copyfile(
-                os.path.join(base_path, ARTIFACT_DIR, "model/trained_model.pkl"),
-                os.path.join(history_artifacts_dir, "trained_model.json"),
-            )
-
-        with open(os.path.join(base_path, ARTIFACT_DIR, "model/model_metrics.json"), "w") as f:
-            json.dump(metrics, f, indent=4)
-
-        joblib.dump(pipe, os.path.join(base_path, ARTIFACT_DIR, "model/trained_model.pkl"))
+def training_model(
+    base_path: str,
+    dry_run: bool = False,
+    storage_format: str = STORAGE_FORMAT,
+    poly_solver: str = "features",
+) -> None:
+    """
+    This function will train the model using the preprocessed data (train and test sets)
+    Once the model is trained, the metrics and the serialized model is stored in the artifact_path
+    poly_solver selects the polynomial expansion and ridge steps, see model_steps
+    """
+    logger.info("=======================================================")
+    if dry_run:
+        logger.info("Dry run activated - Running training")
+    else:
+        logger.info("Dry run is not activated - Running training")
+    logger.info("=======================================================")
+
+    train = load_table(base_path, FEATURE_DIR, "train", storage_format, memory_map=True)
+    test = load_table(base_path, FEATURE_DIR, "test", storage_format, memory_map=True)
+
+    with open(os.path.join(base_path, ARTIFACT_DIR, "params/best_params.json")) as f:
+        params = json.load(f)
+
+    pipe, metrics = fit_model(train, test, params, poly_solver, score_cache(base_path))
+
+    if dry_run:
+        logger.info("Skipping saving")
+    else:
+        logger.info("Saving best parameters")
+        save_model(base_path, pipe, metrics)
 
 
 if __name__ == "__main__":
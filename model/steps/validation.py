@@ -3,15 +3,205 @@ import fire
 import yaml
 import os
 import pandas as pd
+import numpy as np
 import logging
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, NamedTuple, Optional
 
-from model.utils.config import RAW_DIR
+from model.utils.config import RAW_DIR, VALIDATION_CHUNK_SIZE
+from model.utils.parallel import run_per_source
 
 logger = logging.getLogger(__name__)
 
+# Python types of the values accepted by each cerberus type, like cerberus does
+ACCEPTED_KINDS = {
+    "string": {"string"},
+    "float": {"float", "integer"},
+    "number": {"float", "integer"},
+    "integer": {"integer"},
+    "boolean": {"boolean"},
+}
+SUPPORTED_RULES = {"type", "nullable", "min", "max"}
 
-def validate_assets(base_path: str, dry_run: bool = False) -> None:
-    """Make sure that every input file follow the expected schema"""
+
+class Violation(NamedTuple):
+    file: str
+    column: str
+    row: Optional[int]  # Row of the data in the file, None for errors of the whole column
+    value: object
+    message: str
+
+
+def compile_rules(schema: Dict) -> Dict[str, Dict]:
+    """
+    Rules of the values of each column of a cerberus schema made of lists
+    """
+    rules = {}
+    for col, col_schema in schema.items():
+        value_schema = col_schema.get("schema", {})
+        unsupported = (set(col_schema) - {"type", "schema"}) | (set(value_schema) - SUPPORTED_RULES)
+        if col_schema.get("type") != "list" or unsupported:
+            raise ValueError(
+                f"The chunked validation can't check the rules {unsupported} of {col}, "
+                "use chunked=False"
+            )
+
+        types = value_schema.get("type", list(ACCEPTED_KINDS))
+        types = [types] if isinstance(types, str) else types
+        unknown = set(types) - ACCEPTED_KINDS.keys()
+        if unknown:
+            raise ValueError(f"The chunked validation can't check the types {unknown} of {col}")
+
+        rules[col] = {
+            "types": types,
+            "kinds": set().union(*(ACCEPTED_KINDS[t] for t in types)),
+            "nullable": value_schema.get("nullable", False),
+            "min": value_schema.get("min"),
+            "max": value_schema.get("max"),
+        }
+    return rules
+
+
+def string_columns(rules: Dict[str, Dict]) -> List[str]:
+    """
+    Columns whose values can be strings. They are checked as the text of the csv, whatever
+    the dtype that read_csv infers for them
+    """
+    return [col for col, col_rules in rules.items() if "string" in col_rules["kinds"]]
+
+
+def _violations(name: str, col: str, values: pd.Series, mask, message: str) -> List[Violation]:
+    bad = values[np.asarray(mask, dtype=bool)]
+    return [Violation(name, col, int(row), value, message) for row, value in bad.items()]
+
+
+def check_column(name: str, col: str, values: pd.Series, rules: Dict) -> List[Violation]:
+    """
+    Check the values of a column chunk. Missing values are nulls, the rest of the
+    values are checked by their dtype: read_csv object columns only hold text
+    """
+    null = values.isna().to_numpy()
+    violations = []
+    if not rules["nullable"]:
+        violations += _violations(name, col, values, null, "null value not allowed")
+
+    # Numbers of the chunk, NaN when the value is null or isn't a number
+    kinds = rules["kinds"]
+    if pd.api.types.is_bool_dtype(values):
+        numbers, valid = None, np.full(len(values), "boolean" in kinds)
+    elif pd.api.types.is_numeric_dtype(values):
+        numbers = values.to_numpy(dtype=float)
+        if "float" in kinds:
+            valid = np.ones(len(values), dtype=bool)
+        else:
+            valid = np.equal(np.mod(numbers, 1), 0) & ("integer" in kinds)
+    elif "string" in kinds:
+        numbers, valid = None, np.ones(len(values), dtype=bool)
+    else:
+        # Text of columns that should be numeric, only the values that aren't numbers fail
+        numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+        valid = ~np.isnan(numbers)
+        if "float" not in kinds:
+            valid &= np.equal(np.mod(numbers, 1), 0)
+
+    type_name = rules["types"][0] if len(rules["types"]) == 1 else rules["types"]
+    violations += _violations(name, col, values, ~null & ~valid, f"must be of {type_name} type")
+
+    # Like cerberus, min and max only apply to numbers
+    if numbers is not None:
+        with np.errstate(invalid="ignore"):
+            if rules["min"] is not None:
+                below = valid & (numbers < rules["min"])
+                violations += _violations(name, col, values, below, f"min value is {rules['min']}")
+            if rules["max"] is not None:
+                above = valid & (numbers > rules["max"])
+                violations += _violations(name, col, values, above, f"max value is {rules['max']}")
+    return violations
+
+
+def validate_file(
+    name: str, path: str, schema: Dict, chunksize: int = VALIDATION_CHUNK_SIZE
+) -> List[Violation]:
+    """
+    Validate a csv file against its cerberus schema, reading chunksize rows at once.
+    Every violation is returned with the row of the file where it happens. The string
+    columns are read as text, otherwise a chunk of digits would be parsed as numbers
+    """
+    rules = compile_rules(schema)
+    dtypes = {col: str for col in string_columns(rules)}
+    violations = []
+    for i, chunk in enumerate(pd.read_csv(path, chunksize=chunksize, dtype=dtypes)):
+        violations += check_chunk(name, chunk, rules, first=i == 0)
+    return violations
+
+
+def check_chunk(name: str, chunk: pd.DataFrame, rules: Dict, first: bool = True) -> List[Violation]:
+    violations = []
+    if first:
+        violations += [
+            Violation(name, col, None, None, "unknown field")
+            for col in chunk.columns
+            if col not in rules
+        ]
+    for col in chunk.columns.intersection(list(rules)):
+        violations += check_column(name, col, chunk[col], rules[col])
+    return violations
+
+
+def validate_table(name: str, df: pd.DataFrame, schema: Dict) -> List[Violation]:
+    """
+    Validate a table already read from its csv, like validate_file. The string columns
+    are checked as text, like validate_file reads them
+    """
+    rules = compile_rules(schema)
+    text_cols = [col for col in string_columns(rules) if col in df.columns]
+    df = df.assign(**{col: df[col].where(df[col].isna(), df[col].astype(str)) for col in text_cols})
+    return check_chunk(name, df, rules)
+
+
+def log_violations(violations: List[Violation]) -> None:
+    grouped = defaultdict(list)
+    for violation in violations:
+        grouped[(violation.file, violation.column, violation.message)].append(violation)
+
+    for (name, col, message), group in grouped.items():
+        if group[0].row is None:
+            logger.error(f"{name}.{col}: {message}")
+        else:
+            rows = ", ".join(f"{v.row} ({v.value!r})" for v in group)
+            logger.error(f"{name}.{col}: {message} in {len(group)} rows: {rows}")
+
+
+def check_violations(violations: List[Violation]) -> None:
+    """
+    Log the violations and stop the execution if there are any
+    """
+    if violations:
+        log_violations(violations)
+        files = sorted({v.file for v in violations})
+        exit(f"Validation failed: {len(violations)} violations in {files}")
+
+
+def load_schemas(base_path: str) -> Dict[str, Dict]:
+    with open(os.path.join(base_path, "model/schema.yaml"), "r") as stream:
+        return yaml.safe_load(stream)
+
+
+def validate_assets(
+    base_path: str,
+    dry_run: bool = False,
+    chunked: bool = True,
+    chunksize: int = VALIDATION_CHUNK_SIZE,
+    n_workers: int = 1,
+) -> None:
+    """
+    Make sure that every input file follow the expected schema
+    chunked validates the files by chunks of chunksize rows with vectorized checks and
+    reports every violation of every file before failing, n_workers files at the same time.
+    Otherwise cerberus validates each file at once and the validation stops at the first
+    file with errors
+    """
 
     logger.info("=======================================================")
     if dry_run:
@@ -20,10 +210,23 @@ def validate_assets(base_path: str, dry_run: bool = False) -> None:
         logger.info("Dry run is not activated - Running validation")
     logger.info("=======================================================")
 
-    schema_path = os.path.join(base_path, "model/schema.yaml")
+    schemas = load_schemas(base_path)
 
-    with open(schema_path, "r") as stream:
-        schemas = yaml.safe_load(stream)
+    if chunked:
+        logger.debug(f"Validating the schemas by chunks of {chunksize} rows")
+        tasks = {
+            name_schema: partial(
+                validate_file,
+                name_schema,
+                os.path.join(base_path, RAW_DIR, f"{name_schema}.csv"),
+                schemas[name_schema],
+                chunksize,
+            )
+            for name_schema in schemas
+        }
+        results = run_per_source(tasks, n_workers)
+        check_violations([violation for name in schemas for violation in results[name]])
+        return
 
     # Iterate over each schema and check if
     for name_schema in schemas:
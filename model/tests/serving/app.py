@@ -0,0 +1,212 @@
+import asyncio
+import importlib.util
+import os
+import subprocess
+import sys
+
+import httpx
+import joblib
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import Gauge
+
+from model.serving import metrics
+from model.serving.cache import PredictionCache
+from model.serving.microbatch import MicroBatcher
+from model.serving.registry import MODEL_PATH, ModelRegistry
+from model.serving.scoring import score_window
+from model.tests.serving.registry import copy_artifacts
+from model.utils.storage import dump_artifact
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+# prometheus_client picks the multiprocess mode when it's imported, so the api runs in a new
+# interpreter with PROMETHEUS_MULTIPROC_DIR set
+MULTIPROCESS_SCRIPT = """
+import importlib.util, sys
+from fastapi.testclient import TestClient
+
+spec = importlib.util.spec_from_file_location("app_main", sys.argv[1])
+main = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(main)
+with TestClient(main.app) as client:
+    client.get("/check_service")
+    response = client.get("/metrics")
+sys.stdout.write(response.text)
+"""
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    """
+    The api module, serving a copy of the artifacts without the hot-reload thread
+    """
+    artifact_dir = str(tmp_path_factory.mktemp("app") / "artifacts")
+    copy_artifacts(artifact_dir)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("ARTIFACTS_PATH", artifact_dir)
+        mp.setenv("MODEL_RELOAD_INTERVAL", "0")
+        spec = importlib.util.spec_from_file_location(
+            "app_main", os.path.join(BASE_PATH, "app/main.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def client(main):
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def windows():
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/merge_data.csv")).drop("target", axis=1)
+    return [df.iloc[start : start + 3].to_dict(orient="list") for start in range(10)]
+
+
+def test_overloaded_requests_get_a_503(main, client, windows, monkeypatch):
+    monkeypatch.setattr(main, "cache", PredictionCache(max_size=0))
+    # Every worker is busy and the queue is full
+    monkeypatch.setattr(main.executor, "pending", main.executor.max_pending)
+
+    for path, payload in [
+        ("/get_prediction", {"data": windows[0]}),
+        ("/get_batch_prediction", {"windows": windows[:2]}),
+    ]:
+        response = client.post(path, json=payload)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert "overloaded" in response.json()["detail"]
+
+    monkeypatch.undo()
+    assert client.post("/get_prediction", json={"data": windows[0]}).status_code == 201
+
+
+@pytest.mark.parametrize(
+    "path,content",
+    [
+        ("/get_prediction", b'{"data": '),
+        ("/get_prediction", b'{"windows": []}'),
+        ("/get_prediction", b'{"data": {"anio": [2014, 2014, 2014]}}'),
+        ("/get_prediction", b'{"data": [1, 2, 3]}'),
+        ("/get_batch_prediction", b"[]"),
+        ("/get_batch_prediction", b'{"windows": {"anio": [2014]}}'),
+    ],
+)
+def test_malformed_payloads_get_a_422(client, path, content):
+    response = client.post(path, content=content)
+    assert response.status_code == 422
+    assert response.json()["detail"]
+
+
+def test_windows_with_missing_features_in_the_last_period_get_a_422(client, windows):
+    window = {col: values[:-1] + [None] for col, values in windows[0].items()}
+    response = client.post("/get_prediction", json={"data": window})
+    assert response.status_code == 422
+    assert response.json()["detail"] == "The last period has missing features"
+
+
+def test_model_status(main, client):
+    status = client.get("/model_status").json()
+
+    assert status["version"] == main.registry.current.version
+    assert status["engine"] == "pipeline"
+    assert status["reload_interval"] == 0
+    assert status["last_error"] is None
+    assert set(status["metrics"]) == set(main.registry.current.metrics)
+    assert set(status["cache"]) >= {"hits", "misses"}
+
+
+def test_concurrent_requests_are_micro_batched(main, windows, monkeypatch):
+    monkeypatch.setattr(main, "cache", PredictionCache(max_size=0))
+    monkeypatch.setattr(main, "batcher", MicroBatcher(main.executor, max_batch_size=16))
+    calls = []
+    run = main.executor.run
+
+    async def count_calls(func, *args, **kwargs):
+        calls.append(func.__name__)
+        return await run(func, *args, **kwargs)
+
+    monkeypatch.setattr(main.executor, "run", count_calls)
+
+    async def post_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post("/get_prediction", json={"data": window}) for window in windows)
+            )
+
+    responses = asyncio.run(post_all())
+
+    assert [response.status_code for response in responses] == [201] * len(windows)
+    expected = [score_window(main.registry.current, window) for window in windows]
+    preds = [response.json()["prediction"] for response in responses]
+    assert preds == pytest.approx(expected, rel=1e-9)
+    assert 0 < len(calls) < len(windows)
+    assert set(calls) == {"score_window_batch"}
+
+
+def test_cached_predictions_match_and_are_dropped_by_a_new_model(
+    main, client, windows, tmp_path, monkeypatch
+):
+    artifact_dir = str(tmp_path / "artifacts")
+    copy_artifacts(artifact_dir)
+    registry = ModelRegistry(artifact_dir, reload_interval=0)
+    registry.load()
+    monkeypatch.setattr(main, "registry", registry)
+    monkeypatch.setattr(main, "cache", PredictionCache())
+
+    miss = client.post("/get_prediction", json={"data": windows[0]})
+    hit = client.post("/get_prediction", json={"data": windows[0]})
+    assert hit.status_code == miss.status_code == 201
+    assert hit.content == miss.content
+    assert client.get("/model_status").json()["cache"]["hits"] == 1
+
+    # New model with a different intercept, swapped in by the hot-reload
+    model_pipe = joblib.load(os.path.join(artifact_dir, MODEL_PATH))
+    model_pipe.steps[-1][1].intercept_ += 1
+    dump_artifact(model_pipe, os.path.join(artifact_dir, MODEL_PATH))
+    assert registry.reload_if_changed()
+
+    reloaded = client.post("/get_prediction", json={"data": windows[0]})
+    assert reloaded.json()["prediction"] == pytest.approx(miss.json()["prediction"] + 1)
+    cache_stats = client.get("/model_status").json()["cache"]
+    assert cache_stats["invalidations"] == 1
+    assert cache_stats["hits"] == 1 and cache_stats["misses"] == 2
+
+
+def test_gauges_are_aggregated_across_processes():
+    gauges = [value for value in vars(metrics).values() if isinstance(value, Gauge)]
+    assert gauges
+    # The live modes drop the values of the dead processes, and have no pid label
+    for gauge in gauges:
+        assert gauge._multiprocess_mode in {"livesum", "livemax", "livemin", "livemostrecent"}
+
+
+def test_metrics_of_every_process_with_a_multiproc_dir(main, tmp_path):
+    multiproc_dir = tmp_path / "prometheus"
+    multiproc_dir.mkdir()
+    env = {
+        **os.environ,
+        "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir),
+        "ARTIFACTS_PATH": main.ARTIFACTS_PATH,
+        "MODEL_RELOAD_INTERVAL": "0",
+        "PYTHONPATH": os.path.abspath(BASE_PATH),
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", MULTIPROCESS_SCRIPT, os.path.join(BASE_PATH, "app/main.py")],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    assert any(path.suffix == ".db" for path in multiproc_dir.iterdir())
+    version = main.registry.current.version
+    assert f'model_info{{engine="pipeline",version="{version}"}} 1.0' in output
+    assert 'http_request_duration_seconds_count{endpoint="/check_service"' in output
+    assert "http_requests_in_progress 1.0" in output
+    assert 'pid="' not in output
@@ -0,0 +1,45 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from model.serving.batch import predict_windows
+from model.utils.constants import TARGET_COL
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+
+def load_windows(n_windows: int, n_rows: int = 3) -> list:
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/merge_data.csv"))
+    df = df.drop(TARGET_COL, axis=1)
+    return [df.iloc[i : i + n_rows].to_dict(orient="list") for i in range(n_windows)]
+
+
+def test_predict_windows_matches_single_predictions():
+    data_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/data_pipeline.pkl"))
+    model_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/model/trained_model.pkl"))
+
+    windows = load_windows(10)
+    results = predict_windows(data_pipe, model_pipe, windows)
+
+    for window, (pred, error) in zip(windows, results):
+        data_prec = data_pipe.transform(pd.DataFrame(window)).dropna()
+        expected = model_pipe.predict(data_prec)[-1]
+        assert error is None
+        assert np.isclose(pred, expected)
+
+
+def test_predict_windows_reports_errors_per_window():
+    data_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/data_pipeline.pkl"))
+    model_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/model/trained_model.pkl"))
+
+    windows = load_windows(4)
+    windows[1] = load_windows(1, n_rows=2)[0]
+    windows[2]["PIB"] = ["not", "a", "number"]
+
+    results = predict_windows(data_pipe, model_pipe, windows)
+
+    assert [error is None for _, error in results] == [True, False, False, True]
+    assert "at least 3 periods" in results[1][1]
+    assert results[0][0] is not None and results[3][0] is not None
@@ -0,0 +1,39 @@
+import time
+
+from model.serving.cache import PredictionCache, window_key
+
+
+def test_window_key_ignores_the_order_of_the_columns():
+    assert window_key({"a": [1.0, 2.0], "b": [3.0]}) == window_key({"b": [3.0], "a": [1.0, 2.0]})
+    assert window_key({"a": [1.0, 2.0]}) != window_key({"a": [2.0, 1.0]})
+
+
+def test_cache_hits_evictions_and_ttl():
+    cache = PredictionCache(max_size=2, ttl=0.2)
+    assert cache.get("a", "v1") is None
+    cache.put("a", "v1", 1.0)
+    cache.put("b", "v1", 2.0)
+    assert cache.get("a", "v1") == 1.0
+
+    # "b" is the least recently used entry
+    cache.put("c", "v1", 3.0)
+    assert cache.get("b", "v1") is None
+    assert cache.get("c", "v1") == 3.0
+
+    time.sleep(0.25)
+    assert cache.get("a", "v1") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 3
+
+
+def test_cache_drops_the_entries_of_other_model_versions():
+    cache = PredictionCache()
+    cache.put("a", "v1", 1.0)
+    cache.get("a", "v1")
+    assert cache.get("a", "v2") is None
+
+    # A prediction of the old model that arrives after the swap isn't stored
+    cache.put("b", "v1", 2.0)
+    assert cache.get("b", "v2") is None
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,63 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.serving.batch import MISSING_FEATURES
+from model.serving.compiled import COMPILED_RTOL, CompiledScorer
+from model.serving.registry import ModelRegistry
+from model.serving.schema import PayloadError
+from model.serving.scoring import score_window, score_windows
+from model.utils.constants import TARGET_COL
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+
+def test_compiled_scorer_matches_pipelines():
+    data_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/data_pipeline.pkl"))
+    model_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/model/trained_model.pkl"))
+    scorer = CompiledScorer(data_pipe, model_pipe)
+
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/merge_data.csv"))
+    df = df.drop(TARGET_COL, axis=1)
+    windows = [df.iloc[i : i + 3].to_dict(orient="list") for i in range(len(df) - 2)]
+
+    expected = [
+        model_pipe.predict(data_pipe.transform(pd.DataFrame(window)).dropna())[-1]
+        for window in windows
+    ]
+    preds = [pred for pred, _ in scorer.predict_windows(windows)]
+
+    assert np.allclose(preds, expected, rtol=COMPILED_RTOL, atol=0)
+    assert np.isclose(scorer.predict_window(windows[0]), expected[0], rtol=COMPILED_RTOL, atol=0)
+
+
+def test_compiled_scorer_only_needs_selected_columns():
+    data_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/data_pipeline.pkl"))
+    model_pipe = joblib.load(os.path.join(BASE_PATH, "artifacts/model/trained_model.pkl"))
+    scorer = CompiledScorer(data_pipe, model_pipe)
+
+    assert len(scorer.features) == model_pipe.named_steps["selector"].k
+    assert len(scorer.input_cols) < len(scorer.features) + 1
+
+    ((pred, error),) = scorer.predict_windows([{"anio": [2014.0] * scorer.min_rows}])
+    assert pred is None and "missing the columns" in error
+
+
+def test_engines_reject_windows_with_missing_features_in_the_last_period():
+    bundles = [
+        ModelRegistry(os.path.join(BASE_PATH, "artifacts"), engine, reload_interval=0).load()
+        for engine in ["pipeline", "compiled"]
+    ]
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/merge_data.csv"))
+    window = df.drop(TARGET_COL, axis=1).iloc[10:13].to_dict(orient="list")
+    # A selected feature is the value of the last period of its column
+    col = next(col for col, stat, _ in bundles[1].scorer.features if stat == "value")
+    window[col][-1] = np.nan
+
+    for bundle in bundles:
+        with pytest.raises(PayloadError, match=MISSING_FEATURES):
+            score_window(bundle, window)
+        assert score_windows(bundle, [window]) == [(None, MISSING_FEATURES)]
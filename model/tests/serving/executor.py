@@ -0,0 +1,67 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from model.serving.executor import Overloaded, ScoringExecutor
+from model.serving.registry import ModelRegistry
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+
+def slow_version(bundle, seconds: float) -> str:
+    time.sleep(seconds)
+    return bundle.version
+
+
+def pid(bundle) -> int:
+    return os.getpid()
+
+
+@pytest.fixture(scope="module")
+def registry():
+    registry = ModelRegistry(os.path.join(BASE_PATH, "artifacts"), reload_interval=0)
+    registry.load()
+    return registry
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_executor_modes(registry, mode):
+    executor = ScoringExecutor(registry, mode, max_workers=2)
+
+    async def run():
+        return await executor.run(slow_version, 0), await executor.run(pid)
+
+    version, worker_pid = asyncio.run(run())
+    executor.shutdown()
+    assert version == registry.current.version
+    assert (worker_pid == os.getpid()) == (mode != "process")
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_executor_scores_with_the_bundle_of_the_request(registry, mode):
+    executor = ScoringExecutor(registry, mode, max_workers=1)
+    # e.g. the model was swapped after the request read the old one
+    old = registry.current._replace(version="old")
+
+    async def run():
+        return await executor.run(slow_version, 0, bundle=old), await executor.run(slow_version, 0)
+
+    assert asyncio.run(run()) == ("old", registry.current.version)
+    executor.shutdown()
+
+
+def test_executor_rejects_requests_when_full(registry):
+    executor = ScoringExecutor(registry, "thread", max_workers=1, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(
+            *(executor.run(slow_version, 0.2) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    executor.shutdown()
+    assert results[:2] == [registry.current.version] * 2
+    assert isinstance(results[2], Overloaded)
+    assert executor.pending == 0
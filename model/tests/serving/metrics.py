@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from model.serving.metrics import count_errors, observe_batch, observe_model, render_metrics
+
+
+def make_bundle(version, scorer=None):
+    return SimpleNamespace(
+        version=version,
+        scorer=scorer,
+        metrics={"rmse": 2.5},
+        loaded_at="2024-01-01T00:00:00",
+        load_seconds=0.5,
+    )
+
+
+def test_metrics_of_the_served_model():
+    observe_model(make_bundle("v1"))
+    observe_model(make_bundle("v2", scorer=object()))
+    output = render_metrics()[0].decode()
+
+    assert 'model_info{engine="pipeline",version="v1"} 0.0' in output
+    assert 'model_info{engine="compiled",version="v2"} 1.0' in output
+    assert 'model_metric{metric="rmse"} 2.5' in output
+    assert "model_load_seconds 0.5" in output
+
+
+def test_batch_sizes_and_errors():
+    observe_batch("test", 3)
+    count_errors("test_reason", 2)
+    count_errors("test_reason", 0)
+    output = render_metrics()[0].decode()
+
+    assert 'prediction_batch_size_sum{source="test"} 3.0' in output
+    assert 'prediction_errors_total{reason="test_reason"} 2.0' in output
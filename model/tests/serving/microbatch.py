@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+import pandas as pd
+import pytest
+
+from model.serving.executor import Overloaded, ScoringExecutor
+from model.serving.microbatch import MicroBatcher
+from model.serving.registry import ModelRegistry
+from model.serving.scoring import score_window
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+
+class CountingExecutor(ScoringExecutor):
+    def __init__(self, registry):
+        # Every waiting request holds a slot
+        super().__init__(registry, max_queue=32)
+        self.calls = []
+
+    async def run(self, func, *args, **kwargs):
+        self.calls.append(func.__name__)
+        return await super().run(func, *args, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def registry():
+    registry = ModelRegistry(os.path.join(BASE_PATH, "artifacts"), reload_interval=0)
+    registry.load()
+    return registry
+
+
+@pytest.fixture(scope="module")
+def windows():
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/merge_data.csv")).drop("target", axis=1)
+    return [df.iloc[start : start + 3].to_dict(orient="list") for start in range(10)]
+
+
+def predict_all(batcher, windows, bundles=None):
+    bundles = bundles or [None] * len(windows)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.predict(window, bundle) for window, bundle in zip(windows, bundles)),
+            return_exceptions=True,
+        )
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("max_batch_size,n_calls", [(1, 11), (4, 3), (32, 1)])
+def test_micro_batches_match_single_predictions(registry, windows, max_batch_size, n_calls):
+    # The first window is too short to be stacked, it's scored alone like before
+    requests = [{col: values[-1:] for col, values in windows[0].items()}] + windows
+    batcher = MicroBatcher(CountingExecutor(registry), max_batch_size, max_wait_ms=5)
+
+    preds = predict_all(batcher, requests)
+    expected = [score_window(registry.current, window) for window in requests]
+    assert preds == pytest.approx(expected, rel=1e-9)
+    assert len(batcher.executor.calls) == n_calls
+
+
+def test_micro_batch_errors_reach_their_request(registry, windows):
+    batcher = MicroBatcher(CountingExecutor(registry), max_batch_size=8)
+
+    pred, error = predict_all(batcher, [windows[0], {}])
+    assert pred == pytest.approx(score_window(registry.current, windows[0]))
+    assert isinstance(error, ValueError)
+    assert batcher.executor.calls == ["score_window_batch"]
+
+
+def test_micro_batches_keep_the_model_of_each_request(registry, windows):
+    executor = CountingExecutor(registry)
+    versions = []
+    run = executor.run
+
+    async def record_version(func, *args, bundle=None, **kwargs):
+        versions.append(bundle.version)
+        return await run(func, *args, bundle=bundle, **kwargs)
+
+    executor.run = record_version
+    batcher = MicroBatcher(executor, max_batch_size=32, max_wait_ms=5)
+    old = registry.current._replace(version="old")
+
+    preds = predict_all(batcher, windows, [old, registry.current] * (len(windows) // 2))
+    expected = [score_window(registry.current, window) for window in windows]
+    assert preds == pytest.approx(expected, rel=1e-9)
+    assert sorted(versions) == sorted(["old", registry.current.version])
+
+
+def test_every_waiting_request_holds_a_slot_of_the_executor(registry, windows):
+    executor = ScoringExecutor(registry, max_workers=1, max_queue=2)
+    batcher = MicroBatcher(executor, max_batch_size=16, max_wait_ms=5)
+
+    results = predict_all(batcher, windows[:5])
+    assert results[:3] == pytest.approx(
+        [score_window(registry.current, window) for window in windows[:3]], rel=1e-9
+    )
+    assert all(isinstance(result, Overloaded) for result in results[3:])
+    assert executor.pending == 0
@@ -0,0 +1,104 @@
+import os
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import FunctionTransformer
+
+from model.serving.compiled import COMPILED_RTOL
+from model.serving.registry import DATA_PIPELINE_PATH, MODEL_PATH, ModelRegistry
+from model.serving.scoring import score_window
+from model.steps.training import fit_model
+from model.utils.config import FEATURE_DIR
+from model.utils.storage import dump_artifact
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+
+def copy_artifacts(artifact_dir: str) -> None:
+    os.makedirs(os.path.join(artifact_dir, "model"))
+    for path in (DATA_PIPELINE_PATH, MODEL_PATH):
+        shutil.copyfile(
+            os.path.join(BASE_PATH, "artifacts", path), os.path.join(artifact_dir, path)
+        )
+
+
+def test_registry_swaps_new_models(tmp_path):
+    artifact_dir = str(tmp_path / "artifacts")
+    copy_artifacts(artifact_dir)
+    registry = ModelRegistry(artifact_dir, engine="compiled")
+    old = registry.load()
+    assert not registry.reload_if_changed()
+
+    # New model with a different intercept
+    model_pipe = joblib.load(os.path.join(artifact_dir, MODEL_PATH))
+    model_pipe.steps[-1][1].intercept_ += 1
+    dump_artifact(model_pipe, os.path.join(artifact_dir, MODEL_PATH))
+
+    assert registry.reload_if_changed()
+    new = registry.current
+    assert new.version != old.version
+    assert registry.status()["version"] == new.version
+
+    # In-flight requests keep using the old pair
+    window = {col: [1.0, 2.0, 3.0] for col in old.scorer.input_cols}
+    assert np.isclose(new.scorer.predict_window(window), old.scorer.predict_window(window) + 1)
+
+
+def test_registry_keeps_model_when_new_pair_is_broken(tmp_path):
+    artifact_dir = str(tmp_path / "artifacts")
+    copy_artifacts(artifact_dir)
+    registry = ModelRegistry(artifact_dir)
+    old = registry.load()
+
+    # Model fitted with other features than the data pipeline
+    model_pipe = joblib.load(os.path.join(artifact_dir, MODEL_PATH))
+    model_pipe.steps[0][1].n_features_in_ += 1
+    model_pipe.steps[0][1].feature_names_in_ = np.append(
+        model_pipe.steps[0][1].feature_names_in_, "unknown"
+    )
+    dump_artifact(model_pipe, os.path.join(artifact_dir, MODEL_PATH))
+
+    assert not registry.reload_if_changed()
+    assert registry.current is old
+    assert registry.status()["last_error"] is not None
+
+
+def train_kernel_model(artifact_dir: str) -> None:
+    train, test = (
+        pd.read_csv(os.path.join(BASE_PATH, FEATURE_DIR, f"{name}.csv"))
+        for name in ["train", "test"]
+    )
+    params = {"selector__k": 7, "model__alpha": 0.2, "poly__degree": 2}
+    model_pipe, _ = fit_model(train, test, params, poly_solver="kernel")
+    dump_artifact(model_pipe, os.path.join(artifact_dir, MODEL_PATH))
+
+
+def test_registry_compiles_kernel_models(tmp_path):
+    artifact_dir = str(tmp_path / "artifacts")
+    copy_artifacts(artifact_dir)
+    train_kernel_model(artifact_dir)
+
+    registry = ModelRegistry(artifact_dir, engine="compiled")
+    bundle = registry.load()
+    assert bundle.scorer is not None
+    assert registry.status()["engine"] == "compiled"
+
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/merge_data.csv")).drop("target", axis=1)
+    window = df.iloc[10:13].to_dict(orient="list")
+    expected = score_window(bundle._replace(scorer=None), window)
+    assert np.isclose(score_window(bundle, window), expected, rtol=COMPILED_RTOL, atol=0)
+
+
+def test_registry_serves_the_pipelines_of_models_it_cant_compile(tmp_path):
+    artifact_dir = str(tmp_path / "artifacts")
+    copy_artifacts(artifact_dir)
+    model_pipe = joblib.load(os.path.join(artifact_dir, MODEL_PATH))
+    model_pipe.steps.insert(-1, ("identity", FunctionTransformer()))
+    dump_artifact(model_pipe, os.path.join(artifact_dir, MODEL_PATH))
+
+    registry = ModelRegistry(artifact_dir, engine="compiled")
+    bundle = registry.load()
+    assert bundle.scorer is None
+    assert registry.status()["engine"] == "pipeline"
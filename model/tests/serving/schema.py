@@ -0,0 +1,74 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.serving.batch import min_window_size, predict_windows
+from model.serving.compiled import CompiledScorer
+from model.serving.registry import ModelRegistry
+from model.serving.schema import PayloadError, decode_payload
+from model.serving.scoring import score_window
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+ARTIFACTS = os.path.join(BASE_PATH, "artifacts")
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    registry = ModelRegistry(ARTIFACTS, reload_interval=0)
+    return registry.load()
+
+
+@pytest.fixture(scope="module")
+def window():
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/merge_data.csv")).drop("target", axis=1)
+    return df.iloc[10:13].to_dict(orient="list")
+
+
+def test_parse_keeps_the_columns_of_the_schema_in_order(bundle, window):
+    parsed = bundle.schema.parse(window)
+    assert list(parsed) == bundle.schema.columns
+    assert len(parsed) < len(window)
+    assert all(values.dtype == np.float64 and len(values) == 3 for values in parsed.values())
+    assert score_window(bundle, parsed) == pytest.approx(score_window(bundle, window), rel=1e-12)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda w, col: w.pop(col),
+        lambda w, col: w.update({col: w[col][:2]}),
+        lambda w, col: w.update({col: ["a", "b", "c"]}),
+        lambda w, col: w.update({col: [[1.0], [2.0], [3.0]]}),
+    ],
+)
+def test_parse_rejects_invalid_windows(bundle, window, change):
+    window = dict(window)
+    change(window, bundle.schema.columns[-1])
+    with pytest.raises(PayloadError):
+        bundle.schema.parse(window)
+
+
+def test_both_endpoints_share_the_minimum_window_size(bundle, window):
+    min_rows = min_window_size(bundle.data_pipe)
+    short = {col: values[-(min_rows - 1) :] for col, values in window.items()}
+    assert bundle.schema.min_rows == min_rows > 1
+    with pytest.raises(PayloadError, match=f"at least {min_rows} periods"):
+        bundle.schema.parse(short)
+    ((_, error),) = predict_windows(bundle.data_pipe, bundle.model_pipe, [short])
+    assert f"at least {min_rows} periods" in error
+
+    scorer = CompiledScorer(*(joblib.load(path) for path in ModelRegistry(ARTIFACTS).paths))
+    assert scorer.min_rows == min_rows
+    with pytest.raises(ValueError, match=f"at least {min_rows} periods"):
+        scorer.predict_window(short)
+
+
+def test_decode_payload():
+    assert decode_payload(b'{"data": {"a": [1, null]}}', "data") == {"a": [1, None]}
+    with pytest.raises(PayloadError):
+        decode_payload(b'{"data": ', "data")
+    with pytest.raises(PayloadError):
+        decode_payload(b'{"windows": []}', "data")
@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+
+from model.steps.preprocessing import preprocess_assets
+from model.utils.config import BANK_FILE_NAME, MERGED_FILE_NAME, MILK_FILE_NAME, PREP_FILE_NAME
+from model.utils.config import INTERM_DIR, RAW_DIR
+from model.utils.storage import load_table
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+SOURCES = [MILK_FILE_NAME, PREP_FILE_NAME, BANK_FILE_NAME]
+TABLES = [f"prepare_{name}" for name in SOURCES] + [MERGED_FILE_NAME]
+
+
+def write_raw(base_path: str, raws: dict) -> None:
+    os.makedirs(os.path.join(base_path, RAW_DIR), exist_ok=True)
+    os.makedirs(os.path.join(base_path, INTERM_DIR), exist_ok=True)
+    for name, df in raws.items():
+        df.to_csv(os.path.join(base_path, RAW_DIR, f"{name}.csv"), index=False)
+
+
+def assert_same_as_full_rebuild(tmp_path, raws: dict) -> None:
+    incremental_path, full_path = str(tmp_path / "incremental"), str(tmp_path / "full")
+    write_raw(incremental_path, raws)
+    preprocess_assets(incremental_path, incremental=True)
+    write_raw(full_path, raws)
+    preprocess_assets(full_path)
+
+    for name in TABLES:
+        pd.testing.assert_frame_equal(
+            load_table(incremental_path, INTERM_DIR, name), load_table(full_path, INTERM_DIR, name)
+        )
+
+
+def test_incremental_preprocessing_matches_full_rebuild(tmp_path):
+    raws = {name: pd.read_csv(os.path.join(BASE_PATH, RAW_DIR, f"{name}.csv")) for name in SOURCES}
+    bank = raws[BANK_FILE_NAME]
+
+    # History without the last year of the bank data
+    history = dict(raws, **{BANK_FILE_NAME: bank[~bank["Periodo"].str.startswith("2019")]})
+    assert_same_as_full_rebuild(tmp_path, history)
+
+    # New periods
+    assert_same_as_full_rebuild(tmp_path, raws)
+
+    # Revised period in the middle of the merged data
+    revised = bank.copy()
+    revised.iloc[revised["Periodo"].str.startswith("2016-05").argmax(), 3] = "123.456.789"
+    assert_same_as_full_rebuild(tmp_path, dict(raws, **{BANK_FILE_NAME: revised}))
@@ -0,0 +1,55 @@
+import os
+import shutil
+
+import pandas as pd
+
+from model.steps.feature_engineering import feature_engineering
+from model.steps.preprocessing import preprocess_assets
+from model.steps.run_all import run_all
+from model.utils.config import ARTIFACT_DIR, FEATURE_DIR, RAW_DIR
+from model.utils.storage import load_table
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+FOLDERS = [
+    RAW_DIR,
+    "data/interm",
+    FEATURE_DIR,
+    "model",
+    f"{ARTIFACT_DIR}/model",
+    f"{ARTIFACT_DIR}/params",
+]
+
+
+def make_base_path(base_path: str) -> str:
+    for folder in FOLDERS:
+        os.makedirs(os.path.join(base_path, folder))
+    shutil.copytree(
+        os.path.join(BASE_PATH, RAW_DIR), os.path.join(base_path, RAW_DIR), dirs_exist_ok=True
+    )
+    shutil.copy(os.path.join(BASE_PATH, "model/schema.yaml"), os.path.join(base_path, "model"))
+    return base_path
+
+
+def test_run_all_matches_the_steps(tmp_path):
+    steps_path = make_base_path(str(tmp_path / "steps"))
+    preprocess_assets(steps_path)
+    feature_engineering(steps_path)
+
+    run_all_path = make_base_path(str(tmp_path / "run_all"))
+    run_all(run_all_path, save_intermediate=True, search="random", n_iter=2, n_jobs=1)
+
+    for name in ["train", "test"]:
+        pd.testing.assert_frame_equal(
+            load_table(run_all_path, FEATURE_DIR, name), load_table(steps_path, FEATURE_DIR, name)
+        )
+    for path in ["data_pipeline.pkl", "params/best_params.json", "model/trained_model.pkl"]:
+        assert os.path.exists(os.path.join(run_all_path, ARTIFACT_DIR, path))
+
+
+def test_run_all_only_writes_the_artifacts_by_default(tmp_path):
+    base_path = make_base_path(str(tmp_path))
+    run_all(base_path, search="random", n_iter=2, n_jobs=1)
+
+    assert os.listdir(os.path.join(base_path, FEATURE_DIR)) == []
+    assert os.path.exists(os.path.join(base_path, ARTIFACT_DIR, "model/model_metrics.json"))
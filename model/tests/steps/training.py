@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+from joblib import Memory
+from sklearn.feature_selection import SelectKBest, mutual_info_regression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from model.steps.training import build_search, hypertune_model, model_steps, training_model
+from model.utils import tuning
+from model.utils.config import ARTIFACT_DIR, FEATURE_DIR
+from model.utils.constants import SEARCH_HALVING_MIN_RESOURCES, TARGET_COL
+from model.utils.tuning import selector_score_func
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+
+@pytest.mark.parametrize("search", ["halving", "halving_random"])
+def test_halving_scores_every_candidate_of_the_first_iteration(search, tmp_path):
+    train = pd.read_csv(os.path.join(BASE_PATH, FEATURE_DIR, "train.csv"))
+    X_train, y_train = train.drop(TARGET_COL, axis=1), train[TARGET_COL]
+    pipe = Pipeline(
+        [
+            ("scale", StandardScaler()),
+            ("selector", SelectKBest(selector_score_func(Memory(str(tmp_path), verbose=0)))),
+            *model_steps(),
+        ]
+    )
+    # Enough candidates for the default min_resources to start with 6 samples
+    param_grid = {
+        "selector__k": [3, 5, 7],
+        "model__alpha": [1, 0.1, 0.01],
+        "poly__degree": [1, 2, 3],
+    }
+
+    grid = build_search(pipe, search, n_iter=27, n_jobs=1, param_grid=param_grid)
+    grid.fit(X_train, y_train)
+
+    results = pd.DataFrame(grid.cv_results_)
+    first = results[results["iter"] == 0]
+    assert (first["n_resources"] == SEARCH_HALVING_MIN_RESOURCES).all()
+    assert not np.isnan(first["mean_test_score"]).any()
+
+
+MUTUAL_INFO_CALLS = []
+
+
+def counted_mutual_info(X, y, **params):
+    MUTUAL_INFO_CALLS.append(X.shape)
+    return mutual_info_regression(X, y, **params)
+
+
+def test_training_reads_the_selector_scores_of_the_alpha_path_search(tmp_path, monkeypatch):
+    for folder in [FEATURE_DIR, f"{ARTIFACT_DIR}/params", f"{ARTIFACT_DIR}/model"]:
+        os.makedirs(tmp_path / folder)
+    for name in ["train", "test"]:
+        shutil.copy(os.path.join(BASE_PATH, FEATURE_DIR, f"{name}.csv"), tmp_path / FEATURE_DIR)
+    monkeypatch.setattr(tuning, "mutual_info_regression", counted_mutual_info)
+
+    hypertune_model(str(tmp_path), search="alpha_path", n_jobs=1, storage_format="csv")
+    n_train = len(pd.read_csv(tmp_path / FEATURE_DIR / "train.csv"))
+    # One score per fold and one of the full train set
+    assert [n_rows for n_rows, _ in MUTUAL_INFO_CALLS].count(n_train) == 1
+
+    n_calls = len(MUTUAL_INFO_CALLS)
+    training_model(str(tmp_path), storage_format="csv")
+    assert len(MUTUAL_INFO_CALLS) == n_calls
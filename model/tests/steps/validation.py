@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+import pytest
+
+from model.steps.validation import validate_assets, validate_file, validate_table
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
+
+SCHEMA = {
+    "Anio": {"type": "list", "schema": {"type": "integer", "nullable": True, "min": 1000}},
+    "Mes": {"type": "list", "schema": {"type": "string"}},
+    "Precio_leche": {"type": "list", "schema": {"type": "float", "min": 0}},
+}
+
+
+def test_validate_file_reports_every_violation(tmp_path):
+    path = str(tmp_path / "precio_leche.csv")
+    pd.DataFrame(
+        {
+            "Anio": [2020, 2020, 999, None, 2021.5],
+            "Mes": ["Ene", None, "Mar", "Abr", "May"],
+            "Precio_leche": ["1.5", "a", "-2", "3", "4"],
+            "Extra": [1, 2, 3, 4, 5],
+        }
+    ).to_csv(path, index=False)
+
+    # The chunks split the rows with the wrong values
+    violations = validate_file("precio_leche", path, SCHEMA, chunksize=2)
+
+    assert sorted((v.column, v.row, v.message) for v in violations) == [
+        ("Anio", 2, "min value is 1000"),
+        ("Anio", 4, "must be of integer type"),
+        ("Extra", None, "unknown field"),
+        ("Mes", 1, "null value not allowed"),
+        ("Precio_leche", 1, "must be of float type"),
+        ("Precio_leche", 2, "min value is 0"),
+    ]
+
+
+def test_validate_file_reads_string_columns_as_text(tmp_path):
+    path = str(tmp_path / "precio_leche.csv")
+    pd.DataFrame(
+        {
+            "Anio": [2020, 2020, 2020, 2020],
+            "Mes": ["Ene", "Feb", "3", "4"],
+            "Precio_leche": [1.5, 2.5, 3.5, 4.5],
+        }
+    ).to_csv(path, index=False)
+
+    # The second chunk of Mes only holds digits
+    assert validate_file("precio_leche", path, SCHEMA, chunksize=2) == []
+    # Like run_all, which validates the tables read for the preprocessing
+    df = pd.read_csv(path, skiprows=[1, 2])
+    assert pd.api.types.is_numeric_dtype(df["Mes"])
+    assert validate_table("precio_leche", df, SCHEMA) == []
+
+
+def test_validate_assets_raw_data():
+    validate_assets(BASE_PATH, chunksize=100)
+    validate_assets(BASE_PATH, chunked=False)
+
+
+def test_validate_file_unsupported_rules(tmp_path):
+    with pytest.raises(ValueError):
+        validate_file("x", "x.csv", {"a": {"type": "list", "schema": {"regex": "a+"}}})
@@ -1,9 +1,18 @@
+import os
+
+import numpy as np
 import pandas as pd
+from sklearn.pipeline import Pipeline
 
 from model.utils.data_munging import (
     FixingFormattedString,
+    RollingTransformer,
     TakeVariables,
+    prune_pipeline,
 )
+from model.utils.constants import PIB_COLS, IMACEC_INDICE_COLS
+
+BASE_PATH = os.path.join(os.path.dirname(__file__), "../../..")
 
 
 def test_take_variables_transformer():
@@ -24,3 +33,73 @@ def test_formatter_transformer():
     tk = FixingFormattedString(cols=["a"], cols_type="PIB")
     df = tk.fit_transform(df)
     assert df["a"].values.tolist() == [23, 1111333]
+
+
+def test_formatter_matches_per_cell_casting():
+    df = pd.read_csv(os.path.join(BASE_PATH, "data/interm/prepare_banco_central.csv"))
+
+    for cols, cols_type in [(PIB_COLS, "PIB"), (IMACEC_INDICE_COLS, "IMACEC_INDICE")]:
+        tk = FixingFormattedString(cols=cols, cols_type=cols_type)
+        expected = df[cols].apply(lambda col: col.apply(tk.casting_finance))
+        pd.testing.assert_frame_equal(tk.fit_transform(df)[cols], expected)
+
+    # Every IMACEC_INDICE rule: 100+ with long and short integer part, below 100 with long
+    # and short integer part, and values with more than two dot separated parts
+    rng = np.random.default_rng(42)
+    integer = rng.integers(0, 10 ** rng.integers(1, 4, size=5000))
+    decimal = [
+        str(x).zfill(n) for x, n in zip(rng.integers(0, 1000, 5000), rng.integers(1, 4, 5000))
+    ]
+    extra = np.where(rng.random(5000) < 0.5, "", ".123")
+    values = pd.Series([f"{i}.{d}{e}" for i, d, e in zip(integer, decimal, extra)])
+
+    tk = FixingFormattedString(cols=["a"], cols_type="IMACEC_INDICE")
+    expected = values.apply(tk.casting_finance)
+    assert expected.tolist() == tk.casting_finance_vectorized(values.to_numpy()).tolist()
+
+
+def test_rolling_transformer_matches_pandas():
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame(rng.normal(size=(50, 3)), columns=["a", "b", "c"])
+    df.iloc[[3, 4, 10, 20], [0, 2]] = np.nan
+
+    tk = RollingTransformer(["a", "c", "d"], ["mean", "std", "min", "max"])
+    df_out = tk.fit_transform(df)
+    assert df_out.columns.tolist() == ["a", "b", "c"] + [
+        f"{col}_rolling3_{method}" for method in ["mean", "std", "min", "max"] for col in ["a", "c"]
+    ]
+
+    for method in ["mean", "std", "min", "max"]:
+        expected = getattr(df[["a", "c"]].rolling(window=3, min_periods=1), method)()
+        expected.columns = [f"{col}_rolling3_{method}" for col in ["a", "c"]]
+        pd.testing.assert_frame_equal(df_out[expected.columns], expected, rtol=1e-6)
+
+    df_last = RollingTransformer(["a"], "last").fit_transform(df)
+    assert df_last["a_rolling3_last"].tolist()[3:6] == [df["a"][2], df["a"][2], df["a"][5]]
+
+    df_empty = tk.fit_transform(df.iloc[:0])
+    assert df_empty.shape == (0, len(df_out.columns))
+    for method in ["mean", "std", "min", "max"]:
+        expected = getattr(df[["a", "c"]].iloc[:0].rolling(window=3, min_periods=1), method)()
+        expected.columns = [f"{col}_rolling3_{method}" for col in ["a", "c"]]
+        pd.testing.assert_frame_equal(df_empty[expected.columns], expected)
+
+
+def test_prune_pipeline():
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [3.0, 4.0, 5.0], "c": ["4.1", "5.2", "6.3"]})
+    pipe = Pipeline(
+        [
+            ("fixing", FixingFormattedString(["c"], "PIB")),
+            ("rolling", RollingTransformer(["a", "b", "c"], "mean")),
+            ("take_vars", TakeVariables(["a_rolling3_mean", "b_rolling3_mean", "b"])),
+        ]
+    )
+
+    pruned = prune_pipeline(pipe)
+    assert [name for name, _ in pruned.steps] == ["take_input_vars", "rolling", "take_vars"]
+    assert pruned.named_steps["rolling"].cols == ["a", "b"]
+    pd.testing.assert_frame_equal(pruned.fit_transform(df), pipe.fit_transform(df))
+
+    pruned = prune_pipeline(pipe, ["b"])
+    assert [name for name, _ in pruned.steps] == ["take_vars"]
+    assert pruned.fit_transform(df).columns.tolist() == ["b"]
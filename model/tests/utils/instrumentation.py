@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+from model.utils.instrumentation import STAGE_TIMINGS, timed_pipeline, timed_task
+
+
+def make_pipe() -> Pipeline:
+    return Pipeline(
+        [("scale", StandardScaler()), ("poly", PolynomialFeatures(2)), ("model", Ridge())]
+    )
+
+
+def test_timed_pipeline_matches_pipeline_and_records_stages():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(40, 3)), columns=["a", "b", "c"])
+    y = X["a"] * 2 + rng.normal(size=40)
+
+    STAGE_TIMINGS.reset()
+    pipe = make_pipe()
+    timed = timed_pipeline(pipe, "test_pipeline").fit(X, y)
+    expected = make_pipe().fit(X, y).predict(X)
+
+    np.testing.assert_array_equal(timed.predict(X), expected)
+    # The steps are shared, so the original pipeline is fitted too
+    np.testing.assert_array_equal(pipe.predict(X), expected)
+
+    stages = STAGE_TIMINGS.report()["test_pipeline"]
+    assert list(stages) == ["scale.fit", "poly.fit", "model.fit", "scale", "poly", "model"]
+    assert stages["poly"]["last_shape_in"] == (40, 3)
+    assert stages["poly"]["last_shape_out"] == (40, 10)
+    assert stages["model"]["rows_in"] == 40
+    assert all(stats["count"] == 1 and stats["seconds"] > 0 for stats in stages.values())
+
+
+def test_timed_task_writes_the_report(tmp_path, monkeypatch):
+    report_path = tmp_path / "timings.json"
+    monkeypatch.setenv("TIMING_REPORT", str(report_path))
+    STAGE_TIMINGS.reset()
+
+    assert timed_task("add", lambda a, b=1: a + b)(1, b=2) == 3
+    report = json.loads(report_path.read_text())
+    assert report["cli"]["add"]["count"] == 1
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import PolynomialFeatures
+
+from model.steps.training import solver_params
+from model.utils.kernel_ridge import PolynomialKernelRidge, polynomial_features_kernel
+
+
+def test_kernel_is_the_product_of_the_expansions():
+    rng = np.random.default_rng(0)
+    X, Z = rng.normal(size=(7, 4)), rng.normal(size=(5, 4))
+    expand = PolynomialFeatures(3).fit_transform
+    expected = expand(X) @ expand(Z).T
+
+    np.testing.assert_allclose(polynomial_features_kernel(X, Z, 3), expected, rtol=1e-12)
+    # Chunks of a single row
+    np.testing.assert_allclose(polynomial_features_kernel(X, Z, 3, 1), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize("degree", [1, 2, 5, 7])
+@pytest.mark.parametrize("alpha", [1.0, 0.01])
+def test_kernel_ridge_matches_polynomial_features_and_ridge(degree, alpha):
+    rng = np.random.default_rng(degree)
+    X = rng.normal(size=(60, 6))
+    y = X[:, 0] - 2 * X[:, 1] * X[:, 2] + rng.normal(size=60)
+    X_test = rng.normal(size=(20, 6))
+
+    expected = make_pipeline(PolynomialFeatures(degree), Ridge(alpha=alpha)).fit(X, y)
+    kernel = PolynomialKernelRidge(degree, alpha).fit(X, y)
+    np.testing.assert_allclose(kernel.predict(X_test), expected.predict(X_test), rtol=1e-6)
+
+
+def test_kernel_params_keep_the_names_of_param_grid():
+    params = {"model__alpha": 0.1, "poly__degree": 3, "selector__k": 5}
+    kernel_params = solver_params(params, "kernel")
+    assert kernel_params == {"model__alpha": 0.1, "model__degree": 3, "selector__k": 5}
+    assert solver_params(kernel_params, "kernel", reverse=True) == params
+    assert solver_params(params, "features") == params
@@ -0,0 +1,32 @@
+import os
+from functools import partial
+
+import pytest
+
+from model.utils.parallel import run_per_source
+
+
+def write_pid(path: str) -> int:
+    with open(path, "w") as f:
+        f.write(str(os.getpid()))
+    return os.getpid()
+
+
+def fail(message: str) -> None:
+    raise ValueError(message)
+
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_run_per_source(tmp_path, n_workers):
+    tasks = {name: partial(write_pid, str(tmp_path / name)) for name in ["a", "b", "c"]}
+    results = run_per_source(tasks, n_workers)
+    assert list(results) == ["a", "b", "c"]
+    assert (os.getpid() in results.values()) == (n_workers == 1)
+
+    # The other sources still run when one of them fails
+    tasks["b"] = partial(fail, "b is broken")
+    for name in tasks:
+        os.remove(tmp_path / name)
+    with pytest.raises(ValueError, match="b is broken"):
+        run_per_source(tasks, n_workers)
+    assert os.path.exists(tmp_path / "a") and os.path.exists(tmp_path / "c")
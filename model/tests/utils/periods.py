@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from model.utils.periods import period_index, period_keys, split_dates, to_period
+
+
+def test_split_dates_matches_row_wise_apply():
+    dates = pd.Series(pd.to_datetime(["2013-03-01", "not a date", "2020-12-15"], errors="coerce"))
+    expected = dates.apply(lambda x: pd.Series([x.year, x.month]))
+    expected.columns = ["anio", "mes"]
+    pd.testing.assert_frame_equal(split_dates(dates), expected)
+
+    dates = dates.dropna()
+    assert split_dates(dates).dtypes.tolist() == [np.int64, np.int64]
+
+
+def test_period_index_and_keys():
+    anio, mes = pd.Series([2014.0, 2020.0, np.nan]), pd.Series([1.0, 12.0, 5.0])
+
+    index = period_index(anio, mes)
+    assert index.freqstr == "M" and index.name == "Periodo"
+    assert index[:2].tolist() == [pd.Period("2014-01", "M"), pd.Period("2020-12", "M")]
+    assert index[2] is pd.NaT
+
+    keys = period_keys(anio, mes)
+    assert keys[:2].tolist() == [201401.0, 202012.0] and np.isnan(keys[2])
+    assert to_period(keys[1]) == (2020, 12)
@@ -0,0 +1,91 @@
+import logging
+import os
+
+from model.__main__ import task_specs
+from model.utils.config import ARTIFACT_DIR
+from model.utils.step_cache import StepSpec, cached_task
+
+SPEC = StepSpec(inputs=lambda params: ["input.txt"], outputs=lambda params: ["output.txt"])
+
+
+def make_task(calls):
+    def double(base_path: str, dry_run: bool = False, times: int = 2) -> None:
+        calls.append(times)
+        with open(os.path.join(base_path, "input.txt")) as f:
+            text = f.read()
+        if not dry_run:
+            with open(os.path.join(base_path, "output.txt"), "w") as f:
+                f.write(text * times)
+
+    return double
+
+
+def read_output(base_path):
+    with open(os.path.join(base_path, "output.txt")) as f:
+        return f.read()
+
+
+def test_cached_task_restores_the_outputs_of_the_same_inputs(tmp_path, caplog):
+    calls = []
+    task = cached_task("double", make_task(calls), SPEC)
+    (tmp_path / "input.txt").write_text("a")
+
+    caplog.set_level(logging.INFO)
+    task(str(tmp_path))
+    os.remove(tmp_path / "output.txt")
+    task(str(tmp_path))
+    assert calls == [2]
+    assert read_output(tmp_path) == "aa"
+    assert "double: cache hit" in caplog.text
+
+    # New inputs or arguments run the step again
+    (tmp_path / "input.txt").write_text("b")
+    task(str(tmp_path))
+    task(str(tmp_path), times=3)
+    assert calls == [2, 2, 3]
+    assert read_output(tmp_path) == "bbb"
+
+    # Back to the first inputs, which are still cached
+    (tmp_path / "input.txt").write_text("a")
+    task(str(tmp_path))
+    assert calls == [2, 2, 3]
+    assert read_output(tmp_path) == "aa"
+
+
+def test_force_and_dry_run_always_run_the_step(tmp_path):
+    calls = []
+    task = cached_task("double", make_task(calls), SPEC)
+    (tmp_path / "input.txt").write_text("a")
+
+    task(str(tmp_path))
+    task(str(tmp_path), force=True)
+    task(str(tmp_path), dry_run=True)
+    assert calls == [2, 2, 2]
+
+
+def test_before_restore_runs_on_cache_hits(tmp_path):
+    calls, restores = [], []
+    spec = SPEC._replace(before_restore=lambda params: restores.append(read_output(tmp_path)))
+    task = cached_task("double", make_task(calls), spec)
+    (tmp_path / "input.txt").write_text("a")
+
+    task(str(tmp_path))
+    assert restores == []
+    (tmp_path / "output.txt").write_text("previous")
+    task(str(tmp_path))
+    # Called before the outputs are restored
+    assert calls == [2] and restores == ["previous"]
+    assert read_output(tmp_path) == "aa"
+
+
+def test_restored_training_moves_the_previous_model_to_the_history(tmp_path):
+    model_dir = tmp_path / ARTIFACT_DIR / "model"
+    model_dir.mkdir(parents=True)
+    (model_dir / "model_metrics.json").write_text('{"rmse": 1.0}')
+    (model_dir / "trained_model.pkl").write_bytes(b"previous model")
+
+    task_specs["training_model"].before_restore({"base_path": str(tmp_path)})
+
+    (history_dir,) = (model_dir / "history").iterdir()
+    assert (history_dir / "model_metrics.json").read_text() == '{"rmse": 1.0}'
+    assert (history_dir / "trained_model.json").read_bytes() == b"previous model"
@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.utils.storage import load_table, save_table
+
+
+def test_save_and_load_table(tmp_path):
+    os.makedirs(tmp_path / "interm")
+    df = pd.DataFrame(
+        {"anio": [2014, 2015], "PIB": ["1.234.567", "2.345.678"], "Precio_leche": [1.5, np.nan]}
+    )
+
+    save_table(df, str(tmp_path), "interm", "table", export_csv=True)
+    assert os.path.exists(tmp_path / "interm/table.csv")
+
+    loaded = load_table(str(tmp_path), "interm", "table", memory_map=True)
+    pd.testing.assert_frame_equal(loaded, df)
+
+    projected = load_table(str(tmp_path), "interm", "table", columns=["Precio_leche", "anio"])
+    pd.testing.assert_frame_equal(projected, df[["Precio_leche", "anio"]])
+
+    # Tables that only exist as csv are still readable
+    os.remove(tmp_path / "interm/table.feather")
+    pd.testing.assert_frame_equal(load_table(str(tmp_path), "interm", "table"), df)
+
+    with pytest.raises(ValueError):
+        save_table(df, str(tmp_path), "interm", "table", storage_format="parquet")
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_selection import SelectKBest, f_regression
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+from model.utils.kernel_ridge import PolynomialKernelRidge
+from model.utils.tuning import AlphaPathSearch, CachedScoreFunc, TrimmedMemory, score_cache
+from model.utils.tuning import tuning_cache
+
+
+def test_cached_score_func():
+    calls = []
+
+    def score_func(X, y):
+        calls.append(1)
+        return X.sum(axis=0)
+
+    X, y = np.arange(12.0).reshape(4, 3), np.arange(4.0)
+    with tuning_cache("10M") as memory:
+        cached = CachedScoreFunc(memory, score_func)
+        assert cached(X, y).tolist() == cached(X, y).tolist() == [18.0, 22.0, 26.0]
+        assert cached(X + 1, y).tolist() == [22.0, 26.0, 30.0]
+        location = memory.location
+
+    assert len(calls) == 2
+    assert not os.path.exists(location)
+
+
+def cache_bytes(location: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(location)
+        for name in files
+    )
+
+
+def test_trimmed_memory_keeps_the_fitted_steps_under_the_limit():
+    X, y = np.random.default_rng(0).normal(size=(200, 10)), np.arange(200.0)
+    with tuning_cache("100K") as memory:
+        for degree in [2, 3, 4]:
+            pipe = Pipeline(
+                [
+                    ("scale", StandardScaler()),
+                    ("poly", PolynomialFeatures(degree)),
+                    ("model", Ridge()),
+                ],
+                memory=TrimmedMemory(memory),
+            )
+            pipe.fit(X, y)
+        # The degree 4 expansion alone takes more than 1M
+        assert cache_bytes(memory.location) <= 100 * 1024
+
+
+SCORE_CALLS = []
+
+
+def counted_scores(X, y, scale=1.0):
+    SCORE_CALLS.append(scale)
+    return X.sum(axis=0) * scale
+
+
+def test_score_cache_is_kept_between_runs(tmp_path):
+    X, y = np.arange(12.0).reshape(4, 3), pd.Series(np.arange(4.0))
+    CachedScoreFunc(score_cache(str(tmp_path)), counted_scores, scale=2.0)(X, y)
+
+    # A new run reads the scores of the same data and params, whatever the index of y
+    cached = CachedScoreFunc(score_cache(str(tmp_path)), counted_scores, scale=2.0)
+    assert cached(X, y.set_axis([5, 6, 7, 8])).tolist() == [36.0, 44.0, 52.0]
+    CachedScoreFunc(score_cache(str(tmp_path)), counted_scores, scale=3.0)(X, y)
+    assert SCORE_CALLS == [2.0, 3.0]
+
+
+@pytest.mark.parametrize("kernel", [False, True])
+def test_alpha_path_search_matches_grid_search(kernel):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(60, 8)))
+    y = pd.Series(X[0] - X[1] * X[2] + rng.normal(scale=0.5, size=60))
+
+    if kernel:
+        steps = [("model", PolynomialKernelRidge())]
+        grid = {
+            "selector__k": [2, 3, 5],
+            "model__degree": [1, 2, 3],
+            "model__alpha": [1, 0.1, 0.01],
+        }
+    else:
+        steps = [("poly", PolynomialFeatures()), ("model", Ridge())]
+        grid = {"selector__k": [2, 3, 5], "poly__degree": [1, 2, 3], "model__alpha": [1, 0.1, 0.01]}
+    pipe = Pipeline([("scale", StandardScaler()), ("selector", SelectKBest(f_regression))] + steps)
+
+    expected = GridSearchCV(pipe, grid, cv=3, scoring="r2").fit(X, y)
+    search = AlphaPathSearch(pipe, grid, cv=3).fit(X, y)
+
+    assert search.best_params_ == expected.best_params_
+    assert search.cv_results_["params"] == expected.cv_results_["params"]
+    np.testing.assert_allclose(
+        search.cv_results_["mean_test_score"], expected.cv_results_["mean_test_score"], rtol=1e-8
+    )
+    # A fit per fold of each (k, degree) instead of each (k, degree, alpha)
+    assert search.n_fits_ == 9 * 3
@@ -10,3 +10,20 @@ PREP_FILE_NAME = "precipitaciones"
 BANK_FILE_NAME = "banco_central"
 
 MERGED_FILE_NAME = "merge_data"
+
+# Storage format of the step outputs in INTERM_DIR and FEATURE_DIR: feather or csv
+STORAGE_FORMAT = "feather"
+
+# Watermark and period hashes of the last incremental preprocessing, saved in INTERM_DIR
+PREPROCESSING_STATE_FILE_NAME = "preprocessing_state"
+
+# Rows of each raw file validated at once by the chunked validation
+VALIDATION_CHUNK_SIZE = 100_000
+
+# Outputs of the previous runs of the steps of the cli, restored when their inputs repeat
+STEP_CACHE_DIR = ".step_cache"
+# Runs kept in the cache for each step
+STEP_CACHE_ENTRIES = 5
+
+# Selector scores of the training data, shared by the tuning and training runs
+SCORE_CACHE_DIR = ".score_cache"
@@ -12,6 +12,23 @@ PARAM_GRID = {
     "poly__degree": [1, 2, 3, 5, 7],
 }
 
+# Hyperparameter search
+SEARCH_STRATEGIES = ["grid", "random", "halving", "halving_random", "alpha_path"]
+SEARCH_CV = 3
+SEARCH_N_ITER = 30  # Candidates sampled by the random and halving_random strategies
+SEARCH_HALVING_FACTOR = 3  # Proportion of candidates kept in each halving iteration
+# Samples of the first halving iteration. With fewer, the train folds don't have more samples
+# than the neighbors of mutual_info_regression and every candidate scores nan
+SEARCH_HALVING_MIN_RESOURCES = 12
+SEARCH_RANDOM_STATE = 42
+TUNING_CACHE_BYTES_LIMIT = "512M"  # Size limit of the fitted steps cached during a search
+SCORE_CACHE_BYTES_LIMIT = "256M"  # Size limit of the selector scores kept between runs
+SELECTOR_RANDOM_STATE = 42  # Seed of the noise added by mutual_info_regression
+# Model of the expanded features: "features" fits PolynomialFeatures + Ridge, "kernel" the
+# equivalent PolynomialKernelRidge that never builds the expansion
+POLY_SOLVERS = ["features", "kernel"]
+KERNEL_CHUNK_BYTES = 64 * 2**20  # Memory used to compute each chunk of the kernel
+
 # Features
 TARGET_COL = "target"
 
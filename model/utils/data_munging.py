@@ -2,9 +2,13 @@
     This file contains transformer classes for scikit learn pipelines.
     The intention is to reuse the code
 """
+from typing import Optional, Union
+
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
 
 
 class TakeVariables(BaseEstimator, TransformerMixin):
@@ -26,6 +30,23 @@ class TakeVariables(BaseEstimator, TransformerMixin):
         return X
 
 
+class FillVariables(BaseEstimator, TransformerMixin):
+    """
+    Make sure every variable in cols exists, the missing ones are filled with fill_value
+    """
+
+    def __init__(self, cols: list = [], fill_value: float = 0.0):
+        assert len(cols) > 0
+        self.cols = cols
+        self.fill_value = fill_value
+
+    def fit(self, X: pd.DataFrame, y=None):
+        return self
+
+    def transform(self, X: pd.DataFrame):
+        return X.reindex(columns=self.cols, fill_value=self.fill_value)
+
+
 class DropNaTransformer(BaseEstimator, TransformerMixin):
     """
     Take a list of existing variables from the dataframe
@@ -73,20 +94,90 @@ class FixingFormattedString(BaseEstimator, TransformerMixin):
                     x = x[0] + x[1]
                     return float(x[0:2] + "." + x[2:])
 
+    def casting_finance_vectorized(self, x: np.ndarray) -> np.ndarray:
+        """
+        Same rules as casting_finance, applied to an array of strings of any shape. The strings
+        are read as a matrix of bytes and parsed one char position at a time for every cell
+        """
+        shape = x.shape
+        x = x.ravel()
+        missing = pd.isna(x)
+        if missing.all():
+            return np.full(shape, np.nan)
+
+        chars = np.where(missing, "", x).astype(bytes)
+        chars = np.ascontiguousarray(chars.view(np.uint8).reshape(len(x), -1).T)
+
+        # Only the first two dot separated parts are used by IMACEC_INDICE
+        max_parts = np.inf if self.cols_type == "PIB" else 2
+        number = np.zeros(len(x), dtype=np.int64)
+        n_used = np.zeros(len(x), dtype=np.int64)
+        n_integer = np.zeros(len(x), dtype=np.int64)
+        last_integer_digit = np.zeros(len(x), dtype=np.int64)
+        n_dots = np.zeros(len(x), dtype=np.int64)
+        invalid = np.zeros(len(x), dtype=bool)
+        for char in chars:
+            digit = char.astype(np.int64) - ord("0")
+            is_digit = (digit >= 0) & (digit <= 9)
+            is_dot = char == ord(".")
+            used = is_digit & (n_dots < max_parts)
+            in_integer = is_digit & (n_dots == 0)
+
+            number = np.where(used, number * 10 + digit, number)
+            n_used += used
+            n_integer += in_integer
+            last_integer_digit = np.where(in_integer, digit, last_integer_digit)
+            n_dots += is_dot
+            invalid |= (char != 0) & ~is_dot & ~is_digit
+
+        if ((invalid | (n_used == 0)) & ~missing).any():
+            raise ValueError(f"Can't parse the {self.cols_type} values")
+
+        if self.cols_type == "PIB":
+            values = np.where(missing, np.nan, number) if missing.any() else number
+            return values.reshape(shape)
+
+        starts_with_one = chars[0] == ord("1")
+        long_integer = n_integer > 2
+        short_number = ~starts_with_one & long_integer
+        if ((n_dots == 0) & ~short_number & ~missing).any():
+            raise ValueError(f"Can't parse the {self.cols_type} values without a decimal part")
+
+        # 100+ values keep three digits before the decimal point, the rest only two
+        n_before = np.select([starts_with_one & long_integer, starts_with_one], [n_integer, 3], 2)
+        values = number / np.power(10.0, np.maximum(n_used - n_before, 0))
+
+        # Values below 100 with a long integer part use its first two and last digits
+        first_digits = (chars[0].astype(np.int64) - ord("0")) * 10 + chars[1] - ord("0")
+        short_values = (first_digits * 10 + last_integer_digit) / 10.0
+        values = np.where(short_number, short_values, values)
+
+        return np.where(missing, np.nan, values).reshape(shape)
+
     def transform(self, X: pd.DataFrame):
         X = X.copy()
-        for col in self.cols:
-            if col in X.columns and (X[col].dtypes == "str" or X[col].dtypes == "object"):
-                X[col] = X[col].apply(lambda x: self.casting_finance(x))
+        cols = [
+            col
+            for col in self.cols
+            if col in X.columns and (X[col].dtypes == "str" or X[col].dtypes == "object")
+        ]
+        if cols:
+            # Every cell is parsed at once
+            values = self.casting_finance_vectorized(X[cols].to_numpy())
+            for i, col in enumerate(cols):
+                X[col] = values[:, i]
         return X
 
 
 class RollingTransformer(BaseEstimator, TransformerMixin):
     """
-    Perform rolling or shift operations over a set of existing variables
+    Perform rolling or shift operations over a set of existing variables. method can be a
+    single statistic or a list of them, every statistic is computed in one window pass
     """
 
-    def __init__(self, cols: list, method: str = "mean", window_size: int = 3):
+    STATS = ("mean", "std", "min", "max", "last")
+
+    def __init__(self, cols: list, method: Union[str, list] = "mean", window_size: int = 3):
         self.cols = cols
         self.window_size = window_size
         self.method = method
@@ -94,27 +185,123 @@ class RollingTransformer(BaseEstimator, TransformerMixin):
     def fit(self, X: pd.DataFrame, y=None):
         return self
 
-    def transform(self, X: pd.DataFrame):
-        X = X.copy()
+    @property
+    def methods(self) -> list:
+        return [self.method] if isinstance(self.method, str) else list(self.method)
+
+    def feature_names(self, cols: list) -> list:
+        return [
+            f"{col}_rolling{self.window_size}_{method}" for method in self.methods for col in cols
+        ]
+
+    def rolling_stats(self, values: np.ndarray) -> np.ndarray:
+        """
+        Compute every statistic over a (rows, cols) array, with the same semantics as
+        pandas rolling(window=window_size, min_periods=1). The output has one block of
+        cols per statistic
+        """
+        n_rows, n_cols = values.shape
+        methods = self.methods
+        if n_rows == 0:
+            # sliding_window_view needs at least one full window
+            return np.empty((0, len(methods) * n_cols))
 
-        feats = []
-        for col in self.cols:
-            if col in X.columns:
-                if self.method == "mean":
-                    feat = pd.DataFrame(
-                        X[col].rolling(window=self.window_size, min_periods=1).mean()
-                    )
-                elif self.method == "std":
-                    feat = pd.DataFrame(
-                        X[col].rolling(window=self.window_size, min_periods=1).std()
-                    )
+        # (rows, cols, window) view of the values, the first windows are padded with nan
+        padded = np.full((n_rows + self.window_size - 1, n_cols), np.nan)
+        padded[self.window_size - 1 :] = values
+        windows = sliding_window_view(padded, self.window_size, axis=0)
+
+        valid = ~np.isnan(windows)
+        count = valid.sum(axis=2)
+        empty = count == 0
+
+        out = np.empty((n_rows, len(methods) * n_cols))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(valid, windows, 0.0).sum(axis=2) / count
+            for i, method in enumerate(methods):
+                block = out[:, i * n_cols : (i + 1) * n_cols]
+                if method == "mean":
+                    block[:] = mean
+                elif method == "std":
+                    squares = np.where(valid, windows - mean[:, :, None], 0.0) ** 2
+                    block[:] = np.sqrt(squares.sum(axis=2) / (count - 1))
+                    block[count < 2] = np.nan
+                elif method == "min":
+                    block[:] = np.where(valid, windows, np.inf).min(axis=2)
+                    block[empty] = np.nan
+                elif method == "max":
+                    block[:] = np.where(valid, windows, -np.inf).max(axis=2)
+                    block[empty] = np.nan
+                elif method == "last":
+                    last = self.window_size - 1 - valid[:, :, ::-1].argmax(axis=2)
+                    block[:] = np.take_along_axis(windows, last[:, :, None], axis=2)[:, :, 0]
                 else:
                     raise NotImplementedError
-                feat.columns = [f"{col}_rolling{self.window_size}_{self.method}"]
-                feats.append(feat)
 
-        if len(feats):
-            feats = pd.concat(feats, axis=1)
-            X = pd.concat([X, feats], axis=1)
+        return out
 
-        return X
+    def transform(self, X: pd.DataFrame):
+        cols = [col for col in self.cols if col in X.columns]
+        if not cols:
+            return X
+
+        # The output block is allocated once and X is only copied by the final concat
+        feats = self.rolling_stats(X[cols].to_numpy(dtype=float))
+        feats = pd.DataFrame(feats, index=X.index, columns=self.feature_names(cols))
+        return pd.concat([X, feats], axis=1)
+
+
+def prune_pipeline(pipe: Pipeline, keep_cols: Optional[list] = None) -> Pipeline:
+    """
+    Push the final set of columns back into the pipeline, so that every step only produces
+    columns that a later step uses. By default the columns of the last TakeVariables are kept.
+    The pruned pipeline starts by taking the input columns it needs
+    """
+    if keep_cols is None:
+        keep_cols = [step for _, step in pipe.steps if isinstance(step, TakeVariables)][-1].cols
+    required = set(keep_cols)
+
+    steps = []
+    for name, step in reversed(pipe.steps):
+        if isinstance(step, TakeVariables):
+            cols = [col for col in step.cols if col in required]
+            steps.append((name, TakeVariables(cols)))
+            required = set(cols)
+        elif isinstance(step, RollingTransformer):
+            # Keep the columns and statistics with at least one output in use
+            outputs = [
+                (col, method, f"{col}_rolling{step.window_size}_{method}")
+                for method in step.methods
+                for col in step.cols
+            ]
+            used = [(col, method) for col, method, out_col in outputs if out_col in required]
+            cols = [col for col in step.cols if col in {col for col, _ in used}]
+            methods = [method for method in step.methods if method in {m for _, m in used}]
+            if cols:
+                method = step.method if isinstance(step.method, str) else methods
+                steps.append((name, RollingTransformer(cols, method, step.window_size)))
+            required = (required - {out_col for _, _, out_col in outputs}) | set(cols)
+        elif isinstance(step, FixingFormattedString):
+            cols = [col for col in step.cols if col in required]
+            if cols:
+                steps.append((name, FixingFormattedString(cols, step.cols_type)))
+        else:
+            raise NotImplementedError(f"Can't prune the step {name}")
+
+    if not isinstance(steps[-1][1], TakeVariables):
+        steps.append(("take_input_vars", TakeVariables(sorted(required))))
+    return Pipeline(steps[::-1])
+
+
+def prune_for_model(data_pipe: Pipeline, model_pipe: Pipeline) -> Pipeline:
+    """
+    Prune the data pipeline to the columns kept by the selector of the model pipeline. The
+    columns dropped by the selector are filled with zeros, the model ignores their values
+    """
+    feature_names = list(model_pipe.feature_names_in_)
+    support = model_pipe.named_steps["selector"].get_support()
+    selected = [col for col, keep in zip(feature_names, support) if keep]
+
+    pipe = prune_pipeline(data_pipe, selected)
+    pipe.steps.append(("fill_unselected_vars", FillVariables(feature_names)))
+    return pipe
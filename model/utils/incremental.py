@@ -0,0 +1,67 @@
+"""
+    This file contains helpers for the incremental preprocessing.
+    Each raw source is summarized by a hash per period (anio, mes), the periods whose hash
+    changed since the last run are the only ones processed again
+"""
+import json
+import logging
+import os
+from typing import Dict, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from model.utils.periods import period_keys
+
+logger = logging.getLogger(__name__)
+
+
+def period_hashes(raw: pd.DataFrame, keys: np.ndarray) -> Dict[str, str]:
+    """
+    Hash of the first raw row of each period, rows without a period are ignored
+    """
+    row_hashes = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    valid = ~np.isnan(keys)
+    first = pd.Series(row_hashes[valid]).groupby(keys[valid], sort=False).first()
+    return {str(int(key)): str(value) for key, value in first.items()}
+
+
+def changed_periods(old: Dict[str, str], new: Dict[str, str]) -> Set[float]:
+    """
+    Periods that are new, whose content changed or that were removed from the source
+    """
+    changed = {key for key, value in new.items() if old.get(key) != value}
+    changed |= old.keys() - new.keys()
+    return {float(key) for key in changed}
+
+
+def load_state(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: Dict) -> None:
+    # Write in a temporary file first so an interrupted run doesn't leave a partial state
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def update_table(
+    old: pd.DataFrame, new_rows: pd.DataFrame, changed: Set[float], order: pd.Series
+) -> pd.DataFrame:
+    """
+    Replace the rows of the changed periods of a prepared table with new_rows. The rows
+    follow order, the position of each period in the raw source, and take the dtypes of
+    new_rows
+    """
+    old_keys = period_keys(old["anio"], old["mes"])
+    kept = old[~np.isin(old_keys, list(changed))]
+
+    table = pd.concat((kept, new_rows), ignore_index=True).astype(new_rows.dtypes.to_dict())
+    keys = period_keys(table["anio"], table["mes"])
+    positions = order.reindex(keys).to_numpy()
+    return table.iloc[np.argsort(positions, kind="stable")].reset_index(drop=True)
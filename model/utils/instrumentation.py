@@ -0,0 +1,215 @@
+"""
+    This file contains the timing of the stages of the pipelines and the steps of the cli.
+    Every stage records its wall time and the shapes of its input and output in the
+    process wide STAGE_TIMINGS, which the service exports as metrics and the cli as JSON
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sklearn.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+# Path of the JSON report written by the cli after each step, if set
+TIMING_REPORT_ENV = "TIMING_REPORT"
+
+Shape = Tuple[int, ...]
+
+
+def shape_of(X) -> Optional[Shape]:
+    shape = getattr(X, "shape", None)
+    if shape is None and hasattr(X, "__len__"):
+        shape = (len(X),)
+    return tuple(shape) if shape is not None else None
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.last_shape_in: Optional[Shape] = None
+        self.last_shape_out: Optional[Shape] = None
+
+    def add(self, seconds: float, shape_in: Optional[Shape], shape_out: Optional[Shape]):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows_in += shape_in[0] if shape_in else 0
+        self.rows_out += shape_out[0] if shape_out else 0
+        self.last_shape_in, self.last_shape_out = shape_in, shape_out
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "mean_seconds": self.seconds / self.count if self.count else None,
+            "max_seconds": self.max_seconds,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "last_shape_in": self.last_shape_in,
+            "last_shape_out": self.last_shape_out,
+        }
+
+
+# Called with (pipeline, stage, seconds, shape_in, shape_out) for every timed stage
+Observer = Callable[[str, str, float, Optional[Shape], Optional[Shape]], None]
+
+
+class StageTimings:
+    """
+    Accumulated timings of the stages, by pipeline and stage name. The observers get every
+    timing as it's recorded, e.g. to export it as metrics
+    """
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], StageStats] = {}
+        self._observers: List[Observer] = []
+        self._lock = threading.Lock()
+
+    def add_observer(self, observer: Observer) -> None:
+        self._observers.append(observer)
+
+    def record(
+        self,
+        pipeline: str,
+        stage: str,
+        seconds: float,
+        shape_in: Optional[Shape] = None,
+        shape_out: Optional[Shape] = None,
+    ) -> None:
+        with self._lock:
+            stats = self._stats.get((pipeline, stage))
+            if stats is None:
+                stats = self._stats[(pipeline, stage)] = StageStats()
+            stats.add(seconds, shape_in, shape_out)
+        for observer in self._observers:
+            observer(pipeline, stage, seconds, shape_in, shape_out)
+
+    @contextmanager
+    def time(self, pipeline: str, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(pipeline, stage, time.perf_counter() - start)
+
+    def report(self) -> Dict[str, Dict[str, Dict]]:
+        with self._lock:
+            report: Dict[str, Dict[str, Dict]] = {}
+            for (pipeline, stage), stats in self._stats.items():
+                report.setdefault(pipeline, {})[stage] = stats.to_dict()
+            return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+STAGE_TIMINGS = StageTimings()
+
+
+class TimedPipeline(Pipeline):
+    """
+    Pipeline that records the time and shapes of each step of transform, predict and fit
+    under timing_name, the fits as the stage "<step>.fit". It's built from the steps of
+    another pipeline, so fitting it fits the steps of that pipeline too
+    """
+
+    def __init__(self, steps, *, memory=None, verbose=False, timing_name: str = "pipeline"):
+        super().__init__(steps, memory=memory, verbose=verbose)
+        self.timing_name = timing_name
+
+    def _active_steps(self) -> List[Tuple[str, object]]:
+        return [(name, step) for name, step in self.steps if step not in (None, "passthrough")]
+
+    def _timed(self, name: str, method: Callable, X, *args):
+        start = time.perf_counter()
+        out = method(X, *args)
+        STAGE_TIMINGS.record(
+            self.timing_name, name, time.perf_counter() - start, shape_of(X), shape_of(out)
+        )
+        return out
+
+    def transform(self, X):
+        for name, step in self._active_steps():
+            X = self._timed(name, step.transform, X)
+        return X
+
+    def predict(self, X, **predict_params):
+        if predict_params:
+            return super().predict(X, **predict_params)
+        *transformers, (name, estimator) = self._active_steps()
+        for step_name, step in transformers:
+            X = self._timed(step_name, step.transform, X)
+        return self._timed(name, estimator.predict, X)
+
+    def _fit_steps(self, X, y):
+        *transformers, last = self._active_steps()
+        for name, step in transformers:
+            X = self._timed(f"{name}.fit", step.fit_transform, X, y)
+        return X, last
+
+    def fit(self, X, y=None, **fit_params):
+        # The cached and parametrized fits are left to Pipeline
+        if fit_params or self.memory is not None:
+            return super().fit(X, y, **fit_params)
+        X, (name, estimator) = self._fit_steps(X, y)
+        self._timed(f"{name}.fit", estimator.fit, X, y)
+        return self
+
+    def fit_transform(self, X, y=None, **fit_params):
+        if fit_params or self.memory is not None:
+            return super().fit_transform(X, y, **fit_params)
+        X, (name, estimator) = self._fit_steps(X, y)
+        return self._timed(f"{name}.fit", estimator.fit_transform, X, y)
+
+
+def timed_pipeline(pipe: Pipeline, name: str) -> TimedPipeline:
+    """
+    TimedPipeline sharing the steps of pipe
+    """
+    return TimedPipeline(pipe.steps, memory=pipe.memory, verbose=pipe.verbose, timing_name=name)
+
+
+def log_timing_report() -> None:
+    for pipeline, stages in STAGE_TIMINGS.report().items():
+        for stage, stats in stages.items():
+            message = f"{pipeline}.{stage}: {stats['seconds']:.3f}s in {stats['count']} calls"
+            if stats["last_shape_in"] is not None:
+                message += f", last shapes {stats['last_shape_in']} -> {stats['last_shape_out']}"
+            logger.info(message)
+
+
+def write_timing_report(path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(STAGE_TIMINGS.report(), f, indent=4)
+
+
+def timed_task(name: str, task: Callable) -> Callable:
+    """
+    Wrap a step of the cli to record its time under ("cli", name). After the step the
+    timings are logged, and saved as JSON if the TIMING_REPORT environment variable is set
+    """
+
+    @functools.wraps(task)
+    def run(*args, **kwargs):
+        try:
+            with STAGE_TIMINGS.time("cli", name):
+                return task(*args, **kwargs)
+        finally:
+            log_timing_report()
+            path = os.getenv(TIMING_REPORT_ENV)
+            if path:
+                write_timing_report(path)
+                logger.info(f"Saved the timing report in {path}")
+
+    return run
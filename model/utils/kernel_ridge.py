@@ -0,0 +1,96 @@
+"""
+    This file contains a kernelized PolynomialFeatures + Ridge for scikit learn pipelines.
+    The polynomial expansion has comb(n_features + degree, degree) columns, the kernel form
+    only keeps the Gram matrix of the samples, whatever the degree
+"""
+from typing import Tuple
+
+import numpy as np
+from scipy import linalg
+from sklearn.base import BaseEstimator, RegressorMixin
+
+from model.utils.constants import KERNEL_CHUNK_BYTES
+
+
+def polynomial_features_kernel(
+    X: np.ndarray, Z: np.ndarray, degree: int, chunk_bytes: int = KERNEL_CHUNK_BYTES
+) -> np.ndarray:
+    """
+    Inner products of the PolynomialFeatures(degree) expansions of the rows of X and Z,
+    without building them. Every monomial of degree <= degree is a column of the expansion,
+    so the product of two rows is the sum of the complete homogeneous symmetric polynomials
+    h_0..h_degree of x * z. They are built feature by feature, h_k += v_j * h_{k-1}, for
+    chunks of rows of X of at most chunk_bytes
+    """
+    X, Z = np.asarray(X, dtype=float), np.asarray(Z, dtype=float)
+    kernel = np.empty((len(X), len(Z)))
+    rows = max(1, chunk_bytes // (8 * max(len(Z), 1) * (degree + 2)))
+    for start in range(0, len(X), rows):
+        X_chunk = X[start : start + rows]
+        h = np.zeros((degree + 1, len(X_chunk), len(Z)))
+        h[0] = 1.0
+        product = np.empty((len(X_chunk), len(Z)))
+        for j in range(X.shape[1]):
+            v = np.multiply.outer(X_chunk[:, j], Z[:, j])
+            for k in range(1, degree + 1):
+                np.multiply(v, h[k - 1], out=product)
+                h[k] += product
+        kernel[start : start + rows] = h.sum(axis=0)
+    return kernel
+
+
+def center_kernel(kernel: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Center in place the kernel of the training rows, like centering their expansions.
+    Returns it with the products of each row with the mean expansion, and their mean
+    """
+    means = kernel.mean(axis=0)
+    mean = means.mean()
+    kernel -= means[np.newaxis, :]
+    kernel -= means[:, np.newaxis]
+    kernel += mean
+    return kernel, means, mean
+
+
+def center_test_kernel(kernel: np.ndarray, means: np.ndarray, mean: float) -> np.ndarray:
+    """
+    Center in place the kernel of new rows against the training rows, see center_kernel
+    """
+    kernel -= kernel.mean(axis=1, keepdims=True)
+    kernel -= means[np.newaxis, :]
+    kernel += mean
+    return kernel
+
+
+class PolynomialKernelRidge(BaseEstimator, RegressorMixin):
+    """
+    Same predictions as PolynomialFeatures(degree) followed by Ridge(alpha), solved in the
+    dual with the exact kernel of the expansion. Like Ridge, the expanded features are
+    centered and the intercept isn't penalized. The memory grows with the samples instead
+    of the columns of the expansion
+    """
+
+    def __init__(self, degree: int = 2, alpha: float = 1.0, chunk_bytes: int = KERNEL_CHUNK_BYTES):
+        self.degree = degree
+        self.alpha = alpha
+        self.chunk_bytes = chunk_bytes
+
+    def _kernel(self, X: np.ndarray, Z: np.ndarray) -> np.ndarray:
+        return polynomial_features_kernel(X, Z, self.degree, self.chunk_bytes)
+
+    def fit(self, X, y):
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+        kernel, self.kernel_means_, self.kernel_mean_ = center_kernel(self._kernel(X, X))
+        kernel.flat[:: len(X) + 1] += self.alpha
+
+        self.y_mean_ = y.mean()
+        self.dual_coef_ = linalg.solve(kernel, y - self.y_mean_, assume_a="pos")
+        self.X_fit_ = X
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def predict(self, X):
+        kernel = center_test_kernel(
+            self._kernel(X, self.X_fit_), self.kernel_means_, self.kernel_mean_
+        )
+        return kernel @ self.dual_coef_ + self.y_mean_
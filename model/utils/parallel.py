@@ -0,0 +1,50 @@
+"""
+    This file contains a helper to run the independent stages of each data source at the
+    same time, e.g. the validation or the preparation of the raw files
+"""
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def run_source(name: str, task: Callable) -> Any:
+    start = time.perf_counter()
+    logger.debug(f"Starting {name}")
+    result = task()
+    logger.debug(f"Finished {name} in {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def run_per_source(tasks: Dict[str, Callable], n_workers: int = 1) -> Dict[str, Any]:
+    """
+    Run the task of every source and return their results by source. With n_workers > 1
+    the tasks run in a pool of processes, so they must be picklable (module functions or
+    functools.partial of them). Every task runs even if another one fails, the errors
+    are logged with the name of their source and the first one is raised at the end
+    """
+    results, errors = {}, {}
+    if n_workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks))) as executor:
+            futures = {
+                name: executor.submit(run_source, name, task) for name, task in tasks.items()
+            }
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+    else:
+        for name, task in tasks.items():
+            try:
+                results[name] = run_source(name, task)
+            except Exception as e:
+                errors[name] = e
+
+    for name, e in errors.items():
+        logger.error(f"{name} failed: {e}", exc_info=e)
+    if errors:
+        raise next(iter(errors.values()))
+    return results
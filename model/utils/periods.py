@@ -0,0 +1,43 @@
+"""
+    This file contains vectorized helpers to work with the monthly periods (anio, mes)
+    shared by the raw sources, the intermediate tables and the features
+"""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+Period = Tuple[int, int]
+
+# Missing ordinal of a period array
+NAT_ORDINAL = np.iinfo(np.int64).min
+
+
+def split_dates(dates: pd.Series) -> pd.DataFrame:
+    """
+    Year and month of each date as the anio and mes columns. They are integers unless
+    there are missing dates, which get NaN
+    """
+    return pd.DataFrame({"anio": dates.dt.year, "mes": dates.dt.month}, index=dates.index)
+
+
+def period_keys(anio: pd.Series, mes: pd.Series) -> np.ndarray:
+    """
+    Sortable numeric key of each period (anio * 100 + mes), NaN when the period is missing
+    """
+    return anio.to_numpy(dtype=float) * 100 + mes.to_numpy(dtype=float)
+
+
+def to_period(key: float) -> Period:
+    return int(key // 100), int(key % 100)
+
+
+def period_index(anio: pd.Series, mes: pd.Series, name: str = "Periodo") -> pd.PeriodIndex:
+    """
+    Monthly PeriodIndex of the periods, missing periods are NaT
+    """
+    anio, mes = anio.to_numpy(dtype=float), mes.to_numpy(dtype=float)
+    missing = np.isnan(anio) | np.isnan(mes)
+    ordinals = np.where(missing, 0, (anio - 1970) * 12 + mes - 1).astype(np.int64)
+    ordinals[missing] = NAT_ORDINAL
+    return pd.PeriodIndex(pd.arrays.PeriodArray(ordinals, dtype=pd.PeriodDtype("M")), name=name)
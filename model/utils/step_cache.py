@@ -0,0 +1,206 @@
+"""
+    This file contains the memoization of the steps of the cli. A step is fingerprinted by
+    the content of its input files, its arguments, the code of the model package (which
+    holds the constants like PARAM_GRID) and the versions of the libraries. When a previous
+    run of the step had the same fingerprint its outputs are restored from the cache of the
+    base path instead of running the step again
+"""
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from model.utils.config import STEP_CACHE_DIR, STEP_CACHE_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# Arguments that change how a step runs but not its outputs
+EXECUTION_PARAMS = {"base_path", "dry_run", "n_workers", "n_jobs", "chunked", "chunksize"}
+# Folders of the model package whose code doesn't change the outputs of the steps
+IGNORED_CODE_DIRS = {"tests", "serving", "__pycache__"}
+MANIFEST_FILE_NAME = "manifest.json"
+
+Params = Dict[str, object]
+
+
+class StepSpec(NamedTuple):
+    # Paths relative to the base path read and written by the step, given its arguments
+    inputs: Callable[[Params], List[str]]
+    outputs: Callable[[Params], List[str]]
+    # Side effects of the step besides its outputs, run before restoring them from the cache
+    before_restore: Optional[Callable[[Params], None]] = None
+
+
+def file_hash(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """
+    Hash of the python files of the model package used by the steps
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(package_dir):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_CODE_DIRS)
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, package_dir).encode())
+                digest.update(file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def bind_params(task: Callable, args: Iterable, kwargs: Dict) -> Params:
+    bound = inspect.signature(task).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def fingerprint(name: str, spec: StepSpec, params: Params) -> str:
+    base_path = params["base_path"]
+    content = {
+        "step": name,
+        "params": {k: v for k, v in params.items() if k not in EXECUTION_PARAMS},
+        "inputs": {path: file_hash(os.path.join(base_path, path)) for path in spec.inputs(params)},
+        "code": code_version(),
+        "libraries": [np.__version__, pd.__version__, sklearn.__version__],
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _copy(source: str, destination: str) -> None:
+    # Through a temporary file, so a reader never sees a partial output
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    tmp_path = f"{destination}.tmp"
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+class StepCache:
+    """
+    Outputs of the previous runs of each step, in <cache_dir>/<step>/<fingerprint>/ with a
+    manifest of the hash of each output. The outputs that a run didn't write are removed
+    when it's restored. Only the last max_entries runs of each step are kept
+    """
+
+    def __init__(self, base_path: str, max_entries: int = STEP_CACHE_ENTRIES):
+        self.base_path = base_path
+        self.cache_dir = os.path.join(base_path, STEP_CACHE_DIR)
+        self.max_entries = max_entries
+
+    def _entry_dir(self, name: str, key: str) -> str:
+        return os.path.join(self.cache_dir, name, key)
+
+    def restore(self, name: str, key: str, before: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Restore the outputs of the run of the step with the fingerprint key, False if
+        there isn't one. before is called first when there is one
+        """
+        entry_dir = self._entry_dir(name, key)
+        manifest_path = os.path.join(entry_dir, MANIFEST_FILE_NAME)
+        if not os.path.exists(manifest_path):
+            return False
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if before is not None:
+            before()
+
+        for i, (path, digest) in enumerate(manifest["outputs"].items()):
+            destination = os.path.join(self.base_path, path)
+            if digest is None:
+                if os.path.exists(destination):
+                    os.remove(destination)
+            # Outputs that didn't change are left untouched, e.g. for the model reload
+            elif file_hash(destination) != digest:
+                _copy(os.path.join(entry_dir, str(i)), destination)
+        # The entry is now the most recently used one
+        os.utime(entry_dir)
+        return True
+
+    def store(self, name: str, key: str, outputs: List[str]) -> None:
+        entry_dir = self._entry_dir(name, key)
+        tmp_dir = f"{entry_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        manifest = {"step": name, "created_at": datetime.now().isoformat(), "outputs": {}}
+        for i, path in enumerate(outputs):
+            source = os.path.join(self.base_path, path)
+            manifest["outputs"][path] = file_hash(source)
+            if os.path.exists(source):
+                shutil.copyfile(source, os.path.join(tmp_dir, str(i)))
+        with open(os.path.join(tmp_dir, MANIFEST_FILE_NAME), "w") as f:
+            json.dump(manifest, f, indent=4)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self._prune(name)
+
+    def _prune(self, name: str) -> None:
+        step_dir = os.path.join(self.cache_dir, name)
+        entries = sorted(
+            (os.path.join(step_dir, key) for key in os.listdir(step_dir)),
+            key=os.path.getmtime,
+            reverse=True,
+        )
+        for entry_dir in entries[self.max_entries :]:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def cached_task(name: str, task: Callable, spec: StepSpec) -> Callable:
+    """
+    Wrap a step of the cli to skip it when its fingerprint matches a previous run, restoring
+    the outputs of that run. force runs the step anyway and refreshes its cache. The dry
+    runs don't write outputs, so they always run and are never cached. The before_restore
+    of the spec redoes the side effects of the step that aren't outputs, e.g. the history
+    of the models of training_model
+    """
+
+    @functools.wraps(task)
+    def run(*args, force: bool = False, **kwargs):
+        params = bind_params(task, args, kwargs)
+        if params.get("dry_run"):
+            return task(*args, **kwargs)
+
+        cache = StepCache(params["base_path"])
+        key = fingerprint(name, spec, params)
+        if force:
+            logger.info(f"{name}: cache skipped with --force, fingerprint {key[:12]}")
+        elif cache.restore(
+            name, key, spec.before_restore and functools.partial(spec.before_restore, params)
+        ):
+            logger.info(f"{name}: cache hit, restored the outputs of fingerprint {key[:12]}")
+            return None
+        else:
+            logger.info(f"{name}: cache miss, fingerprint {key[:12]}")
+
+        result = task(*args, **kwargs)
+        cache.store(name, key, spec.outputs(params))
+        return result
+
+    # fire reads the arguments of the signature, which now include force
+    signature = inspect.signature(task)
+    run.__signature__ = signature.replace(
+        parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("force", inspect.Parameter.KEYWORD_ONLY, default=False),
+        ]
+    )
+    return run
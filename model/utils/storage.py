@@ -0,0 +1,87 @@
+"""
+    This file contains the storage layer used by the steps to save and load their outputs.
+    feather is a binary columnar format that keeps the dtypes, supports reading a subset
+    of the columns and memory-mapped loading. csv is kept as an export option
+"""
+import logging
+import os
+from typing import Optional
+
+import joblib
+import pandas as pd
+from pyarrow import feather
+
+from model.utils.config import STORAGE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+STORAGE_FORMATS = ["feather", "csv"]
+
+
+def table_path(base_path: str, folder: str, name: str, storage_format: str = STORAGE_FORMAT):
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown storage format {storage_format}, use one of {STORAGE_FORMATS}")
+    return os.path.join(base_path, folder, f"{name}.{storage_format}")
+
+
+def save_table(
+    df: pd.DataFrame,
+    base_path: str,
+    folder: str,
+    name: str,
+    storage_format: str = STORAGE_FORMAT,
+    export_csv: bool = False,
+) -> None:
+    """
+    Save the table in the storage format, optionally exporting a csv copy
+    """
+    path = table_path(base_path, folder, name, storage_format)
+    logger.debug(f"Saving {path}")
+    if storage_format == "feather":
+        # Uncompressed files can be memory-mapped without copying them
+        feather.write_feather(
+            df.reset_index(drop=True), path, compression="uncompressed", chunksize=len(df) or None
+        )
+    else:
+        df.to_csv(path, index=False)
+
+    if export_csv and storage_format != "csv":
+        df.to_csv(table_path(base_path, folder, name, "csv"), index=False)
+
+
+def load_table(
+    base_path: str,
+    folder: str,
+    name: str,
+    storage_format: str = STORAGE_FORMAT,
+    columns: Optional[list] = None,
+    memory_map: bool = False,
+) -> pd.DataFrame:
+    """
+    Load the table, only reading the requested columns. Tables written before the storage
+    format was set are read from their csv
+    """
+    path = table_path(base_path, folder, name, storage_format)
+    if not os.path.exists(path) and storage_format != "csv":
+        csv_path = table_path(base_path, folder, name, "csv")
+        if os.path.exists(csv_path):
+            logger.warning(f"{path} doesn't exist, reading {csv_path}")
+            path, storage_format = csv_path, "csv"
+
+    logger.debug(f"Loading {path}")
+    if storage_format == "feather":
+        df = feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+    else:
+        df = pd.read_csv(path, usecols=columns)
+    # Both readers keep the order of the file, return the columns in the requested order
+    return df[columns] if columns else df
+
+
+def dump_artifact(obj, path: str) -> None:
+    """
+    Serialize the object in a temporary file and move it to path, so a reader never
+    sees a partially written artifact
+    """
+    tmp_path = f"{path}.tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
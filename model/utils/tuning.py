@@ -0,0 +1,237 @@
+"""
+    This file contains helpers for the hyperparameter search.
+    The intention is to reuse the fitted steps shared by several candidates, and the
+    factorizations shared by the candidates that only differ in the ridge alpha
+"""
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from joblib import Memory, Parallel, delayed
+from scipy import linalg
+from scipy.stats import rankdata
+from sklearn.base import BaseEstimator, clone
+from sklearn.feature_selection import mutual_info_regression
+from sklearn.linear_model import Ridge
+from sklearn.metrics import r2_score
+from sklearn.model_selection import ParameterGrid, check_cv
+from sklearn.pipeline import Pipeline
+from sklearn.utils import _safe_indexing
+
+from model.utils.config import SCORE_CACHE_DIR
+from model.utils.constants import SCORE_CACHE_BYTES_LIMIT, SELECTOR_RANDOM_STATE
+from model.utils.kernel_ridge import PolynomialKernelRidge, center_kernel, center_test_kernel
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def tuning_cache(bytes_limit: str) -> Iterator[Memory]:
+    """
+    Disk cache shared by every search worker during a tuning run, see TrimmedMemory for
+    the fitted steps of the pipelines. The cache is cleared when the run ends
+    """
+    location = tempfile.mkdtemp(prefix="tuning_cache_")
+    memory = Memory(location, bytes_limit=bytes_limit, verbose=0)
+    logger.debug(f"Caching the fitted steps in {location} up to {bytes_limit}")
+    try:
+        yield memory
+    finally:
+        memory.clear(warn=False)
+        shutil.rmtree(location, ignore_errors=True)
+
+
+class TrimmedMemory:
+    """
+    Memory of the fitted steps of a Pipeline, trimmed to its bytes_limit after every
+    cached step fit, so the expansions of the candidates don't outgrow the limit
+    """
+
+    def __init__(self, memory: Memory):
+        self.memory = memory
+
+    def cache(self, func: Callable) -> Callable:
+        return _TrimmedFunc(self.memory, self.memory.cache(func))
+
+
+class _TrimmedFunc:
+    def __init__(self, memory: Memory, cached_func: Callable):
+        self.memory = memory
+        self.cached_func = cached_func
+
+    def __call__(self, *args, **kwargs):
+        result = self.cached_func(*args, **kwargs)
+        self.memory.reduce_size()
+        return result
+
+
+class CachedScoreFunc:
+    """
+    Score function for SelectKBest cached in memory, keyed by a hash of X, y and the
+    score_params. Candidates with a different k fitted on the same fold reuse the scores,
+    and the cache is trimmed to its bytes_limit after every new score
+    """
+
+    def __init__(self, memory: Memory, score_func: Callable, **score_params):
+        self.memory = memory
+        self.score_func = score_func
+        self.score_params = score_params
+
+    def __call__(self, X, y):
+        # The same values hit the cache whatever their container or index
+        X, y = np.asarray(X), np.asarray(y)
+        cached_func = self.memory.cache(self.score_func)
+        if cached_func.check_call_in_cache(X, y, **self.score_params):
+            return cached_func(X, y, **self.score_params)
+
+        scores = cached_func(X, y, **self.score_params)
+        self.memory.reduce_size()
+        return scores
+
+    def __repr__(self) -> str:
+        params = "".join(f", {name}={value!r}" for name, value in self.score_params.items())
+        return f"CachedScoreFunc({self.score_func.__name__}{params})"
+
+
+def score_cache(base_path: Optional[str]) -> Memory:
+    """
+    Cache of the selector scores kept in base_path between the tuning and training runs,
+    up to SCORE_CACHE_BYTES_LIMIT. Without base_path the scores aren't cached
+    """
+    location = os.path.join(base_path, SCORE_CACHE_DIR) if base_path else None
+    return Memory(location, bytes_limit=SCORE_CACHE_BYTES_LIMIT, verbose=0)
+
+
+def selector_score_func(memory: Memory) -> CachedScoreFunc:
+    """
+    Mutual information of the selector, cached in memory. The random_state is fixed, so the
+    tuning and the training select the same features on the same data
+    """
+    return CachedScoreFunc(memory, mutual_info_regression, random_state=SELECTOR_RANDOM_STATE)
+
+
+def alpha_path_predictions(
+    model: BaseEstimator, X: np.ndarray, y: np.ndarray, X_test: np.ndarray, alphas: List[float]
+) -> np.ndarray:
+    """
+    Predictions on X_test of model fitted on X, y with each alpha, from a single
+    factorization: the SVD of the centered X for Ridge, the eigendecomposition of the
+    centered kernel for PolynomialKernelRidge. One row per alpha
+    """
+    X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+    X_test = np.asarray(X_test, dtype=float)
+    alphas = np.asarray(alphas, dtype=float)[:, np.newaxis]
+
+    if isinstance(model, Ridge):
+        X_mean = X.mean(axis=0) if model.fit_intercept else np.zeros(X.shape[1])
+        y_mean = y.mean() if model.fit_intercept else 0.0
+        U, s, Vt = linalg.svd(X - X_mean, full_matrices=False)
+        # coef = V diag(s / (s^2 + alpha)) U^T y
+        shrunk = (s / (s**2 + alphas)) * (U.T @ (y - y_mean))
+        return shrunk @ ((X_test - X_mean) @ Vt.T).T + y_mean
+
+    if isinstance(model, PolynomialKernelRidge):
+        kernel, means, mean = center_kernel(model._kernel(X, X))
+        eigenvalues, Q = linalg.eigh(kernel)
+        # dual_coef = Q diag(1 / (eigenvalues + alpha)) Q^T y
+        dual_coefs = ((Q.T @ (y - y.mean())) / (eigenvalues + alphas)) @ Q.T
+        test_kernel = center_test_kernel(model._kernel(X_test, X), means, mean)
+        return dual_coefs @ test_kernel.T + y.mean()
+
+    raise ValueError(f"Can't compute the alpha path of {model}")
+
+
+def _score_alpha_path(
+    pipe: Pipeline, X, y, train: np.ndarray, test: np.ndarray, alphas: List[float]
+) -> List[float]:
+    """
+    r2 of every alpha of the last step of pipe, fitted on the train rows and scored on the
+    test rows
+    """
+    X_train, y_train = _safe_indexing(X, train), _safe_indexing(y, train)
+    X_test, y_test = _safe_indexing(X, test), _safe_indexing(y, test)
+    upstream = pipe[:-1]
+    X_train = upstream.fit_transform(X_train, y_train)
+    predictions = alpha_path_predictions(
+        pipe[-1], X_train, y_train, upstream.transform(X_test), alphas
+    )
+    return [r2_score(y_test, y_pred) for y_pred in predictions]
+
+
+class AlphaPathSearch:
+    """
+    Exhaustive search over param_grid with the results of GridSearchCV, for a pipeline
+    ending with a Ridge or a PolynomialKernelRidge. The candidates that only differ in
+    their alpha are grouped: the upstream steps of a group are fitted once per fold and
+    every alpha is scored from a single factorization, see alpha_path_predictions.
+    The best estimator isn't refitted, only its upstream steps are fitted on the whole X,
+    e.g. so the cached selector scores of the full train set are ready for the training
+    """
+
+    def __init__(
+        self,
+        estimator: Pipeline,
+        param_grid: Dict,
+        cv=5,
+        scoring: str = "r2",
+        n_jobs: Optional[int] = None,
+        alpha_param: str = "model__alpha",
+    ):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.scoring = scoring
+        self.n_jobs = n_jobs
+        self.alpha_param = alpha_param
+
+    def fit(self, X, y):
+        if self.scoring != "r2":
+            raise ValueError(f"The alpha path search only supports r2, not {self.scoring}")
+
+        candidates = list(ParameterGrid(self.param_grid))
+        groups: Dict[Tuple, List[int]] = {}
+        for i, params in enumerate(candidates):
+            upstream = tuple((k, v) for k, v in params.items() if k != self.alpha_param)
+            groups.setdefault(upstream, []).append(i)
+        splits = list(check_cv(self.cv, y).split(X, y))
+
+        scores = Parallel(n_jobs=self.n_jobs)(
+            delayed(_score_alpha_path)(
+                clone(self.estimator).set_params(**dict(upstream)),
+                X,
+                y,
+                train,
+                test,
+                [candidates[i][self.alpha_param] for i in indices],
+            )
+            for upstream, indices in groups.items()
+            for train, test in splits
+        )
+        self.n_fits_ = len(scores)
+        logger.debug(f"Scored {len(candidates)} candidates with {self.n_fits_} fits")
+
+        split_scores = np.empty((len(candidates), len(splits)))
+        for (indices, fold), fold_scores in zip(
+            ((indices, fold) for indices in groups.values() for fold in range(len(splits))),
+            scores,
+        ):
+            split_scores[indices, fold] = fold_scores
+
+        mean_scores = split_scores.mean(axis=1)
+        self.cv_results_ = {
+            "params": candidates,
+            **{f"split{fold}_test_score": split_scores[:, fold] for fold in range(len(splits))},
+            "mean_test_score": mean_scores,
+            "std_test_score": split_scores.std(axis=1),
+            "rank_test_score": rankdata(-mean_scores, method="min").astype(np.int32),
+        }
+        # Like GridSearchCV, the first of the tied candidates
+        self.best_index_ = int(self.cv_results_["rank_test_score"].argmin())
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = mean_scores[self.best_index_]
+        self.best_upstream_ = clone(self.estimator).set_params(**self.best_params_)[:-1].fit(X, y)
+        return self